@@ -0,0 +1,183 @@
+"""Benchmark of cryopicls_autorefine_cryosparc against a simulated cryoSPARC master node.
+
+N result groups are auto-refined on an in-process cryoSPARC simulator (cryopicls.autorefine.simulator), with simulated
+ssh/cryosparcm latencies and job run times, and the wall time and number of remote round trips are reported per strategy:
+
+    sequential : the behaviour before the concurrent scheduler, i.e. a new ssh connection per command, a fixed wait after each
+                 job creation/enqueueing, and clusters processed one after the other (only the import job waited for).
+    concurrent : the current cryopicls_autorefine_cryosparc (shared connection, batched commands, concurrent per-cluster
+                 job chains and one status query per tick for all the jobs).
+
+All the latencies, run times and waits are multiplied by --time-scale, so that the benchmark runs in seconds.
+
+Example::
+
+    python benchmarks/autorefine_benchmark.py --clusters 5 10 20 --output autorefine_benchmark.json
+"""
+
+import os
+import io
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import contextlib
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import cryopicls
+import cryopicls.cryopicls_autorefine_cryosparc
+
+template_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tests', 'cryosparc_autorefine')
+
+
+def make_result_groups(out_dir, n_clusters, basename='cryopicls'):
+    """N copies of the result group of cluster 0 of the test data, as cluster 0, 1, ..., N - 1."""
+    csg_files = []
+    for i in range(n_clusters):
+        name = f'{basename}_cluster{i:03d}'
+        for suffix in ['_particles.cs', '_passthrough_particles.cs']:
+            shutil.copy2(os.path.join(template_dir, f'cryopicls_cluster000{suffix}'), os.path.join(out_dir, name + suffix))
+        with open(os.path.join(template_dir, 'cryopicls_cluster000_particles.csg')) as f:
+            csg = f.read().replace('cryopicls_cluster000', name)
+        csg_files.append(os.path.join(out_dir, f'{name}_particles.csg'))
+        with open(csg_files[-1], 'w') as f:
+            f.write(csg)
+    return csg_files
+
+
+def get_run_args(args, result_dir, cache_dir, consensus_job_uid):
+    """Command line arguments of cryopicls_autorefine_cryosparc."""
+    return argparse.Namespace(
+        cryopicls_result_dir=result_dir, cryopicls_result_basename='cryopicls', cache_dir=cache_dir,
+        csparc_project_uid='P1', csparc_workspace_uid='', csparc_workspace_title='benchmark', csparc_lane='default',
+        csparc_refine_symmetry='C1', csparc_abinitio=False, csparc_abinitio_symmetry='C1', csparc_consensus_job_uid=consensus_job_uid,
+        max_jobs_in_flight=args.max_jobs_in_flight, no_resume=True,
+        poll_interval_min=args.poll_interval * args.time_scale, poll_interval_max=30 * args.time_scale,
+    )
+
+
+def run_sequential(run_args, csparc_com, csg_files, sleep_time):
+    """The autorefine loop before the concurrent scheduler, waiting until all the refinements complete."""
+    project_uid = run_args.csparc_project_uid
+    workspace_uid = csparc_com.make_workspace(project_uid, title=run_args.csparc_workspace_title)
+    time.sleep(sleep_time)
+    refine_job_uids = []
+    for csg_file in csg_files:
+        # A new communicator (and user id lookup) per cluster
+        csparc_com = cryopicls.autorefine.cryosparc.CryoSPARCCom(
+            None, None, None, 'user@example.com', sleep_time=sleep_time, transport=csparc_com.transport)
+        job_uid = csparc_com.make_import_job(project_uid, workspace_uid, csg_file, cache_dir=run_args.cache_dir)
+        time.sleep(sleep_time)
+        csparc_com.enqueue_job(project_uid, job_uid, run_args.csparc_lane)
+        time.sleep(sleep_time)
+        csparc_com.wait_job_complete(project_uid, job_uid)
+        job_uid = csparc_com.make_job(
+            'homo_reconstruct', project_uid, workspace_uid,
+            input_group_connects={'particles': f'{job_uid}.particles', 'mask': f'{run_args.csparc_consensus_job_uid}.mask'})
+        time.sleep(sleep_time)
+        csparc_com.enqueue_job(project_uid, job_uid, run_args.csparc_lane)
+        time.sleep(sleep_time)
+        job_uid = csparc_com.make_job(
+            'homo_refine_new', project_uid, workspace_uid,
+            input_group_connects={'particles': f'{job_uid}.particles', 'volume': f'{job_uid}.volume'})
+        time.sleep(sleep_time)
+        csparc_com.enqueue_job(project_uid, job_uid, run_args.csparc_lane)
+        time.sleep(sleep_time)
+        refine_job_uids.append(job_uid)
+    for job_uid in refine_job_uids:
+        csparc_com.wait_job_complete(project_uid, job_uid)
+
+
+def run_benchmark(args, strategy, n_clusters):
+    s = args.time_scale
+    simulator = cryopicls.autorefine.simulator.CryoSPARCSimulator(
+        job_durations={
+            'import_result_group': args.import_time * s,
+            'homo_reconstruct': args.reconstruct_time * s,
+            'homo_refine_new': args.refine_time * s,
+        },
+        lane_slots=args.lane_slots,
+    )
+    # The consensus job the reconstructions are connected to
+    consensus_job_uid = simulator.add_job('homo_refine_new')
+    transport = cryopicls.autorefine.transport.SimulatorTransport(
+        simulator, command_latency=args.command_latency * s, connect_latency=args.connect_latency * s,
+        multiplexing=strategy != 'sequential')
+
+    work_dir = tempfile.mkdtemp(prefix='cryopicls_autorefine_benchmark_')
+    try:
+        result_dir, cache_dir = os.path.join(work_dir, 'result'), os.path.join(work_dir, 'cache')
+        os.makedirs(result_dir)
+        os.makedirs(cache_dir)
+        csg_files = make_result_groups(result_dir, n_clusters)
+        run_args = get_run_args(args, result_dir, cache_dir, consensus_job_uid)
+
+        t_start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            csparc_com = cryopicls.autorefine.cryosparc.CryoSPARCCom(
+                None, None, None, 'user@example.com', print_com=False, sleep_time=args.poll_interval * s, transport=transport)
+            if strategy == 'sequential':
+                run_sequential(run_args, csparc_com, csg_files, sleep_time=s)
+            else:
+                cryopicls.cryopicls_autorefine_cryosparc.run(run_args, csparc_com, csg_files)
+        wall_time = time.perf_counter() - t_start
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    completed = [x for x in simulator.jobs.values() if x['status'] == 'completed' and x['job_type'] == 'homo_refine_new' and x['completed_at'] is not None]
+    # Time of the slowest single chain, without any overhead: the lower bound of the wall time
+    chain_time = (args.import_time + args.reconstruct_time + args.refine_time) * s
+    return dict(
+        strategy=strategy,
+        clusters=n_clusters,
+        wall_time_s=wall_time,
+        chain_time_s=chain_time,
+        round_trips=len(transport.latencies),
+        client_calls=dict(simulator.calls),
+        refinements_completed=len(completed),
+        max_running=simulator.max_running,
+    )
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+        description=__doc__.split('\n\n')[0]
+    )
+    parser.add_argument('--clusters', nargs='+', type=int, default=[5, 20], help='Numbers of clusters (result groups) to benchmark.')
+    parser.add_argument('--strategies', nargs='+', type=str, default=['sequential', 'concurrent'], choices=['sequential', 'concurrent'], help='Strategies to benchmark.')
+    parser.add_argument('--time-scale', type=float, default=0.01, help='Factor applied to all the times below.')
+    parser.add_argument('--connect-latency', type=float, default=0.3, help='Time (s) of an ssh connection setup.')
+    parser.add_argument('--command-latency', type=float, default=0.7, help='Time (s) of one cryosparcm command (mostly the start of its Python interpreter).')
+    parser.add_argument('--import-time', type=float, default=30, help='Run time (s) of an import job.')
+    parser.add_argument('--reconstruct-time', type=float, default=120, help='Run time (s) of a reconstruction job.')
+    parser.add_argument('--refine-time', type=float, default=600, help='Run time (s) of a refinement job.')
+    parser.add_argument('--poll-interval', type=float, default=1, help='(Minimum) job status polling interval (s).')
+    parser.add_argument('--lane-slots', type=int, default=None, help='Number of jobs running at the same time in the lane (e.g. GPUs). Unlimited by default.')
+    parser.add_argument('--max-jobs-in-flight', type=int, default=0, help='--max-jobs-in-flight of the concurrent strategy. 0 means unlimited.')
+    parser.add_argument('--output', type=str, help='Save the results as a JSON file.')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    results = []
+    print(f'{"strategy":<12}{"clusters":>10}{"wall (s)":>12}{"chain (s)":>12}{"round trips":>14}{"max running":>14}')
+    for n_clusters in args.clusters:
+        for strategy in args.strategies:
+            result = run_benchmark(args, strategy, n_clusters)
+            results.append(result)
+            print(f'{strategy:<12}{n_clusters:>10}{result["wall_time_s"]:>12.2f}{result["chain_time_s"]:>12.2f}'
+                  f'{result["round_trips"]:>14}{result["max_running"]:>14}')
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(dict(parameters=vars(args), results=results), f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
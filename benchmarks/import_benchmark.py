@@ -0,0 +1,145 @@
+"""Startup time benchmark of the cryopicls package and command line programs.
+
+Each case (an import, or a program run with --help) runs --repeat times in a fresh Python process, and the minimum and
+median wall times are reported, with the peak resident set size (RSS) of the process and the heavy dependencies
+(e.g. scikit-learn, umap, dash) it imported. With --importtime, the modules with the largest cumulative import times
+(python -X importtime) of each case are listed too.
+
+A case slower than --max-time (e.g. a --help expected to start in a fraction of a second) is flagged, and the exit status
+is then non-zero.
+
+Examples::
+
+    python benchmarks/import_benchmark.py --output import_benchmark.json
+
+    # Only the autorefine program, with its slowest imports
+    python benchmarks/import_benchmark.py --cases help/autorefine_cryosparc --importtime
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import statistics
+import subprocess
+
+root_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# Case name to Python code run in the process
+cases = {
+    'import/cryopicls': 'import cryopicls',
+    'import/clustering': 'import cryopicls.clustering.autogmm, cryopicls.clustering.xmeans, cryopicls.clustering.kmeans',
+    'import/data_handling': 'import cryopicls.data_handling.cryosparc, cryopicls.data_handling.relion',
+    'import/autorefine': 'import cryopicls.autorefine.cryosparc',
+    'import/visualization': 'import cryopicls.visualization.registry, cryopicls.visualization.raster',
+}
+programs = ['clustering', 'projector', 'autorefine_cryosparc', 'visualizer']
+for program in programs:
+    cases[f'help/{program}'] = (
+        f'import sys, runpy; sys.argv = ["cryopicls_{program}", "--help"]\n'
+        f'try:\n    runpy.run_module("cryopicls.cryopicls_{program}", run_name="__main__")\nexcept SystemExit:\n    pass'
+    )
+# Default --max-time of the cases
+max_times = {'import/cryopicls': 0.5, 'help/autorefine_cryosparc': 0.5}
+
+heavy_modules = ['numpy', 'pandas', 'yaml', 'sklearn', 'scipy', 'pyclustering', 'umap', 'numba', 'plotly', 'dash', 'matplotlib']
+
+# Appended to the code of a case, to report what it imported
+report_code = f'''
+import sys as _sys, json as _json, resource as _resource
+_sys.stderr.write("IMPORT_BENCHMARK_RESULT " + _json.dumps(dict(
+    peak_rss_mb=_resource.getrusage(_resource.RUSAGE_SELF).ru_maxrss / 1024,
+    modules=[x for x in {heavy_modules!r} if x in _sys.modules])) + "\\n")
+'''
+
+
+def run_process(code, importtime=False):
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([root_dir, os.environ.get('PYTHONPATH', '')]))
+    cmd = [sys.executable] + (['-X', 'importtime'] if importtime else []) + ['-c', code]
+    t_start = time.perf_counter()
+    ret = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, env=env, cwd=root_dir)
+    wall_time = time.perf_counter() - t_start
+    assert ret.returncode == 0, ret.stderr
+    return wall_time, ret.stderr
+
+
+def get_slowest_imports(stderr, n):
+    """Top n modules by cumulative import time (us) in the output of python -X importtime."""
+    imports = []
+    for line in stderr.splitlines():
+        if line.startswith('import time:') and '|' in line:
+            _, cumulative, name = line[len('import time:'):].split('|')
+            if cumulative.strip().isdigit():
+                imports.append((int(cumulative), name.strip()))
+    # Only the top level imports of each package (the cumulative times of nested imports are included in them)
+    top = dict()
+    for cumulative, name in imports:
+        top[name.split('.')[0]] = max(top.get(name.split('.')[0], 0), cumulative)
+    return [dict(module=k, cumulative_s=v / 1e6) for k, v in sorted(top.items(), key=lambda x: -x[1])[:n]]
+
+
+def run_case(args, case):
+    code = cases[case]
+    wall_times = [run_process(code)[0] for _ in range(args.repeat)]
+    _, stderr = run_process(code + report_code, importtime=args.importtime)
+    report = [x for x in stderr.splitlines() if x.startswith('IMPORT_BENCHMARK_RESULT ')][-1]
+    result = dict(
+        case=case,
+        min_time_s=min(wall_times),
+        median_time_s=statistics.median(wall_times),
+        wall_times_s=wall_times,
+        **json.loads(report.split(' ', 1)[1])
+    )
+    if args.importtime:
+        result['slowest_imports'] = get_slowest_imports(stderr, args.importtime_top)
+    max_time = args.max_time if args.max_time is not None else max_times.get(case)
+    result['max_time_s'] = max_time
+    result['too_slow'] = max_time is not None and result['min_time_s'] > max_time
+    return result
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+        description=__doc__.split('\n\n')[0]
+    )
+    parser.add_argument('--cases', nargs='+', type=str, default=list(cases), choices=list(cases), help='Cases to run.')
+    parser.add_argument('--repeat', type=int, default=5, help='Number of runs of each case.')
+    parser.add_argument('--max-time', type=float, help=f'Maximum minimum wall time (s) of each case. By default {max_times} (no limit for the other cases).')
+    parser.add_argument('--importtime', action='store_true', help='List the slowest imports of each case (python -X importtime).')
+    parser.add_argument('--importtime-top', type=int, default=8, help='Number of the slowest imports listed with --importtime.')
+    parser.add_argument('--output', type=str, help='Save the results as a JSON file.')
+    args = parser.parse_args()
+    assert args.repeat > 0, '--repeat must be a positive integer number.'
+    return args
+
+
+def main():
+    args = parse_args()
+
+    results = []
+    print(f'{"case":<30}{"min (s)":>10}{"median (s)":>12}{"peak RSS (MB)":>16}  heavy modules')
+    for case in args.cases:
+        result = run_case(args, case)
+        results.append(result)
+        flag = '  TOO SLOW' if result['too_slow'] else ''
+        print(f'{case:<30}{result["min_time_s"]:>10.3f}{result["median_time_s"]:>12.3f}{result["peak_rss_mb"]:>16.1f}  '
+              f'{",".join(result["modules"]) or "-"}{flag}')
+        for x in result.get('slowest_imports', []):
+            print(f'\t{x["module"]:<28}{x["cumulative_s"]:>10.3f}')
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(dict(
+                environment=dict(python=platform.python_version(), platform=platform.platform(), cpu_count=os.cpu_count()),
+                parameters=vars(args), results=results), f, indent=2)
+
+    too_slow = [x['case'] for x in results if x['too_slow']]
+    if len(too_slow) > 0:
+        sys.exit(f'Slower than --max-time: {", ".join(too_slow)}')
+
+
+if __name__ == '__main__':
+    main()
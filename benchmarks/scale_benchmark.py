@@ -0,0 +1,328 @@
+"""Scale benchmark of the clustering wrappers, the metadata I/O, cryopicls_projector and the visualizer figures.
+
+Synthetic datasets (gaussian blobs in the latent space, with matching cryoSPARC and RELION particle metadata,
+see cryopicls.data_handling.synthetic) of each --n-particles are generated, and each benchmark case runs in its own
+process, so that the peak resident set size (RSS) of one case does not leak into another. The wall time of the measured step (excluding the data generation)
+and the peak RSS of the process are recorded. On Linux, the peak RSS is that of the measured step only (the peak is reset
+after the setup). Elsewhere, it is the peak of the whole process, including the setup (peak_rss_includes_setup).
+
+The results are saved as JSON (--output), and can be compared with a previous results file (--baseline).
+A case whose wall time or peak RSS grew by more than --time-tolerance or --rss-tolerance over the baseline is flagged
+as a regression, and the exit status is then non-zero.
+
+Examples::
+
+    # Quick run
+    python benchmarks/scale_benchmark.py --n-particles 10000 100000 --output baseline.json
+
+    # Full scale, compared with a stored baseline
+    python benchmarks/scale_benchmark.py --n-particles 10000 100000 1000000 5000000 --baseline baseline.json --output results.json
+
+    # Only some cases
+    python benchmarks/scale_benchmark.py --cases clustering/k-means io/star-load --n-particles 1000000
+"""
+
+import os
+import io
+import sys
+import json
+import time
+import shutil
+import pickle
+import argparse
+import platform
+import tempfile
+import contextlib
+import subprocess
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import cryopicls
+import cryopicls.profiling
+import cryopicls.cryopicls_projector
+
+result_marker = 'SCALE_BENCHMARK_RESULT '
+
+
+def save_result_dataframe(Z, labels, outfile):
+    """Clustering result DataFrame of cryopicls_clustering."""
+    df = pd.concat([
+        pd.DataFrame(data=Z, columns=[f'dim_{x}' for x in range(1, Z.shape[1] + 1)]),
+        pd.Series(data=labels, name='cluster')
+    ], axis=1)
+    df.to_pickle(outfile)
+
+
+# Each case sets up its input in work_dir (not measured), and returns the function of the measured step.
+
+def setup_clustering(algorithm):
+    def setup(args, work_dir):
+        Z, _ = cryopicls.data_handling.synthetic.make_latent(args.n_particles, args.dims, args.clusters, seed=args.seed)
+        if algorithm == 'k-means':
+            model = cryopicls.clustering.kmeans.KMeansClustering(n_clusters=args.clusters, n_init=1, random_state=args.seed)
+        elif algorithm == 'auto-gmm':
+            model = cryopicls.clustering.autogmm.AutoGMMClustering(k_min=1, k_max=args.clusters + 2, n_init=1, random_state=args.seed)
+        elif algorithm == 'x-means':
+            model = cryopicls.clustering.xmeans.XMeansClustering(k_min=1, k_max=args.clusters + 2)
+        elif algorithm == 'g-means':
+            model = cryopicls.clustering.gmeans.GMeansClustering(k_min=1, k_max=args.clusters + 2)
+        elif algorithm == 'manual':
+            model = cryopicls.clustering.manual_select.ManualSelector([[0, -1, 1], [1, -1, 1]])
+        return lambda: model.fit(Z)
+    return setup
+
+
+def setup_cs_write(args, work_dir):
+    Z, _ = cryopicls.data_handling.synthetic.make_latent(args.n_particles, args.dims, args.clusters, seed=args.seed)
+    particles = cryopicls.data_handling.synthetic.make_particles(args.n_particles, seed=args.seed)
+    md = cryopicls.data_handling.synthetic.make_cryosparc_metadata(particles, latent=Z, rootname='benchmark', seed=args.seed)
+    return lambda: md.write(work_dir, 'benchmark')
+
+
+def setup_cs_load(args, work_dir):
+    setup_cs_write(args, work_dir)()
+    return lambda: cryopicls.data_handling.cryosparc.CryoSPARCMetaData.load(os.path.join(work_dir, 'benchmark_particles.csg'))
+
+
+def setup_cs_latent(args, work_dir):
+    setup_cs_write(args, work_dir)()
+    return lambda: cryopicls.data_handling.cryosparc.load_latent_variables(os.path.join(work_dir, 'benchmark_particles.cs'))
+
+
+def setup_star_write(args, work_dir):
+    particles = cryopicls.data_handling.synthetic.make_particles(args.n_particles, seed=args.seed)
+    md = cryopicls.data_handling.synthetic.make_relion_metadata(particles, relion31=True)
+    return lambda: md.write(work_dir, 'benchmark')
+
+
+def setup_star_load(args, work_dir):
+    setup_star_write(args, work_dir)()
+    return lambda: cryopicls.data_handling.relion.RelionMetaData.load(os.path.join(work_dir, 'benchmark.star'))
+
+
+def setup_star_read_column(args, work_dir):
+    setup_star_write(args, work_dir)()
+    return lambda: cryopicls.data_handling.relion.RelionMetaData.read_column(os.path.join(work_dir, 'benchmark.star'), '_rlnDefocusU')
+
+
+def setup_projector(algorithm):
+    def setup(args, work_dir):
+        Z, _ = cryopicls.data_handling.synthetic.make_latent(args.n_particles, args.dims, args.clusters, seed=args.seed)
+        z_file = os.path.join(work_dir, 'z.pkl')
+        with open(z_file, 'wb') as f:
+            pickle.dump(Z, f)
+        argv = ['cryopicls_projector', algorithm, '--cryodrgn', '--z-file', z_file, '--random-state', str(args.seed), '--output-dir', work_dir]
+        if algorithm == 'pca':
+            argv += ['--n-components', '2']
+
+        def run():
+            sys.argv = argv
+            cryopicls.cryopicls_projector.main()
+        return run
+    return setup
+
+
+def setup_visualizer(view):
+    def setup(args, work_dir):
+        # The figure functions are called by the callbacks of the app, which is created at import
+        import plotly.utils
+        import cryopicls.cryopicls_visualizer as visualizer
+
+        Z, labels = cryopicls.data_handling.synthetic.make_latent(args.n_particles, args.dims, args.clusters, seed=args.seed)
+        result_file = os.path.join(work_dir, 'benchmark_dataframe.pkl')
+        save_result_dataframe(Z, labels, result_file)
+        dataset = cryopicls.visualization.registry.Dataset('benchmark', clustering_result_file=result_file)
+        if view == 'load':
+            return lambda: dataset.get_data()
+
+        data = dataset.get_data()
+        axes = [x['value'] for x in data.get_options()]
+        if view == 'scatter2d':
+            create = lambda: visualizer.create_scatter2d(data, axes[0], axes[1], 'cluster', 'webgl', None)
+        elif view == 'scatter2d-raster':
+            create = lambda: visualizer.create_scatter2d(data, axes[0], axes[1], 'cluster', 'raster', None)
+        elif view == 'scatter3d':
+            create = lambda: visualizer.create_scatter3d(data, axes[0], axes[1], axes[2], 'cluster')
+        elif view == 'hist1d':
+            create = lambda: visualizer.create_hist1d(data, axes[0], 'cluster', 50)
+        elif view == 'dashboard':
+            create = lambda: visualizer.create_dashboard(data, axes[:4], axes[0], axes[1], 'cluster', dict())
+        # Including the serialization of the figure, as the callbacks send it to the browser
+        return lambda: json.dumps(create(), cls=plotly.utils.PlotlyJSONEncoder)
+    return setup
+
+
+cases = {
+    'clustering/k-means': setup_clustering('k-means'),
+    'clustering/auto-gmm': setup_clustering('auto-gmm'),
+    'clustering/x-means': setup_clustering('x-means'),
+    'clustering/g-means': setup_clustering('g-means'),
+    'clustering/manual': setup_clustering('manual'),
+    'io/cs-write': setup_cs_write,
+    'io/cs-load': setup_cs_load,
+    'io/cs-latent': setup_cs_latent,
+    'io/star-write': setup_star_write,
+    'io/star-load': setup_star_load,
+    'io/star-read-column': setup_star_read_column,
+    'projector/pca': setup_projector('pca'),
+    'projector/umap': setup_projector('umap'),
+    'visualizer/load': setup_visualizer('load'),
+    'visualizer/scatter2d': setup_visualizer('scatter2d'),
+    'visualizer/scatter2d-raster': setup_visualizer('scatter2d-raster'),
+    'visualizer/scatter3d': setup_visualizer('scatter3d'),
+    'visualizer/hist1d': setup_visualizer('hist1d'),
+    'visualizer/dashboard': setup_visualizer('dashboard'),
+}
+# Not run by default, as they take hours at millions of particles
+slow_cases = ['clustering/x-means', 'clustering/g-means', 'projector/umap']
+
+
+def run_case(args):
+    """Run a single case in this process, and print the result."""
+    work_dir = tempfile.mkdtemp(prefix='cryopicls_scale_benchmark_', dir=args.work_dir)
+    try:
+        # The wrappers and the entry points print their progress and results
+        with contextlib.redirect_stdout(io.StringIO()):
+            run = cases[args.run_case](args, work_dir)
+            setup_rss = cryopicls.profiling.get_rss()
+            # The peak RSS of the setup (e.g. the data generation) is not that of the measured step
+            peak_reset = cryopicls.profiling.reset_peak_rss()
+            t_start = time.perf_counter()
+            cpu_start = time.process_time()
+            run()
+            wall_time = time.perf_counter() - t_start
+            cpu_time = time.process_time() - cpu_start
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    result = dict(
+        wall_time_s=wall_time, cpu_time_s=cpu_time, peak_rss_mb=cryopicls.profiling.get_peak_rss(), setup_rss_mb=setup_rss,
+        peak_rss_includes_setup=not peak_reset
+    )
+    print(result_marker + json.dumps(result))
+
+
+def run_case_process(args, case, n_particles):
+    """Run a case in a child process, and return its result."""
+    com = [sys.executable, os.path.abspath(__file__), '--run-case', case, '--n-particles', str(n_particles),
+           '--dims', str(args.dims), '--clusters', str(args.clusters), '--seed', str(args.seed)]
+    if args.work_dir:
+        com += ['--work-dir', args.work_dir]
+    result = dict(case=case, n_particles=n_particles, status='ok')
+    try:
+        ret = subprocess.run(com, capture_output=True, timeout=args.timeout)
+    except subprocess.TimeoutExpired:
+        result['status'] = 'timeout'
+        return result
+    lines = [x for x in ret.stdout.decode().splitlines() if x.startswith(result_marker)]
+    if ret.returncode != 0 or len(lines) == 0:
+        result['status'] = 'error'
+        if ret.returncode < 0:
+            result['error'] = f'killed by signal {-ret.returncode}'
+        else:
+            result['error'] = (ret.stderr.decode().strip().splitlines() or [f'exit status {ret.returncode}'])[-1]
+        return result
+    result.update(json.loads(lines[-1][len(result_marker):]))
+    return result
+
+
+def get_environment():
+    return dict(
+        python=platform.python_version(), platform=platform.platform(), machine=platform.machine(), cpu_count=os.cpu_count(),
+        numpy=np.__version__, pandas=pd.__version__, cryopicls=cryopicls.__version__)
+
+
+def compare(results, baseline, time_tolerance, rss_tolerance, min_time):
+    """Compare results with baseline results of the same cases and sizes.
+
+    Returns
+    -------
+    list of dict
+        Per result found in baseline, the case, n_particles, wall time and peak RSS ratios to the baseline, and whether it is a regression.
+    """
+    baseline = {(x['case'], x['n_particles']): x for x in baseline if x['status'] == 'ok'}
+    comparisons = []
+    for result in results:
+        base = baseline.get((result['case'], result['n_particles']))
+        if base is None or result['status'] != 'ok':
+            continue
+        time_ratio = result['wall_time_s'] / max(base['wall_time_s'], 1e-9)
+        rss_ratio = result['peak_rss_mb'] / max(base['peak_rss_mb'], 1e-9)
+        # Very short steps are dominated by noise
+        slower = time_ratio > 1 + time_tolerance and result['wall_time_s'] - base['wall_time_s'] > min_time
+        larger = rss_ratio > 1 + rss_tolerance
+        comparisons.append(dict(
+            case=result['case'], n_particles=result['n_particles'], time_ratio=time_ratio, rss_ratio=rss_ratio,
+            regression=slower or larger))
+    return comparisons
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+        description=__doc__.split('\n\n')[0]
+    )
+    parser.add_argument('--cases', nargs='+', type=str, choices=list(cases), help=f'Cases to run. By default all but {slow_cases}.')
+    parser.add_argument('--n-particles', nargs='+', type=int, default=[10000, 100000, 1000000], help='Numbers of particles of the synthetic datasets, e.g. 10000 100000 1000000 5000000.')
+    parser.add_argument('--dims', type=int, default=8, help='Number of latent dimensions.')
+    parser.add_argument('--clusters', type=int, default=5, help='Number of gaussian blobs in the latent space.')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed of the synthetic datasets and of the algorithms.')
+    parser.add_argument('--timeout', type=float, default=3600, help='Time limit (s) of each case.')
+    parser.add_argument('--work-dir', type=str, help='Directory of the temporary files. By default the system temporary directory.')
+    parser.add_argument('--output', type=str, help='Save the results as a JSON file.')
+    parser.add_argument('--baseline', type=str, help='Results JSON file of a previous run to compare with.')
+    parser.add_argument('--time-tolerance', type=float, default=0.2, help='Wall time increase (fraction) over the baseline flagged as a regression.')
+    parser.add_argument('--rss-tolerance', type=float, default=0.2, help='Peak RSS increase (fraction) over the baseline flagged as a regression.')
+    parser.add_argument('--min-time', type=float, default=0.1, help='Wall time increases (s) below this are never flagged, as noise.')
+    parser.add_argument('--run-case', type=str, choices=list(cases), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_case:
+        assert len(args.n_particles) == 1
+        args.n_particles = args.n_particles[0]
+    if args.cases is None:
+        args.cases = [x for x in cases if x not in slow_cases]
+    assert args.baseline is None or os.path.exists(args.baseline), f'{args.baseline} : File not found.'
+
+    return args
+
+
+def main():
+    args = parse_args()
+    if args.run_case:
+        run_case(args)
+        return
+
+    results = []
+    print(f'{"case":<30}{"particles":>12}{"wall (s)":>12}{"cpu (s)":>12}{"peak RSS (MB)":>16}')
+    for n_particles in args.n_particles:
+        for case in args.cases:
+            result = run_case_process(args, case, n_particles)
+            results.append(result)
+            if result['status'] == 'ok':
+                print(f'{case:<30}{n_particles:>12}{result["wall_time_s"]:>12.3f}{result["cpu_time_s"]:>12.3f}{result["peak_rss_mb"]:>16.1f}')
+            else:
+                print(f'{case:<30}{n_particles:>12}  {result["status"]}: {result.get("error", "")}')
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(dict(environment=get_environment(), parameters=vars(args), results=results), f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        comparisons = compare(results, baseline['results'], args.time_tolerance, args.rss_tolerance, args.min_time)
+        print(f'\n##### Comparison with {args.baseline} #####')
+        print(f'{"case":<30}{"particles":>12}{"wall ratio":>12}{"RSS ratio":>12}')
+        for x in comparisons:
+            flag = '  REGRESSION' if x['regression'] else ''
+            print(f'{x["case"]:<30}{x["n_particles"]:>12}{x["time_ratio"]:>12.2f}{x["rss_ratio"]:>12.2f}{flag}')
+        regressions = [x for x in comparisons if x['regression']]
+        if len(regressions) > 0:
+            sys.exit(f'{len(regressions)} regression(s) found.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,204 @@
+"""Load test of a running cryopicls_visualizer server.
+
+Several concurrent clients drive the figure callbacks of the 2D/3D scatter and 1D histogram views of a dataset,
+the same way the browser does, and the latency percentiles and the throughput are reported.
+
+Example::
+
+    cryopicls_visualizer --dataset run1 clustering=run1_dataframe.pkl --workers 4 &
+    python benchmarks/visualizer_load_test.py --dataset run1 --clients 8 --requests 400 --vary
+"""
+
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+import urllib.request
+import concurrent.futures
+
+import numpy as np
+
+
+def get_payload(outputs, inputs, states, changed):
+    """Request body of /_dash-update-component. outputs are 'id.property', inputs and states are (id, property, value)."""
+    output_specs = [dict(id=x.split('.')[0], property=x.split('.')[1]) for x in outputs]
+    return dict(
+        output='..' + '...'.join(outputs) + '..' if len(outputs) > 1 else outputs[0],
+        outputs=output_specs if len(outputs) > 1 else output_specs[0],
+        inputs=[dict(id=i, property=p, value=v) for i, p, v in inputs],
+        state=[dict(id=i, property=p, value=v) for i, p, v in states],
+        changedPropIds=[changed],
+    )
+
+
+def get_scatter2d_payload(args, rng):
+    x_axis, y_axis = rng.sample(args.axes, 2) if args.vary else args.axes[:2]
+    relayout_data = None
+    changed = 'container-scatter-2d-card-1-button-update.n_clicks'
+    if args.vary:
+        # A random zoom, which is not in the figure cache
+        x0, y0 = rng.uniform(*args.range), rng.uniform(*args.range)
+        width = rng.uniform(0.1, 1) * (args.range[1] - args.range[0])
+        relayout_data = {'xaxis.range[0]': x0, 'xaxis.range[1]': x0 + width, 'yaxis.range[0]': y0, 'yaxis.range[1]': y0 + width}
+        changed = 'container-scatter-2d-graph-1.relayoutData'
+    return get_payload(
+        ['container-scatter-2d-store-figure.data', 'container-scatter-2d-graph-1.style',
+         'container-scatter-2d-text.children', 'container-scatter-2d-store-axes.data'],
+        [('container-scatter-2d-card-1-button-update', 'n_clicks', 1),
+         ('container-scatter-2d-graph-1', 'relayoutData', relayout_data)],
+        [('container-scatter-2d-graph-1', 'style', {'height': '70vh', 'display': 'none'}),
+         ('container-scatter-2d-dropdown-x', 'value', x_axis),
+         ('container-scatter-2d-dropdown-y', 'value', y_axis),
+         ('container-scatter-2d-switch-color', 'on', True),
+         ('container-scatter-2d-dropdown-metadata', 'value', None),
+         ('container-scatter-2d-dropdown-render', 'value', args.render_mode),
+         ('container-scatter-2d-store-dataset', 'data', args.dataset)],
+        changed)
+
+
+def get_scatter3d_payload(args, rng):
+    axes = rng.sample(args.axes, 3) if args.vary else args.axes[:3]
+    return get_payload(
+        ['container-scatter-3d-store-figure.data', 'container-scatter-3d-graph-1.style', 'container-scatter-3d-text.children'],
+        [('container-scatter-3d-card-1-button-update', 'n_clicks', 1)],
+        [('container-scatter-3d-graph-1', 'style', {'height': '70vh', 'display': 'none'}),
+         ('container-scatter-3d-dropdown-x', 'value', axes[0]),
+         ('container-scatter-3d-dropdown-y', 'value', axes[1]),
+         ('container-scatter-3d-dropdown-z', 'value', axes[2]),
+         ('container-scatter-3d-switch-color', 'on', True),
+         ('container-scatter-3d-dropdown-metadata', 'value', None),
+         ('container-scatter-3d-dropdown-render', 'value', 'markers'),
+         ('container-scatter-3d-slider-voxels', 'value', 40),
+         ('container-scatter-3d-slider-level', 'value', 20),
+         ('container-scatter-3d-store-dataset', 'data', args.dataset)],
+        'container-scatter-3d-card-1-button-update.n_clicks')
+
+
+def get_hist1d_payload(args, rng):
+    x_axis = rng.choice(args.axes) if args.vary else args.axes[0]
+    n_bins = rng.randrange(10, 201, 10) if args.vary else 50
+    return get_payload(
+        ['container-hist-1d-store-figure.data', 'container-hist-1d-graph-1.style', 'container-hist-1d-text.children'],
+        [('container-hist-1d-card-1-button-update', 'n_clicks', 1)],
+        [('container-hist-1d-graph-1', 'style', {'height': '70vh', 'display': 'none'}),
+         ('container-hist-1d-dropdown-x', 'value', x_axis),
+         ('container-hist-1d-switch-color', 'on', True),
+         ('container-hist-1d-slider-bins', 'value', n_bins),
+         ('container-hist-1d-store-dataset', 'data', args.dataset)],
+        'container-hist-1d-card-1-button-update.n_clicks')
+
+
+payload_functions = {
+    'scatter2d': get_scatter2d_payload,
+    'scatter3d': get_scatter3d_payload,
+    'hist1d': get_hist1d_payload,
+}
+
+
+def post(url, payload, timeout):
+    """POST a callback request, and return (latency in seconds, response size, error or None)."""
+    request = urllib.request.Request(
+        url + '/_dash-update-component', data=json.dumps(payload).encode('utf-8'),
+        headers={'Content-Type': 'application/json'}, method='POST')
+    t_start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            size = len(response.read())
+        error = None
+    except Exception as e:
+        size = 0
+        error = str(e)
+    return time.perf_counter() - t_start, size, error
+
+
+def summarize(latencies):
+    latencies = np.asarray(latencies) * 1000
+    if len(latencies) == 0:
+        return dict(n=0)
+    return dict(
+        n=len(latencies),
+        mean_ms=float(latencies.mean()),
+        p50_ms=float(np.percentile(latencies, 50)),
+        p90_ms=float(np.percentile(latencies, 90)),
+        p95_ms=float(np.percentile(latencies, 95)),
+        p99_ms=float(np.percentile(latencies, 99)),
+        max_ms=float(latencies.max()),
+    )
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+        description=__doc__.split('\n\n')[0]
+    )
+    parser.add_argument('--url', type=str, default='http://localhost:8050', help='URL of the visualizer server.')
+    parser.add_argument('--dataset', type=str, required=True, help='Name of the dataset to request.')
+    parser.add_argument('--axes', nargs='+', type=str, default=['dim_1', 'dim_2', 'dim_3'], help='Axes (columns) of the dataset to plot.')
+    parser.add_argument('--views', nargs='+', type=str, default=['scatter2d', 'hist1d', 'scatter3d'], choices=list(payload_functions), help='Views to request, in turn.')
+    parser.add_argument('--clients', type=int, default=8, help='Number of concurrent clients.')
+    parser.add_argument('--requests', type=int, default=200, help='Total number of requests.')
+    parser.add_argument('--vary', action='store_true', help='Vary the axes, zoom ranges and number of bins of the requests, so that they are mostly not served from the figure cache.')
+    parser.add_argument('--range', nargs=2, type=float, default=[-3, 3], help='Range of the random zooms of --vary.')
+    parser.add_argument('--render-mode', type=str, default='auto', choices=['auto', 'webgl', 'svg', 'raster'], help='Render mode of the 2D scatter plot.')
+    parser.add_argument('--timeout', type=float, default=120, help='Timeout (s) of each request.')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed of --vary.')
+    parser.add_argument('--output', type=str, help='Save the results as a JSON file.')
+
+    args = parser.parse_args()
+
+    assert len(args.axes) >= (3 if 'scatter3d' in args.views else 2 if 'scatter2d' in args.views else 1), 'Not enough --axes for the --views.'
+    assert args.clients > 0 and args.requests > 0, '--clients and --requests must be positive integer numbers.'
+
+    return args
+
+
+def main():
+    args = parse_args()
+    url = args.url.rstrip('/')
+    rng = random.Random(args.seed)
+    rng_lock = threading.Lock()
+
+    # Warm up: load the dataset and build the per-view indexes, excluded from the statistics
+    for view in args.views:
+        _, _, error = post(url, payload_functions[view](argparse.Namespace(**{**vars(args), 'vary': False}), rng), args.timeout)
+        assert error is None, f'Warm-up request of {view} failed: {error}'
+
+    def run(i):
+        view = args.views[i % len(args.views)]
+        with rng_lock:
+            payload = payload_functions[view](args, rng)
+        return (view, ) + post(url, payload, args.timeout)
+
+    t_start = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=args.clients) as executor:
+        results = list(executor.map(run, range(args.requests)))
+    wall_time = time.perf_counter() - t_start
+
+    errors = [x for x in results if x[3] is not None]
+    summary = dict(
+        url=url, dataset=args.dataset, clients=args.clients, requests=args.requests, vary=args.vary,
+        wall_time_s=wall_time,
+        throughput_rps=len(results) / wall_time,
+        errors=len(errors),
+        all=summarize([x[1] for x in results if x[3] is None]),
+        views={view: summarize([x[1] for x in results if x[0] == view and x[3] is None]) for view in args.views},
+    )
+
+    print(f'{len(results)} requests from {args.clients} clients in {wall_time:.2f} s ({summary["throughput_rps"]:.1f} requests/s), {len(errors)} errors')
+    print(f'{"view":<12}{"n":>6}{"p50":>10}{"p90":>10}{"p95":>10}{"p99":>10}{"max":>10}  (ms)')
+    for name, stats in [('all', summary['all'])] + list(summary['views'].items()):
+        if stats['n'] == 0:
+            continue
+        print(f'{name:<12}{stats["n"]:>6}' + ''.join(f'{stats[x]:>10.1f}' for x in ['p50_ms', 'p90_ms', 'p95_ms', 'p99_ms', 'max_ms']))
+    for error in sorted(set(x[3] for x in errors))[:5]:
+        print(f'Error: {error}', file=sys.stderr)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
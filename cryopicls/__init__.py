@@ -1,7 +1,14 @@
-from . import clustering
-from . import data_handling
-from . import utils
-from . import args
-from . import autorefine
+from . import lazy
 
 __version__ = '0.1.0'
+
+# Subpackages are imported on first access (e.g. cryopicls.clustering.autogmm), so that each program only imports its own dependencies
+__getattr__, __dir__ = lazy.attach(__name__, [
+    'clustering',
+    'data_handling',
+    'utils',
+    'profiling',
+    'visualization',
+    'args',
+    'autorefine',
+])
@@ -1,3 +1,8 @@
-from . import clustering
-from . import projector
-from . import autorefine_cryosparc
+from .. import lazy
+
+__getattr__, __dir__ = lazy.attach(__name__, [
+    'profiling',
+    'clustering',
+    'projector',
+    'autorefine_cryosparc',
+])
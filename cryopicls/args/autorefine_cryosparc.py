@@ -3,6 +3,8 @@ import sys
 import pathlib
 import os
 
+import cryopicls
+
 
 def get_absolute_path(path_str):
     return str(pathlib.Path(path_str).resolve())
@@ -23,24 +25,68 @@ def parse_args():
     )
     parser.add_argument(
         '--cache-dir', required=True, type=get_absolute_path,
-        help='Path to the cache directory in cryoSPARC project directory. Must be writable.'
+        help='Path to the cache directory in cryoSPARC project directory. Must be writable. With --transfer-mode ssh, a path on the cryoSPARC master node.'
+    )
+    parser.add_argument(
+        '--transfer-mode', default='auto', type=str, choices=['auto', 'hardlink', 'reflink', 'copy', 'ssh'],
+        help='How result group files are transferred to --cache-dir. auto: hard link if on the same filesystem, else reflink if supported, else copy. ssh: compressed tar stream over ssh, for a cache directory only reachable on the cryoSPARC master node.'
+    )
+    parser.add_argument(
+        '--transfer-verify', default='size-mtime', type=str, choices=['size-mtime', 'checksum', 'none'],
+        help='How a file already in --cache-dir is found up-to-date and skipped. none: always transfer.'
+    )
+    parser.add_argument(
+        '--transfer-threads', default=4, type=int,
+        help='Number of concurrent file transfers.'
+    )
+    parser.add_argument(
+        '--transport', default='ssh', type=str, choices=['ssh', 'local'],
+        help='How cryosparcm is run. ssh: on the cryoSPARC master node over ssh. local: in a local shell, when running on the cryoSPARC master node itself.'
     )
     parser.add_argument(
-        '--ssh-user', required=True, type=str,
-        help='User name for ssh login into cryoSPARC master node.'
+        '--ssh-user', default='', type=str,
+        help='User name for ssh login into cryoSPARC master node. Required with --transport ssh.'
     )
     parser.add_argument(
-        '--ssh-host', required=True, type=str,
-        help='cryoSPARC master node hostname.'
+        '--ssh-host', default='', type=str,
+        help='cryoSPARC master node hostname. Required with --transport ssh.'
     )
     parser.add_argument(
         '--ssh-port', default=22, type=int,
         help='Port number for ssh login into cryoSPARC master node.'
     )
+    parser.add_argument(
+        '--ssh-no-multiplexing', action='store_true',
+        help='Open a new ssh connection for every remote command, instead of sharing one connection (OpenSSH ControlMaster) for the whole run.'
+    )
+    parser.add_argument(
+        '--ssh-control-persist', default=600, type=int,
+        help='Time (s) the shared ssh connection stays open after the last remote command.'
+    )
+    parser.add_argument(
+        '--ssh-retries', default=5, type=int,
+        help='Number of retries of a remote command failing with an ssh connection error, with exponential backoff.'
+    )
+    parser.add_argument(
+        '--no-resume', action='store_true',
+        help='Start over, ignoring the journal of a previous run ({cryopicls_result_basename}_autorefine_journal.json in the result directory). By default, an interrupted run is resumed: completed jobs are skipped and jobs in flight are waited for.'
+    )
     parser.add_argument(
         '--csparc-lane', default='default', type=str,
         help='cryoSPARC lane to use.'
     )
+    parser.add_argument(
+        '--max-jobs-in-flight', default=0, type=int,
+        help='Maximum number of jobs queued or running at the same time in the lane. The job chains of the clusters run concurrently within this limit. 0 means unlimited.'
+    )
+    parser.add_argument(
+        '--poll-interval-min', default=1, type=float,
+        help='Minimum interval (s) of the job status polling. The interval grows while no job status changes.'
+    )
+    parser.add_argument(
+        '--poll-interval-max', default=30, type=float,
+        help='Maximum interval (s) of the job status polling.'
+    )
     parser.add_argument(
         '--csparc-user-email', required=True, type=str,
         help='E-mail address of cryoSPARC user.'
@@ -73,6 +119,7 @@ def parse_args():
         '--csparc-consensus-job-uid', required=True, type=str,
         help='cryoSPARC job uid (such as J1, J2, ...) of the consensus reconstruction job.'
     )
+    cryopicls.args.profiling.add_profiling_arguments(parser, '<--cryopicls-result-dir>/<--cryopicls-result-basename>_autorefine_metrics.json')
 
     args = parser.parse_args()
     print('##### Command #####\n\t' + ' '.join(sys.argv))
@@ -82,6 +129,12 @@ def parse_args():
     print(args_print_str)
 
     assert os.path.isdir(args.cryopicls_result_dir)
-    assert os.path.isdir(args.cache_dir) and os.access(args.cache_dir, os.W_OK)
+    if args.transport == 'ssh':
+        assert args.ssh_user != '' and args.ssh_host != '', '--ssh-user and --ssh-host are required with --transport ssh.'
+    else:
+        assert args.transfer_mode != 'ssh', '--transfer-mode ssh requires --transport ssh.'
+    if args.transfer_mode != 'ssh':
+        assert os.path.isdir(args.cache_dir) and os.access(args.cache_dir, os.W_OK)
+    cryopicls.args.profiling.check_profiling_args(args)
 
     return args
@@ -2,6 +2,8 @@ import argparse
 import sys
 import os
 
+import cryopicls
+
 
 def add_general_arguments(parser):
     group = parser.add_argument_group('General arguments')
@@ -12,7 +14,7 @@ def add_general_arguments(parser):
         '--cryosparc', action='store_true', help='Use latent representations calculated by cryoSPARC 3D variability analysis.'
     )
     group.add_argument(
-        '--z-file', type=str, help='Required for --cryodrgn. The pickled file containing the learned latent representation data (z.pkl).'
+        '--z-file', type=str, help='Required for --cryodrgn. The pickled file containing the learned latent representation data (z.pkl). A columnar result file of cryoPICLS (.cpc) is also accepted.'
     )
     group.add_argument(
         '--metadata', type=str, help='Required for --cryodrgn. If a RELION refinement was the input for cryoDRGN, specify the star file here. Else if a cryoSPARC refinement was the input for cryoDRGN, specify the .csg result group file here (e.g. <PJ>_<JOB>_particles.csg)'
@@ -32,6 +34,13 @@ def add_general_arguments(parser):
     group.add_argument(
         '--output-file-rootname', default='cryopicls', type=str, help='Output file root name.'
     )
+    group.add_argument(
+        '--output-format', default='pickle', type=str, choices=['pickle', 'columnar'], help='File format of the result DataFrame (input for cryopicls_visualizer). pickle: pickled pandas.DataFrame (.pkl). columnar: memory-mappable columnar file (.cpc) with float32 coordinates and int16 cluster labels, which can be partially read.'
+    )
+    group.add_argument(
+        '--progress-interval', default=10., type=float, help='Interval (s) of the progress lines printed during the fit: EM iteration of the running restart of auto-gmm with an estimate of the remaining time, or elapsed time of the other algorithms. 0 prints only the end of each K. The restarts, iterations, lower bounds and convergence of each K are saved to <--output-file-rootname>_fit_telemetry.json.'
+    )
+    cryopicls.args.profiling.add_profiling_arguments(parser, '<--output-dir>/<--output-file-rootname>_metrics.json')
     return parser
 
 
@@ -187,6 +196,8 @@ def parse_args():
         assert args.threedvar_csg is not None, 'Must specify --threedvar_csg'
         assert os.path.exists(args.threedvar_csg), f'--threedvar-csg {args.threedvar_csg} not found.'
 
+    cryopicls.args.profiling.check_profiling_args(args)
+
     if args.output_dir is None:
         # Defaults to the current directory
         args.output_dir = os.getcwd()
@@ -0,0 +1,21 @@
+def add_profiling_arguments(parser, default_metrics_out):
+    group = parser.add_argument_group('Profiling arguments')
+    group.add_argument(
+        '--profile', action='store_true', help='Record the wall time, CPU time and peak memory (resident set size) of each stage of the run, and the input sizes. They are printed at the end of the run and saved as JSON (see --metrics-out), also when the run fails.'
+    )
+    group.add_argument(
+        '--metrics-out', type=str, help=f'JSON file of the metrics recorded by --profile. Implies --profile. By default {default_metrics_out}.'
+    )
+    group.add_argument(
+        '--profile-stage', type=str, help='Run this stage (e.g. fit) under a sampling profiler of the Python stack. Implies --profile. The samples are saved as collapsed stacks (input of flame graph tools such as flamegraph.pl or speedscope) next to --metrics-out, and the functions with the most samples are added to the metrics.'
+    )
+    group.add_argument(
+        '--profile-interval', type=float, default=0.005, help='Sampling interval (s) of --profile-stage.'
+    )
+    return parser
+
+
+def check_profiling_args(args):
+    if args.metrics_out is not None or args.profile_stage is not None:
+        args.profile = True
+    assert args.profile_interval > 0, '--profile-interval must be a positive number.'
@@ -1,6 +1,8 @@
 import argparse
 import os
 
+import cryopicls
+
 
 def add_general_arguments(parser):
     group = parser.add_argument_group('General arguments')
@@ -11,7 +13,7 @@ def add_general_arguments(parser):
         '--cryosparc', action='store_true', help='Use latent representations calculated by cryoSPARC 3D variability analysis.'
     )
     group.add_argument(
-        '--z-file', type=str, help='Required for --cryodrgn. The pickled file containing the learned latent representation data (z.pkl).'
+        '--z-file', type=str, help='Required for --cryodrgn. The pickled file containing the learned latent representation data (z.pkl). A columnar result file of cryoPICLS (.cpc) is also accepted.'
     )
     group.add_argument(
         '--threedvar-csg', help='Required for --cryosparc. The 3D variability job .csg result group file (e.g. <PJ>_<JOB>_particles.csg).'
@@ -28,6 +30,10 @@ def add_general_arguments(parser):
     group.add_argument(
         '--output-file-rootname', default='cryopicls', type=str, help='Output file root name.'
     )
+    group.add_argument(
+        '--output-format', default='pickle', type=str, choices=['pickle', 'columnar'], help='File format of the result DataFrame (input for cryopicls_visualizer). pickle: pickled pandas.DataFrame (.pkl). columnar: memory-mappable columnar file (.cpc) with float32 coordinates and int16 cluster labels, which can be partially read.'
+    )
+    cryopicls.args.profiling.add_profiling_arguments(parser, '<--output-dir>/<--output-file-rootname>_<algorithm>_metrics.json')
     return parser
 
 
@@ -87,6 +93,8 @@ def parser_args():
         assert args.threedvar_csg is not None, 'Must specify --threedvar_csg'
         assert os.path.exists(args.threedvar_csg), f'--threedvar-csg {args.threedvar_csg} not found.'
 
+    cryopicls.args.profiling.check_profiling_args(args)
+
     if args.output_dir is None:
         # Defaults to the current directory
         args.output_dir = os.getcwd()
@@ -1 +1,12 @@
-from . import cryosparc
+from .. import lazy
+
+__getattr__, __dir__ = lazy.attach(__name__, [
+    'batch',
+    'transfer',
+    'transport',
+    'simulator',
+    'cryosparc',
+    'journal',
+    'monitor',
+    'scheduler',
+])
@@ -0,0 +1,113 @@
+import json
+import base64
+import inspect
+
+
+result_marker = 'CRYOPICLS_BATCH_RESULT '
+
+
+def ref(i):
+    """Placeholder of the result of the i-th operation of a batch, usable inside strings (e.g. f'{ref(0)}.particles')."""
+    return f'{{${i}}}'
+
+
+def op(name, *args, **kwargs):
+    """Operation of a batch: a call of the cryoSPARC command client function name(*args, **kwargs)."""
+    return dict(op=name, args=list(args), kwargs=kwargs)
+
+
+def execute(cli, ops, poll_interval=0.05, timeout=60):
+    """Run the operations of a batch in order with a cryoSPARC command client.
+
+    This function runs on the cryoSPARC master node (its source is sent by get_remote_script()), thus must be self-contained.
+    The placeholders ref(i) in the arguments are replaced by the result of the i-th operation.
+    Instead of fixed waits, each make_job is followed by a check that the job is ready to be enqueued (status 'building'),
+    and each enqueue_job by a check that the job has left the 'building' status.
+
+    Parameters
+    ----------
+    cli : cryosparc_compute.client.CommandClient
+        cryoSPARC command client (or an object with the same interface).
+
+    ops : list of dict
+        Operations (see op()).
+
+    poll_interval : float, optional
+        Interval (s) of the readiness checks. By default 0.05.
+
+    timeout : float, optional
+        Timeout (s) of each readiness check. By default 60.
+
+    Returns
+    -------
+    dict
+        'results' : list of the results of the operations run,
+        'error' : None, or the error message of the failed operation (the following ones are not run).
+    """
+
+    import re
+    import time
+
+    results = []
+
+    def resolve(x):
+        if isinstance(x, str):
+            return re.sub(r'\{\$(\d+)\}', lambda m: str(results[int(m.group(1))]), x)
+        if isinstance(x, list):
+            return [resolve(y) for y in x]
+        if isinstance(x, dict):
+            return {resolve(k): resolve(v) for k, v in x.items()}
+        return x
+
+    def wait_status(project_uid, job_uid, is_ready):
+        t_start = time.time()
+        while True:
+            status = cli.get_job(project_uid, job_uid, 'status')['status']
+            if is_ready(status):
+                return
+            if time.time() - t_start > timeout:
+                raise TimeoutError(f'Job {project_uid}-{job_uid} not ready (status {status}) after {timeout} s')
+            time.sleep(poll_interval)
+
+    for i, x in enumerate(ops):
+        args, kwargs = resolve(x['args']), resolve(x['kwargs'])
+        try:
+            result = getattr(cli, x['op'])(*args, **kwargs)
+            if x['op'] == 'make_job':
+                wait_status(kwargs['project_uid'], result, lambda status: status == 'building')
+            elif x['op'] == 'enqueue_job':
+                wait_status(args[0] if len(args) > 0 else kwargs['project_uid'],
+                            args[1] if len(args) > 1 else kwargs['job_uid'], lambda status: status != 'building')
+        except Exception as e:
+            return dict(results=results, error=f'Operation {i} ({x["op"]}) failed: {e!r}')
+        results.append(result)
+
+    return dict(results=results, error=None)
+
+
+def get_remote_script(ops, poll_interval=0.05, timeout=60):
+    """Python one-liner running a batch with the command client of the cryoSPARC master node, and printing the result as JSON.
+
+    The source of execute() and the operations are base64-encoded, so that the script survives the shell quoting of ssh.
+    It is meant to run as `cryosparcm call python -c "<script>"`.
+    """
+
+    source = '\n'.join([
+        'import os, sys, json',
+        'from cryosparc_compute import client',
+        inspect.getsource(execute),
+        "cli = client.CommandClient(host=os.environ['CRYOSPARC_MASTER_HOSTNAME'], port=int(os.environ['CRYOSPARC_COMMAND_CORE_PORT']))",
+        f'ops = json.loads({json.dumps(json.dumps(ops))})',
+        f'ret = execute(cli, ops, poll_interval={poll_interval!r}, timeout={timeout!r})',
+        f'print({result_marker!r} + json.dumps(ret, default=str))',
+    ])
+    encoded = base64.b64encode(source.encode('utf-8')).decode('ascii')
+    return f"import base64; exec(base64.b64decode('{encoded}'))"
+
+
+def parse_output(output):
+    """Parse the result printed by the script of get_remote_script(). Other output lines (e.g. warnings) are ignored."""
+    for line in output.splitlines()[::-1]:
+        if line.startswith(result_marker):
+            return json.loads(line[len(result_marker):])
+    raise ValueError(f'No batch result found in the output: {output[-1000:]}')
@@ -1,127 +1,285 @@
-import subprocess
 import os
 import time
-import shutil
-import re
 
 import cryopicls
 
 
 class CryoSPARCCom:
+    """Communicator with a cryoSPARC master node, through its command client.
+
+    The commands go through a transport (see cryopicls.autorefine.transport): by default ssh, with all the commands sharing
+    one multiplexed connection (OpenSSH ControlMaster), so that only the first command pays for the connection setup.
+    A single instance is meant to be shared by all the jobs of a run. Call close() (or use it as a context manager) at the end.
+
+    Parameters
+    ----------
+    ssh_user, ssh_host : str
+        User name and hostname of the cryoSPARC master node. Not used if transport is given.
+
+    ssh_port : int
+        Port number of ssh. Not used if transport is given.
+
+    csparc_user_email : str
+        E-mail address of the cryoSPARC user.
+
+    print_com : bool, optional
+        Print each command. By default True.
+
+    sleep_time : float, optional
+        Interval (s) of the job status polling of wait_job_complete(). By default 1.
+
+    ssh_multiplexing : bool, optional
+        Share one ssh connection between the commands. By default True.
+
+    control_persist : int, optional
+        Time (s) the shared connection stays open after the last command. By default 600.
+
+    csparc_user_id : str, optional
+        cryoSPARC user id, if already known. By default None (looked up from csparc_user_email).
+
+    ready_timeout : float, optional
+        Timeout (s) of the readiness checks of created and enqueued jobs (see run_batch()). By default 60.
+
+    transfer_mode : str, optional
+        How result groups are transferred to the cache directory: 'auto', 'hardlink', 'reflink', 'copy',
+        or 'ssh' (compressed stream to the cryoSPARC master node). See cryopicls.autorefine.transfer. By default 'auto'.
+
+    transfer_verify : str, optional
+        How an existing copy in the cache directory is found up-to-date: 'size-mtime', 'checksum' or 'none'. By default 'size-mtime'.
+
+    transfer_threads : int, optional
+        Number of concurrent file transfers. By default 4.
+
+    max_retries : int, optional
+        Number of retries of a command failing with an ssh connection error (exit status 255), with exponential backoff. By default 5.
+
+    retry_wait : float, optional
+        Wait time (s) before the first retry, doubled at each retry. By default 1.
+
+    transport : cryopicls.autorefine.transport.Transport, optional
+        Transport of the commands, e.g. LocalTransport on the master node itself, or SimulatorTransport for tests.
+        By default None (SSHTransport with the ssh parameters above).
+    """
+
     def __init__(self, ssh_user, ssh_host, ssh_port, csparc_user_email, print_com=True,
-                 sleep_time=1):
+                 sleep_time=1, ssh_multiplexing=True, control_persist=600, csparc_user_id=None,
+                 ready_timeout=60, transfer_mode='auto', transfer_verify='size-mtime', transfer_threads=4,
+                 max_retries=5, retry_wait=1, transport=None):
         self.ssh_user = ssh_user
         self.ssh_host = ssh_host
         self.ssh_port = ssh_port
         self.csparc_user_email = csparc_user_email
         self.sleep_time = sleep_time
         self.print_com = print_com
-        self.csparc_user_id = self.get_user_id()
+        self.ready_timeout = ready_timeout
+        self.transfer_mode = transfer_mode
+        self.transfer_verify = transfer_verify
+        self.transfer_threads = transfer_threads
+        if transport is None:
+            transport = cryopicls.autorefine.transport.SSHTransport(
+                ssh_user, ssh_host, ssh_port, multiplexing=ssh_multiplexing, control_persist=control_persist,
+                print_com=print_com, max_retries=max_retries, retry_wait=retry_wait)
+        self.transport = transport
+        if csparc_user_id is None:
+            csparc_user_id = self.get_user_id()
+        self.csparc_user_id = csparc_user_id
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def latencies(self):
+        return self.transport.latencies
 
-    def sshcom(self, command):
-        com = f"""ssh {self.ssh_user}@{self.ssh_host} -p {self.ssh_port} "{command}" """
-        if self.print_com:
-            print(com)
+    def get_ssh_command(self):
+        assert isinstance(self.transport, cryopicls.autorefine.transport.SSHTransport), 'Not connected over ssh.'
+        return self.transport.get_ssh_command()
 
-        ret = subprocess.run(com, shell=True, capture_output=True)
+    def sshcom(self, command, name=None):
+        """Run a shell command on the master node, and return its stdout."""
+        return self.transport.run(command, name=name)
 
-        assert ret.returncode == 0, ret.stderr.decode()
+    def close(self):
+        """Close the connection of the transport (e.g. the shared ssh connection)."""
+        self.transport.close()
 
-        ret_stdout = ret.stdout.decode().rstrip()
+    def get_latency_stats(self):
+        """Latency statistics of the round trips so far (see cryopicls.autorefine.transport.Transport.get_latency_stats())."""
+        return self.transport.get_latency_stats()
 
-        return ret_stdout
+    def print_latency_stats(self):
+        stats = self.get_latency_stats()
+        print('##### Remote command latency #####')
+        print(f'\t{"command":<24}{"n":>6}{"total":>10}{"mean":>10}{"p50":>10}{"p95":>10}{"max":>10}  (s)')
+        for name, x in stats.items():
+            print(f'\t{name:<24}{x["n"]:>6}' + ''.join(f'{x[k]:>10.3f}' for k in ['total_s', 'mean_s', 'p50_s', 'p95_s', 'max_s']))
 
     def get_user_id(self):
-        com = f"""cryosparcm cli \\"GetUser('{self.csparc_user_email}')['_id']\\" """
-        user_id = self.sshcom(com)
-        return user_id
+        return self.transport.cli(f"GetUser('{self.csparc_user_email}')['_id']")
 
-    def make_workspace(self, project_uid, title='', desc=''):
-        com = f"""cryosparcm cli \\"create_empty_workspace(project_uid='{project_uid}', created_by_user_id='{self.csparc_user_id}'"""
+    def run_batch(self, ops):
+        """Run several cryoSPARC client operations in a single remote invocation.
+
+        The operations run in order in one Python process on the master node, with readiness checks instead of fixed waits
+        (see cryopicls.autorefine.batch.execute()). Later operations can refer to the results of earlier ones with
+        cryopicls.autorefine.batch.ref().
+
+        Parameters
+        ----------
+        ops : list of dict
+            Operations, made by make_workspace_op(), make_job_op(), enqueue_job_op() or cryopicls.autorefine.batch.op().
+
+        Returns
+        -------
+        list
+            Result of each operation.
+        """
 
+        ret = self.transport.batch(ops, timeout=self.ready_timeout)
+        assert ret['error'] is None, ret['error']
+        return ret['results']
+
+    def make_workspace_op(self, project_uid, title='', desc=''):
+        kwargs = dict(project_uid=project_uid, created_by_user_id=self.csparc_user_id)
         if title != '':
-            com += f", title='{title}'"
+            kwargs['title'] = title
         if desc != '':
-            com += f", desc='{desc}'"
+            kwargs['desc'] = desc
+        return cryopicls.autorefine.batch.op('create_empty_workspace', **kwargs)
 
-        com += ')\\"'
+    def make_job_op(self, job_type, project_uid, workspace_uid, params=None,
+                    input_group_connects=None, title=''):
+        if params is None:
+            params = dict()
+        kwargs = dict(job_type=job_type, title=title, project_uid=project_uid, workspace_uid=workspace_uid,
+                      user_id=self.csparc_user_id, params=params)
+        if input_group_connects is not None:
+            kwargs['input_group_connects'] = input_group_connects
+        return cryopicls.autorefine.batch.op('make_job', **kwargs)
 
-        workspace_uid = self.sshcom(com)
-        time.sleep(self.sleep_time)
+    def enqueue_job_op(self, project_uid, job_uid, lane='default'):
+        return cryopicls.autorefine.batch.op('enqueue_job', project_uid, job_uid, lane)
 
+    def make_workspace(self, project_uid, title='', desc=''):
+        workspace_uid, = self.run_batch([self.make_workspace_op(project_uid, title=title, desc=desc)])
         return workspace_uid
 
     def make_job(self, job_type, project_uid, workspace_uid, params=None,
                  input_group_connects=None, title=''):
-        if params is None:
-            params = dict()
+        job_uid, = self.run_batch([
+            self.make_job_op(job_type, project_uid, workspace_uid, params=params,
+                             input_group_connects=input_group_connects, title=title)
+        ])
+        return job_uid
 
-        com = f"""cryosparcm cli \\"make_job(job_type='{job_type}', title='{title}', project_uid='{project_uid}', workspace_uid='{workspace_uid}', user_id='{self.csparc_user_id}', params={params}"""
+    def enqueue_job(self, project_uid, job_uid, lane='default'):
+        self.run_batch([self.enqueue_job_op(project_uid, job_uid, lane)])
 
-        if input_group_connects is not None:
-            com += f", input_group_connects={input_group_connects}"
+    def transfer_result_groups_to_cache(self, csg_files, cache_dir):
+        """Transfer the .csg, .cs and passthrough files of result groups to the cache directory, all in one pool.
 
-        com += ')\\"'
+        Files already up-to-date in the cache directory are skipped (see cryopicls.autorefine.transfer).
 
-        job_uid = self.sshcom(com)
-        time.sleep(self.sleep_time)
+        Returns
+        -------
+        list of str
+            Path to each transferred .csg file.
+        """
 
-        return job_uid
+        files = []
+        for csg_file in csg_files:
+            assert os.path.exists(csg_file)
+            cs_file, passthrough_file = \
+                cryopicls.data_handling.cryosparc.get_metafiles_from_csg(csg_file)
+            assert os.path.exists(cs_file)
+            files += [csg_file, cs_file]
+            if passthrough_file is not None:
+                assert os.path.exists(passthrough_file)
+                files.append(passthrough_file)
 
-    def enqueue_job(self, project_uid, job_uid, lane='default'):
-        com = f"""cryosparcm cli \\"enqueue_job('{project_uid}', '{job_uid}', '{lane}')\\" """
-        self.sshcom(com)
-        time.sleep(self.sleep_time)
+        t_start = time.perf_counter()
+        if self.transfer_mode == 'ssh':
+            ret = cryopicls.autorefine.transfer.transfer_files_ssh(
+                files, cache_dir, self.get_ssh_command(), verify=self.transfer_verify)
+        else:
+            ret = cryopicls.autorefine.transfer.transfer_files(
+                files, cache_dir, mode=self.transfer_mode, verify=self.transfer_verify, n_threads=self.transfer_threads)
+        methods = [method for _, method in ret]
+        print(f'Transferred {len(files)} files to {cache_dir} in {time.perf_counter() - t_start:.1f} s ('
+              + ', '.join(f'{methods.count(x)} {x}' for x in sorted(set(methods))) + ')')
+
+        return [os.path.join(cache_dir, os.path.basename(x)) for x in csg_files]
 
     def _transfer_result_group_to_cache(self, csg_file, cache_dir):
-        assert os.path.exists(csg_file)
         cs_file, passthrough_file = \
             cryopicls.data_handling.cryosparc.get_metafiles_from_csg(csg_file)
-        assert os.path.exists(cs_file)
-        if passthrough_file is not None:
-            assert os.path.exists(passthrough_file)
-
-        os.makedirs(cache_dir, exist_ok=True)
-        csg_file = shutil.copy2(csg_file, cache_dir)
-        cs_file = shutil.copy2(cs_file, cache_dir)
+        csg_file, = self.transfer_result_groups_to_cache([csg_file], cache_dir)
+        cs_file = os.path.join(cache_dir, os.path.basename(cs_file))
         if passthrough_file is not None:
-            passthrough_file = shutil.copy2(passthrough_file, cache_dir)
+            passthrough_file = os.path.join(cache_dir, os.path.basename(passthrough_file))
 
         return csg_file, cs_file, passthrough_file
 
-    def wait_job_complete(self, project_uid, job_uid, sleep_time=1, print_msg=True):
+    def get_job_statuses(self, jobs):
+        """Statuses of several jobs, in a single remote call.
+
+        Parameters
+        ----------
+        jobs : list of (project_uid, job_uid)
+            Jobs to query.
+
+        Returns
+        -------
+        list of str
+            Status of each job.
+        """
+
+        ops = [cryopicls.autorefine.batch.op('get_job', project_uid, job_uid, 'status') for project_uid, job_uid in jobs]
+        return [x['status'] for x in self.run_batch(ops)]
+
+    def wait_job_complete(self, project_uid, job_uid, sleep_time=None, print_msg=True):
+        """Wait until a job reaches a terminal status (completed, failed or killed), and return the status.
+
+        To wait for many jobs, cryopicls.autorefine.monitor.JobStatusMonitor queries them all at once.
+        """
+
         # wait_job_complete deplecated in v3?? not working..
-        # com = f"""cryosparcm cli \\"wait_job_complete('{project_uid}', '{job_uid}')\\" """
-        # self.sshcom(com)
-        com = f"""cryosparcm cli \\"get_job('{project_uid}', '{job_uid}', 'status')\\" """
+        # self.transport.cli(f"wait_job_complete('{project_uid}', '{job_uid}')")
+        if sleep_time is None:
+            sleep_time = self.sleep_time
         if print_msg:
             print(f'Waiting job {project_uid}-{job_uid} for complete...')
         while True:
-            ret = self.sshcom(com)
-            m = re.match(r".+'status': '([a-z]+)'.*", ret)
-            status = m.group(1)
-            if status == 'completed':
+            status, = self.get_job_statuses([(project_uid, job_uid)])
+            if status in cryopicls.autorefine.monitor.terminal_statuses:
                 break
             time.sleep(sleep_time)
         return status
 
-    def import_clustering_result_group(self, project_uid, workspace_uid,
-                                       csg_file, cache_dir=None, title='',
-                                       lane='default'):
-        assert os.path.exists(csg_file)
-
+    def make_import_job_op(self, project_uid, workspace_uid, csg_file, cache_dir=None, title=''):
         if cache_dir is not None:
             csg_file, cs_file, passthrough_file = \
                 self._transfer_result_group_to_cache(csg_file, cache_dir)
-        else:
-            cs_file, passthrough_file = \
-                cryopicls.data_handling.cryosparc.get_metafiles_from_csg(csg_file)
 
-        job_uid = self.make_job(
+        return self.make_job_op(
             'import_result_group', project_uid, workspace_uid,
             params={'blob_path': csg_file}, title=title
         )
 
+    def make_import_job(self, project_uid, workspace_uid, csg_file, cache_dir=None, title=''):
+        job_uid, = self.run_batch([
+            self.make_import_job_op(project_uid, workspace_uid, csg_file, cache_dir=cache_dir, title=title)
+        ])
+        return job_uid
+
+    def import_clustering_result_group(self, project_uid, workspace_uid,
+                                       csg_file, cache_dir=None, title='',
+                                       lane='default'):
+        job_uid = self.make_import_job(project_uid, workspace_uid, csg_file, cache_dir=cache_dir, title=title)
+
         self.enqueue_job(project_uid, job_uid, lane)
 
         self.wait_job_complete(project_uid, job_uid)
@@ -0,0 +1,91 @@
+import os
+import json
+import threading
+
+
+class Journal:
+    """Local record of the cryoSPARC jobs of an autorefine run, so that an interrupted run can be resumed.
+
+    The journal is a JSON file, rewritten atomically (write to a temporary file, then rename) at every update::
+
+        {
+            "project_uid": "P1",
+            "workspace_uid": "W2",
+            "groups": {
+                "cryopicls_cluster000_particles.csg": {
+                    "import": {"job_uid": "J10", "status": "completed"},
+                    "reconstruct": {"job_uid": "J12", "status": "running"},
+                    ...
+                },
+                ...
+            }
+        }
+
+    Parameters
+    ----------
+    path : str
+        Path to the journal file. Loaded if it exists.
+
+    project_uid : str
+        cryoSPARC project uid of the run. An existing journal of another project is not reused.
+    """
+
+    def __init__(self, path, project_uid):
+        self.path = path
+        self._lock = threading.Lock()
+        self.data = dict(project_uid=project_uid, workspace_uid=None, groups=dict())
+        if os.path.exists(path):
+            with open(path) as f:
+                data = json.load(f)
+            if data.get('project_uid') == project_uid:
+                self.data = data
+            else:
+                print(f'Journal {path} is of project {data.get("project_uid")}, not {project_uid}. Starting over.')
+
+    @staticmethod
+    def get_key(csg_file):
+        return os.path.basename(csg_file)
+
+    @property
+    def workspace_uid(self):
+        return self.data['workspace_uid']
+
+    def set_workspace_uid(self, workspace_uid):
+        with self._lock:
+            self.data['workspace_uid'] = workspace_uid
+            self._save()
+
+    def get(self, csg_file, step):
+        """Journal entry (dict of job_uid and status) of a step of a result group, or None."""
+        with self._lock:
+            entry = self.data['groups'].get(self.get_key(csg_file), dict()).get(step)
+            return dict(entry) if entry is not None else None
+
+    def set(self, csg_file, step, job_uid, status):
+        with self._lock:
+            self.data['groups'].setdefault(self.get_key(csg_file), dict())[step] = dict(job_uid=job_uid, status=status)
+            self._save()
+
+    def get_jobs(self):
+        """All the jobs in the journal, as a list of (csg file name, step, job_uid)."""
+        with self._lock:
+            return self._get_jobs()
+
+    def update_statuses(self, statuses):
+        """Update the statuses of the jobs of get_jobs(), in the same order."""
+        with self._lock:
+            for (key, step, _), status in zip(self._get_jobs(), statuses):
+                self.data['groups'][key][step]['status'] = status
+            self._save()
+
+    def _get_jobs(self):
+        return [
+            (key, step, entry['job_uid'])
+            for key, steps in self.data['groups'].items() for step, entry in steps.items()
+        ]
+
+    def _save(self):
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.data, f, indent=2)
+        os.replace(tmp, self.path)
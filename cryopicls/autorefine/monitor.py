@@ -0,0 +1,159 @@
+import sys
+import threading
+import concurrent.futures
+
+
+terminal_statuses = ('completed', 'failed', 'killed')
+
+
+class JobStatusMonitor:
+    """Tracks the status of many cryoSPARC jobs with one remote query per tick.
+
+    A background thread fetches the statuses of all the tracked jobs in a single batch (see CryoSPARCCom.get_job_statuses()).
+    The polling interval starts at min_interval, is multiplied by backoff at every tick without any status change (up to max_interval),
+    and goes back to min_interval when a status changes or a new job is tracked. Short jobs (e.g. imports) are thus noticed quickly,
+    while long refinements are not polled needlessly often.
+    A job stops being tracked when it reaches a terminal status (completed, failed or killed),
+    and its future is resolved and its callbacks are called with that status.
+
+    Parameters
+    ----------
+    csparc_com : cryopicls.autorefine.cryosparc.CryoSPARCCom
+        Communicator with the cryoSPARC master node.
+
+    min_interval, max_interval : float, optional
+        Minimum and maximum polling intervals (s). By default 1 and 30.
+
+    backoff : float, optional
+        Growth factor of the polling interval. By default 1.5.
+
+    max_errors : int, optional
+        Number of consecutive failed queries after which all the tracked jobs fail. By default 5.
+
+    print_msg : bool, optional
+        Print the status changes. By default True.
+    """
+
+    def __init__(self, csparc_com, min_interval=1, max_interval=30, backoff=1.5, max_errors=5, print_msg=True):
+        self.csparc_com = csparc_com
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.max_errors = max_errors
+        self.print_msg = print_msg
+        self.n_queries = 0
+        # (project_uid, job_uid) to [last status, future, callbacks]
+        self._jobs = dict()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = False
+        self._thread = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def watch(self, project_uid, job_uid, callback=None):
+        """Start tracking a job.
+
+        Parameters
+        ----------
+        project_uid, job_uid : str
+            Job to track.
+
+        callback : callable, optional
+            Called as callback(project_uid, job_uid, status) from the monitor thread when the job reaches a terminal status.
+            By default None.
+
+        Returns
+        -------
+        concurrent.futures.Future
+            Resolved with the terminal status of the job.
+        """
+
+        key = (project_uid, job_uid)
+        with self._lock:
+            assert not self._stopped, 'Job status monitor stopped'
+            if key not in self._jobs:
+                self._jobs[key] = [None, concurrent.futures.Future(), []]
+            _, future, callbacks = self._jobs[key]
+            if callback is not None:
+                callbacks.append(callback)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+        return future
+
+    def wait(self, project_uid, job_uid):
+        """Block until a job reaches a terminal status, and return the status."""
+        return self.watch(project_uid, job_uid).result()
+
+    def stop(self):
+        """Stop the monitor. The jobs still tracked fail, so that nothing waits for them forever."""
+        with self._lock:
+            self._stopped = True
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+        self._fail_all(RuntimeError('Job status monitor stopped'))
+
+    def _run(self):
+        interval = self.min_interval
+        n_errors = 0
+        while not self._stopped:
+            with self._lock:
+                keys = list(self._jobs)
+            if len(keys) == 0:
+                self._wakeup.wait()
+                self._wakeup.clear()
+                interval = self.min_interval
+                continue
+
+            try:
+                statuses = self.csparc_com.get_job_statuses(keys)
+                self.n_queries += 1
+                n_errors = 0
+            except Exception as e:
+                n_errors += 1
+                print(f'Job status query failed ({n_errors}/{self.max_errors}): {e!r}', file=sys.stderr)
+                if n_errors >= self.max_errors:
+                    self._fail_all(e)
+                    n_errors = 0
+                statuses = None
+
+            changed = False
+            finished = []
+            if statuses is not None:
+                with self._lock:
+                    for key, status in zip(keys, statuses):
+                        job = self._jobs[key]
+                        if status != job[0]:
+                            changed = True
+                            job[0] = status
+                            if self.print_msg:
+                                print(f'Job {key[0]}-{key[1]} : {status}')
+                        if status in terminal_statuses:
+                            finished.append((key, self._jobs.pop(key)))
+            for (project_uid, job_uid), (status, future, callbacks) in finished:
+                for callback in callbacks:
+                    try:
+                        callback(project_uid, job_uid, status)
+                    except Exception as e:
+                        print(f'Callback of job {project_uid}-{job_uid} failed: {e!r}', file=sys.stderr)
+                future.set_result(status)
+
+            interval = self.min_interval if changed else min(interval * self.backoff, self.max_interval)
+            # A newly tracked job wakes the thread up, and restarts from the minimum interval
+            if self._wakeup.wait(interval):
+                self._wakeup.clear()
+                interval = self.min_interval
+
+    def _fail_all(self, error):
+        with self._lock:
+            jobs = list(self._jobs.values())
+            self._jobs.clear()
+        for _, future, _ in jobs:
+            future.set_exception(error)
@@ -0,0 +1,114 @@
+import sys
+import threading
+import concurrent.futures
+
+
+class JobScheduler:
+    """Runs cryoSPARC jobs of several independent pipelines concurrently, with a cap on the jobs in flight per lane.
+
+    Each pipeline (e.g. the import, reconstruction and refinement chain of one cluster) runs in its own thread,
+    and enqueues each of its jobs as soon as the parent job has completed.
+    A job is in flight from its enqueueing until it completes. At most max_in_flight jobs are in flight per lane;
+    the other pipelines wait for a free slot before enqueueing.
+
+    Parameters
+    ----------
+    csparc_com : cryopicls.autorefine.cryosparc.CryoSPARCCom
+        Communicator with the cryoSPARC master node, shared by all the pipelines.
+
+    max_in_flight : int, optional
+        Maximum number of jobs in flight per lane. By default None (unlimited).
+
+    monitor : cryopicls.autorefine.monitor.JobStatusMonitor, optional
+        Monitor tracking the statuses of all the jobs in flight at once. By default None (each job is polled separately).
+    """
+
+    def __init__(self, csparc_com, max_in_flight=None, monitor=None):
+        self.csparc_com = csparc_com
+        self.max_in_flight = max_in_flight
+        self.monitor = monitor
+        self._slots = dict()
+        self._lock = threading.Lock()
+
+    def _get_slots(self, lane):
+        with self._lock:
+            if lane not in self._slots:
+                self._slots[lane] = threading.BoundedSemaphore(self.max_in_flight) if self.max_in_flight else None
+            return self._slots[lane]
+
+    def run_job(self, project_uid, job_uid, lane='default', enqueue=True):
+        """Enqueue a job (when a slot of the lane is free) and wait until it completes, fails or is killed.
+
+        Parameters
+        ----------
+        project_uid, job_uid : str
+            Job to run.
+
+        lane : str, optional
+            cryoSPARC lane. By default 'default'.
+
+        enqueue : bool, optional
+            Enqueue the job. False to only wait for a job already in flight (e.g. of an interrupted run). By default True.
+
+        Returns
+        -------
+        str
+            Final status of the job.
+        """
+
+        slots = self._get_slots(lane)
+        if slots is not None:
+            slots.acquire()
+        try:
+            if enqueue:
+                self.csparc_com.enqueue_job(project_uid, job_uid, lane)
+            if self.monitor is not None:
+                return self.monitor.wait(project_uid, job_uid)
+            else:
+                return self.csparc_com.wait_job_complete(project_uid, job_uid)
+        finally:
+            if slots is not None:
+                slots.release()
+
+    def run_pipelines(self, pipeline, items, max_workers=None):
+        """Run pipeline(item) for all the items concurrently.
+
+        Parameters
+        ----------
+        pipeline : callable
+            Function running the jobs of one item, through run_job().
+
+        items : list
+            Items (e.g. result group files).
+
+        max_workers : int, optional
+            Number of threads. By default None (one per item).
+
+        Returns
+        -------
+        list of (result, exception)
+            Return value of each pipeline (None if it raised), and the exception it raised (None if it did not), in the order of items.
+        """
+
+        if len(items) == 0:
+            return []
+        if max_workers is None:
+            max_workers = len(items)
+
+        def run(item):
+            try:
+                return pipeline(item), None
+            except Exception as e:
+                print(f'Pipeline of {item} failed: {e!r}', file=sys.stderr)
+                return None, e
+
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+        futures = [executor.submit(run, item) for item in items]
+        try:
+            return [future.result() for future in futures]
+        finally:
+            # Does not wait for the pipelines on an interruption (e.g. KeyboardInterrupt).
+            # The pending ones are cancelled here, as shutdown(cancel_futures=True) needs Python >= 3.9.
+            for future in futures:
+                future.cancel()
+            executor.shutdown(wait=False)
@@ -0,0 +1,153 @@
+import time
+import random
+import threading
+
+
+class CryoSPARCSimulator:
+    """In-process stand-in for the cryoSPARC command client, for testing and benchmarking autorefine without a cryoSPARC master node.
+
+    It implements the client functions used by cryopicls (GetUser, create_empty_workspace, make_job, enqueue_job and get_job).
+    Jobs go through the statuses building (made), queued (enqueued), running and completed (or failed), in real time:
+    a queued job starts when all its parent jobs (in input_group_connects) have completed and a slot of its lane is free,
+    and runs for the duration of its job type.
+
+    Parameters
+    ----------
+    job_durations : dict, optional
+        Job type to run time (s). By default None (default_duration for all).
+
+    default_duration : float, optional
+        Run time (s) of the job types not in job_durations. By default 1.
+
+    lane_slots : int, optional
+        Number of jobs running at the same time per lane (e.g. GPUs). By default None (unlimited).
+
+    failure_rate : float, optional
+        Probability of a job to fail at its end. By default 0.
+
+    fail_jobs : callable, optional
+        Called as fail_jobs(job) with the job document when a job ends; the job fails if it returns True. By default None.
+
+    seed : int, optional
+        Random seed of the failures. By default 0.
+
+    Attributes
+    ----------
+    jobs : dict
+        Job uid to job document (dict of uid, job_type, project_uid, workspace_uid, title, params, parents, lane, status,
+        enqueued_at, started_at and completed_at).
+
+    calls : dict
+        Function name to number of calls.
+
+    max_running : int
+        Maximum number of jobs that ran at the same time.
+    """
+
+    def __init__(self, job_durations=None, default_duration=1, lane_slots=None, failure_rate=0, fail_jobs=None, seed=0):
+        self.job_durations = job_durations if job_durations is not None else dict()
+        self.default_duration = default_duration
+        self.lane_slots = lane_slots
+        self.failure_rate = failure_rate
+        self.fail_jobs = fail_jobs
+        self._rng = random.Random(seed)
+        self._lock = threading.RLock()
+        self._n_uids = 0
+        self._time = time.monotonic()
+        self.jobs = dict()
+        self.workspaces = dict()
+        self.calls = dict()
+        self.max_running = 0
+
+    def _count(self, name):
+        self.calls[name] = self.calls.get(name, 0) + 1
+
+    def _new_uid(self, prefix):
+        self._n_uids += 1
+        return f'{prefix}{self._n_uids}'
+
+    def _is_startable(self, job, t):
+        if job['status'] != 'queued' or job['enqueued_at'] > t:
+            return False
+        if any(self.jobs[x]['status'] != 'completed' for x in job['parents']):
+            return False
+        if self.lane_slots is not None:
+            n_running = sum(x['status'] == 'running' and x['lane'] == job['lane'] for x in self.jobs.values())
+            if n_running >= self.lane_slots:
+                return False
+        return True
+
+    def _update(self):
+        """Advance the jobs to the current time, event by event."""
+        now = time.monotonic()
+        t = self._time
+        while True:
+            for job in sorted(self.jobs.values(), key=lambda x: x['enqueued_at'] or 0):
+                if self._is_startable(job, t):
+                    job['status'] = 'running'
+                    job['started_at'] = t
+                    job['completed_at'] = t + self.job_durations.get(job['job_type'], self.default_duration)
+            running = [x for x in self.jobs.values() if x['status'] == 'running']
+            self.max_running = max(self.max_running, len(running))
+            ends = [x['completed_at'] for x in running if x['completed_at'] <= now]
+            if len(ends) == 0:
+                break
+            t = min(ends)
+            for job in running:
+                if job['completed_at'] <= t:
+                    failed = self._rng.random() < self.failure_rate or (self.fail_jobs is not None and self.fail_jobs(job))
+                    job['status'] = 'failed' if failed else 'completed'
+        self._time = now
+
+    def add_job(self, job_type, status='completed'):
+        """Add a job made outside of the simulated commands (e.g. the consensus refinement of a previous session), and return its uid."""
+        with self._lock:
+            job_uid = self._new_uid('J')
+            self.jobs[job_uid] = dict(
+                uid=job_uid, job_type=job_type, project_uid=None, workspace_uid=None, title='', params=dict(), parents=[],
+                lane=None, status=status, enqueued_at=None, started_at=None, completed_at=None)
+            return job_uid
+
+    def GetUser(self, email):
+        with self._lock:
+            self._count('GetUser')
+            return {'_id': f'user_{email}', 'emails': [{'address': email}]}
+
+    def create_empty_workspace(self, project_uid, created_by_user_id, title='', desc=''):
+        with self._lock:
+            self._count('create_empty_workspace')
+            workspace_uid = self._new_uid('W')
+            self.workspaces[workspace_uid] = dict(uid=workspace_uid, project_uid=project_uid, title=title, desc=desc)
+            return workspace_uid
+
+    def make_job(self, job_type, project_uid, workspace_uid, user_id, title='', params=None, input_group_connects=None):
+        with self._lock:
+            self._count('make_job')
+            self._update()
+            parents = []
+            for connect in (input_group_connects or dict()).values():
+                parent = connect.split('.')[0]
+                assert parent in self.jobs, f'Job {parent} not found'
+                if parent not in parents:
+                    parents.append(parent)
+            job_uid = self.add_job(job_type, status='building')
+            self.jobs[job_uid].update(
+                project_uid=project_uid, workspace_uid=workspace_uid, title=title, params=params or dict(), parents=parents)
+            return job_uid
+
+    def enqueue_job(self, project_uid, job_uid, lane='default'):
+        with self._lock:
+            self._count('enqueue_job')
+            self._update()
+            job = self.jobs[job_uid]
+            assert job['status'] == 'building', f'Job {job_uid} is {job["status"]}'
+            job.update(status='queued', lane=lane, enqueued_at=time.monotonic())
+            self._update()
+
+    def get_job(self, project_uid, job_uid, *fields):
+        with self._lock:
+            self._count('get_job')
+            self._update()
+            job = self.jobs[job_uid]
+            fields = fields if len(fields) > 0 else list(job)
+            return dict({'_id': job_uid}, **{x: job[x] for x in fields})
@@ -0,0 +1,212 @@
+import os
+import shlex
+import shutil
+import hashlib
+import subprocess
+import concurrent.futures
+
+
+modes = ['auto', 'hardlink', 'reflink', 'copy', 'ssh']
+verify_methods = ['size-mtime', 'checksum', 'none']
+
+# ioctl request number of FICLONE (linux/fs.h), which shares the data blocks of two files on copy-on-write filesystems (btrfs, xfs, ...)
+FICLONE = 0x40049409
+
+
+def get_checksum(file, block_size=1 << 22):
+    h = hashlib.sha256()
+    with open(file, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def is_unchanged(src, dst, verify='size-mtime'):
+    """Whether dst is already an up-to-date copy of src.
+
+    Parameters
+    ----------
+    src, dst : str
+        Source and destination files.
+
+    verify : str, optional
+        'size-mtime' (same size and modification time in seconds, as rsync), 'checksum' (same size and SHA-256)
+        or 'none' (never up-to-date). By default 'size-mtime'.
+
+    Returns
+    -------
+    bool
+    """
+
+    if verify == 'none' or not os.path.exists(dst):
+        return False
+    if os.path.samefile(src, dst):
+        return True
+    st_src, st_dst = os.stat(src), os.stat(dst)
+    if st_src.st_size != st_dst.st_size:
+        return False
+    if verify == 'size-mtime':
+        return int(st_src.st_mtime) == int(st_dst.st_mtime)
+    return get_checksum(src) == get_checksum(dst)
+
+
+def hardlink(src, dst):
+    tmp = dst + '.tmp'
+    if os.path.lexists(tmp):
+        os.remove(tmp)
+    os.link(src, tmp)
+    os.replace(tmp, dst)
+
+
+def reflink(src, dst):
+    try:
+        # Unix only. Elsewhere, reflinks are unsupported, as on a filesystem without them ('auto' then falls back to a copy).
+        import fcntl
+    except ImportError:
+        raise OSError('reflink is not supported on this platform')
+    tmp = dst + '.tmp'
+    try:
+        with open(src, 'rb') as f_src, open(tmp, 'wb') as f_dst:
+            fcntl.ioctl(f_dst.fileno(), FICLONE, f_src.fileno())
+    except OSError:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    shutil.copystat(src, tmp)
+    os.replace(tmp, dst)
+
+
+def copy(src, dst):
+    # Copied to a temporary file first, so that an interrupted copy is never taken as up-to-date
+    tmp = dst + '.tmp'
+    shutil.copy2(src, tmp)
+    os.replace(tmp, dst)
+
+
+def transfer_file(src, dst, mode='auto', verify='size-mtime'):
+    """Transfer a file, unless dst is already up-to-date (see is_unchanged()).
+
+    Parameters
+    ----------
+    src, dst : str
+        Source and destination files.
+
+    mode : str, optional
+        'hardlink', 'reflink', 'copy', or 'auto'. By default 'auto': a hard link if both are on the same filesystem,
+        else a reflink if the filesystem supports it, else a copy.
+
+    verify : str, optional
+        How to check whether dst is up-to-date (see is_unchanged()). By default 'size-mtime'.
+
+    Returns
+    -------
+    str
+        'skipped', 'hardlink', 'reflink' or 'copy'.
+    """
+
+    if is_unchanged(src, dst, verify=verify):
+        return 'skipped'
+    if mode in ['hardlink', 'reflink', 'copy']:
+        {'hardlink': hardlink, 'reflink': reflink, 'copy': copy}[mode](src, dst)
+        return mode
+
+    assert mode == 'auto', f'Unknown transfer mode: {mode}'
+    if os.stat(src).st_dev == os.stat(os.path.dirname(os.path.abspath(dst))).st_dev:
+        for method, function in [('hardlink', hardlink), ('reflink', reflink)]:
+            try:
+                function(src, dst)
+                return method
+            except OSError:
+                pass
+    copy(src, dst)
+    return 'copy'
+
+
+def transfer_files(files, dest_dir, mode='auto', verify='size-mtime', n_threads=4):
+    """Transfer files into a local directory in parallel (see transfer_file()).
+
+    Parameters
+    ----------
+    files : list of str
+        Files to transfer.
+
+    dest_dir : str
+        Destination directory, created if needed.
+
+    mode, verify : str, optional
+        See transfer_file().
+
+    n_threads : int, optional
+        Number of concurrent transfers. By default 4.
+
+    Returns
+    -------
+    list of (str, str)
+        Destination file and transfer method of each file.
+    """
+
+    os.makedirs(dest_dir, exist_ok=True)
+    dsts = [os.path.join(dest_dir, os.path.basename(x)) for x in files]
+    with concurrent.futures.ThreadPoolExecutor(max_workers=n_threads) as executor:
+        methods = list(executor.map(lambda src, dst: transfer_file(src, dst, mode=mode, verify=verify), files, dsts))
+    return list(zip(dsts, methods))
+
+
+def transfer_files_ssh(files, dest_dir, ssh_command, verify='size-mtime', compress=True):
+    """Stream files into a directory of a remote host, as a single (gzip-compressed) tar stream over ssh.
+
+    Files whose remote copy has the same size and modification time are skipped (unless verify is 'none').
+
+    Parameters
+    ----------
+    files : list of str
+        Files to transfer.
+
+    dest_dir : str
+        Destination directory on the remote host, created if needed.
+
+    ssh_command : str
+        ssh command line up to the remote command (e.g. 'ssh user@host -p 22').
+
+    verify : str, optional
+        'size-mtime' or 'none'. ('checksum' is treated as 'size-mtime'.) By default 'size-mtime'.
+
+    compress : bool, optional
+        Compress the stream with gzip. By default True.
+
+    Returns
+    -------
+    list of (str, str)
+        Destination file and transfer method ('skipped' or 'ssh') of each file.
+    """
+
+    dsts = [os.path.join(dest_dir, os.path.basename(x)) for x in files]
+    skipped = set()
+    if verify != 'none':
+        # Size and modification time of the existing remote copies
+        remote = f'mkdir -p {shlex.quote(dest_dir)} && cd {shlex.quote(dest_dir)} && stat -c "%n %s %Y" ' \
+            + ' '.join(shlex.quote(os.path.basename(x)) for x in files) + ' 2>/dev/null; true'
+        ret = subprocess.run(f'{ssh_command} {shlex.quote(remote)}', shell=True, capture_output=True)
+        assert ret.returncode == 0, ret.stderr.decode()
+        remote_stats = dict()
+        for line in ret.stdout.decode().splitlines():
+            name, size, mtime = line.rsplit(' ', 2)
+            remote_stats[name] = (int(size), int(mtime))
+        for src in files:
+            st = os.stat(src)
+            if remote_stats.get(os.path.basename(src)) == (st.st_size, int(st.st_mtime)):
+                skipped.add(src)
+
+    sent = [x for x in files if x not in skipped]
+    if len(sent) > 0:
+        # Group by source directory, as tar -C applies to the following files
+        args = []
+        for src in sent:
+            args += ['-C', os.path.dirname(os.path.abspath(src)), os.path.basename(src)]
+        tar_option = 'z' if compress else ''
+        remote = f'mkdir -p {shlex.quote(dest_dir)} && tar x{tar_option}f - -C {shlex.quote(dest_dir)}'
+        com = f'tar c{tar_option}f - ' + ' '.join(shlex.quote(x) for x in args) + f' | {ssh_command} {shlex.quote(remote)}'
+        ret = subprocess.run(com, shell=True, capture_output=True)
+        assert ret.returncode == 0, ret.stderr.decode()
+
+    return [(dst, 'skipped' if src in skipped else 'ssh') for src, dst in zip(files, dsts)]
@@ -0,0 +1,254 @@
+import os
+import re
+import abc
+import json
+import time
+import shlex
+import shutil
+import tempfile
+import threading
+import subprocess
+
+import numpy as np
+
+import cryopicls
+
+
+class Transport(abc.ABC):
+    """Base of the ways to reach the cryoSPARC command client.
+
+    A transport runs a shell command on the master node (run()), a single `cryosparcm cli` expression (cli()) or a batch of operations
+    (batch(), see cryopicls.autorefine.batch), each as one round trip, and records the latency of every round trip.
+    """
+
+    def __init__(self, print_com=True):
+        self.print_com = print_com
+        # (command name, latency in seconds) of each round trip
+        self.latencies = []
+        self._latencies_lock = threading.Lock()
+
+    @abc.abstractmethod
+    def run(self, command, name=None):
+        """Run a shell command on the master node, and return its stdout. name is the command name of its latency (by default the program)."""
+
+    @abc.abstractmethod
+    def cli(self, expression):
+        """Evaluate an expression on the command client (e.g. "GetUser('a@b.c')['_id']"), and return the printed result."""
+
+    @abc.abstractmethod
+    def batch(self, ops, poll_interval=0.05, timeout=60):
+        """Run a batch of operations, and return the dict of cryopicls.autorefine.batch.execute()."""
+
+    def close(self):
+        pass
+
+    def record_latency(self, name, latency):
+        with self._latencies_lock:
+            self.latencies.append((name, latency))
+
+    @staticmethod
+    def get_batch_name(ops):
+        return ops[0]['op'] if len(ops) == 1 else 'batch'
+
+    def get_latency_stats(self):
+        """Latency statistics of the round trips so far, per command name and in total.
+
+        Returns
+        -------
+        dict
+            Command name (and 'all') to a dict of n, total_s, mean_s, p50_s, p95_s and max_s.
+        """
+
+        with self._latencies_lock:
+            latencies = list(self.latencies)
+        stats = dict()
+        for name in sorted(set(x[0] for x in latencies)) + ['all']:
+            values = np.array([t for n, t in latencies if name in ('all', n)])
+            if len(values) == 0:
+                continue
+            stats[name] = dict(
+                n=len(values),
+                total_s=float(values.sum()),
+                mean_s=float(values.mean()),
+                p50_s=float(np.percentile(values, 50)),
+                p95_s=float(np.percentile(values, 95)),
+                max_s=float(values.max()),
+            )
+        return stats
+
+
+class LocalTransport(Transport):
+    """Runs cryosparcm in a local shell, when already on the cryoSPARC master node.
+
+    Parameters
+    ----------
+    print_com : bool, optional
+        Print each command. By default True.
+
+    max_retries : int, optional
+        Number of retries of a command failing with exit status 255, with exponential backoff. By default 0.
+
+    retry_wait : float, optional
+        Wait time (s) before the first retry, doubled at each retry. By default 1.
+    """
+
+    def __init__(self, print_com=True, max_retries=0, retry_wait=1):
+        super().__init__(print_com=print_com)
+        self.max_retries = max_retries
+        self.retry_wait = retry_wait
+
+    def get_command(self, command):
+        """Shell command running command on the master node."""
+        return command
+
+    def run(self, command, name=None):
+        """Run a shell command on the master node, and return its stdout."""
+        com = self.get_command(command)
+        if self.print_com:
+            print(com)
+        if name is None:
+            name = command.split()[0]
+
+        for i_retry in range(self.max_retries + 1):
+            t_start = time.perf_counter()
+            ret = subprocess.run(com, shell=True, capture_output=True)
+            self.record_latency(name, time.perf_counter() - t_start)
+            # 255 is the exit status of ssh itself on connection errors (e.g. dropped connection), which are worth a retry
+            if ret.returncode != 255 or i_retry == self.max_retries:
+                break
+            wait = self.retry_wait * 2 ** i_retry
+            print(f'Command failed ({ret.stderr.decode().strip()}). Retrying in {wait} s ({i_retry + 1}/{self.max_retries})...')
+            time.sleep(wait)
+
+        assert ret.returncode == 0, ret.stderr.decode()
+
+        return ret.stdout.decode().rstrip()
+
+    def cli(self, expression):
+        return self.run(f'cryosparcm cli {shlex.quote(expression)}', name=re.match(r'\w*', expression).group(0))
+
+    def batch(self, ops, poll_interval=0.05, timeout=60):
+        script = cryopicls.autorefine.batch.get_remote_script(ops, poll_interval=poll_interval, timeout=timeout)
+        output = self.run(f'cryosparcm call python -c {shlex.quote(script)}', name=self.get_batch_name(ops))
+        return cryopicls.autorefine.batch.parse_output(output)
+
+
+class SSHTransport(LocalTransport):
+    """Runs cryosparcm on the cryoSPARC master node over ssh.
+
+    By default, all the commands share one multiplexed connection (OpenSSH ControlMaster), which is opened by the first command
+    and kept open for control_persist seconds after the last one, so that only the first command pays for the connection setup.
+
+    Parameters
+    ----------
+    ssh_user, ssh_host : str
+        User name and hostname of the cryoSPARC master node.
+
+    ssh_port : int
+        Port number of ssh.
+
+    multiplexing : bool, optional
+        Share one ssh connection between the commands. By default True.
+
+    control_persist : int, optional
+        Time (s) the shared connection stays open after the last command. By default 600.
+
+    print_com, max_retries, retry_wait : optional
+        See LocalTransport. By default True, 5 and 1.
+    """
+
+    def __init__(self, ssh_user, ssh_host, ssh_port=22, multiplexing=True, control_persist=600,
+                 print_com=True, max_retries=5, retry_wait=1):
+        super().__init__(print_com=print_com, max_retries=max_retries, retry_wait=retry_wait)
+        self.ssh_user = ssh_user
+        self.ssh_host = ssh_host
+        self.ssh_port = ssh_port
+        self.control_persist = control_persist
+        self._control_dir = None
+        if multiplexing:
+            # Short path, as the socket path length is limited (~100 characters)
+            self._control_dir = tempfile.mkdtemp(prefix='cryopicls_ssh_')
+
+    def get_ssh_options(self):
+        if self._control_dir is None:
+            return ''
+        control_path = os.path.join(self._control_dir, 'master')
+        return f'-o ControlMaster=auto -o ControlPath={control_path} -o ControlPersist={self.control_persist} '
+
+    def get_ssh_command(self):
+        return f'ssh {self.get_ssh_options()}{self.ssh_user}@{self.ssh_host} -p {self.ssh_port}'
+
+    def get_command(self, command):
+        return f'{self.get_ssh_command()} {shlex.quote(command)}'
+
+    def close(self):
+        """Close the shared ssh connection, if any."""
+        if self._control_dir is None:
+            return
+        if os.path.exists(os.path.join(self._control_dir, 'master')):
+            com = f'ssh {self.get_ssh_options()}-O exit {self.ssh_user}@{self.ssh_host} -p {self.ssh_port}'
+            subprocess.run(com, shell=True, capture_output=True)
+        shutil.rmtree(self._control_dir, ignore_errors=True)
+        self._control_dir = None
+
+
+class SimulatorTransport(Transport):
+    """Runs the commands in process, on a cryopicls.autorefine.simulator.CryoSPARCSimulator, with simulated latencies.
+
+    Parameters
+    ----------
+    simulator : cryopicls.autorefine.simulator.CryoSPARCSimulator
+        Simulated command client.
+
+    command_latency : float, optional
+        Simulated time (s) of each round trip (e.g. the start of the Python interpreter of cryosparcm on the master node). By default 0.
+
+    connect_latency : float, optional
+        Simulated time (s) of a connection setup. By default 0.
+
+    multiplexing : bool, optional
+        Pay connect_latency only at the first round trip, as with a shared ssh connection. Otherwise at every round trip. By default True.
+
+    print_com : bool, optional
+        Print each command. By default False.
+    """
+
+    def __init__(self, simulator, command_latency=0, connect_latency=0, multiplexing=True, print_com=False):
+        super().__init__(print_com=print_com)
+        self.simulator = simulator
+        self.command_latency = command_latency
+        self.connect_latency = connect_latency
+        self.multiplexing = multiplexing
+        self._connected = False
+
+    def _round_trip(self, name, function):
+        if self.print_com:
+            print(f'[simulator] {name}')
+        t_start = time.perf_counter()
+        latency = self.command_latency
+        if not (self.multiplexing and self._connected):
+            latency += self.connect_latency
+            self._connected = True
+        time.sleep(latency)
+        ret = function()
+        self.record_latency(name, time.perf_counter() - t_start)
+        return ret
+
+    def run(self, command, name=None):
+        # Only cryosparcm cli is simulated. Other commands fail, as on a master node without them.
+        args = shlex.split(command)
+        assert args[:2] == ['cryosparcm', 'cli'] and len(args) == 3, f'Command not simulated: {command}'
+        return self.cli(args[2])
+
+    def cli(self, expression):
+        # As cryosparcm cli, which evaluates the expression as a method call on the client and prints the result
+        return self._round_trip(
+            re.match(r'\w*', expression).group(0),
+            lambda: str(eval('cli.' + expression, {'cli': self.simulator})))
+
+    def batch(self, ops, poll_interval=0.05, timeout=60):
+        # Through JSON both ways, as over the wire
+        return self._round_trip(
+            self.get_batch_name(ops),
+            lambda: json.loads(json.dumps(cryopicls.autorefine.batch.execute(
+                self.simulator, json.loads(json.dumps(ops)), poll_interval=poll_interval, timeout=timeout), default=str)))
@@ -1,6 +1,11 @@
-from . import autogmm
-from . import gmeans
-from . import utils
-from . import xmeans
-from . import kmeans
-from . import manual_select
+from .. import lazy
+
+__getattr__, __dir__ = lazy.attach(__name__, [
+    'autogmm',
+    'gmeans',
+    'utils',
+    'telemetry',
+    'xmeans',
+    'kmeans',
+    'manual_select',
+])
@@ -100,7 +100,7 @@ class AutoGMMClustering:
         self.max_iter = max_iter
         self.init_params = init_params
 
-    def fit(self, X):
+    def fit(self, X, telemetry=None):
         """Auto GMM fitting
 
         Parameters
@@ -108,6 +108,9 @@ class AutoGMMClustering:
         X : array-like of shape (n_samples, n_latent_dims)
             Input data for clustering
 
+        telemetry : cryopicls.clustering.telemetry.FitTelemetry, optional
+            Receives the events of the fit. By default FitTelemetry.default() (progress printed).
+
         Returns
         -------
         gm_fit
@@ -120,20 +123,27 @@ class AutoGMMClustering:
             Cluster center coordinates (n_clusters, n_latent_dims)
         """
 
+        if telemetry is None:
+            telemetry = cryopicls.clustering.telemetry.FitTelemetry.default()
+        self.telemetry_ = telemetry
+
         self.aic_list_ = []
         self.bic_list_ = []
         self.k_list_ = np.arange(self.k_min, self.k_max + 1)
         self.gm_list_ = []
+        telemetry.emit('fit_start', algorithm='auto-gmm', n_samples=len(X), n_dims=X.shape[1], k_list=self.k_list_.tolist())
         for k in self.k_list_:
             gm = GaussianMixture(
                 n_components=k, n_init=self.n_init, random_state=self.random_state,
                 covariance_type=self.covariance_type, tol=self.tol, reg_covar=self.reg_covar,
                 max_iter=self.max_iter, init_params=self.init_params)
-            print(f'Fitting GMM K={k}...')
-            gm.fit(X)
+            # Restarts and EM iterations are reported through the verbose message hooks of GaussianMixture
+            with telemetry.track_mixture(gm, k) as k_info:
+                gm.fit(X)
+                self.aic_list_.append(gm.aic(X))
+                self.bic_list_.append(gm.bic(X))
+                k_info.update(aic=self.aic_list_[-1], bic=self.bic_list_[-1])
             self.gm_list_.append(gm)
-            self.aic_list_.append(gm.aic(X))
-            self.bic_list_.append(gm.bic(X))
 
         # Model selection
         if self.criterion == 'bic':
@@ -148,6 +158,7 @@ class AutoGMMClustering:
 
         self.cluster_labels_ = self.gm_fit_.predict(X)
         self.cluster_centers_ = self.gm_fit_.means_
+        telemetry.emit('fit_end', n_clusters=int(self.k_fit_), criterion=self.criterion, ic=self.ic_fit_)
 
         self.print_result_summary()
 
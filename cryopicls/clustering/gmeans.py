@@ -38,7 +38,7 @@ class GMeansClustering:
         self.k_max = k_max
         self.random_state = random_state
 
-    def fit(self, X):
+    def fit(self, X, telemetry=None):
         """G-Means fitting
 
         Parameters
@@ -46,6 +46,9 @@ class GMeansClustering:
         X : array-like of shape (n_samples, n_latent_dims)
             Input data for clustering.
 
+        telemetry : cryopicls.clustering.telemetry.FitTelemetry, optional
+            Receives the events of the fit. Only heartbeats are reported while running. By default FitTelemetry.default() (progress printed).
+
         Returns
         -------
         model
@@ -68,7 +71,14 @@ class GMeansClustering:
             random_state=self.random_state
         )
 
-        self.model_.process()
+        if telemetry is None:
+            telemetry = cryopicls.clustering.telemetry.FitTelemetry.default()
+        self.telemetry_ = telemetry
+
+        telemetry.emit('fit_start', algorithm='g-means', n_samples=len(X), n_dims=X.shape[1])
+        # pyclustering reports nothing until the end
+        with telemetry.heartbeat():
+            self.model_.process()
 
         self.sse_ = self.model_.get_total_wce()
         self.cluster_centers_ = self.model_.get_centers()
@@ -76,6 +86,8 @@ class GMeansClustering:
             self.model_, X
         )
 
+        telemetry.emit('fit_end', n_clusters=len(self.cluster_centers_), sse=float(self.sse_))
+
         self.print_result_summary()
 
         return self.model_, self.cluster_labels_, self.cluster_centers_
@@ -40,7 +40,7 @@ class KMeansClustering:
         self.tol = tol
         self.random_state = random_state
 
-    def fit(self, X):
+    def fit(self, X, telemetry=None):
         """Compute k-means clustering.
 
         Parameters
@@ -48,6 +48,9 @@ class KMeansClustering:
         X : array-kile of shape (n_samples, n_latent_dims)
             Input data for clustering.
 
+        telemetry : cryopicls.clustering.telemetry.FitTelemetry, optional
+            Receives the events of the fit. By default FitTelemetry.default() (progress printed).
+
         Returns
         -------
         model
@@ -69,10 +72,22 @@ class KMeansClustering:
             random_state=self.random_state
         )
 
-        self.model_.fit(X)
+        if telemetry is None:
+            telemetry = cryopicls.clustering.telemetry.FitTelemetry.default()
+        self.telemetry_ = telemetry
+
+        telemetry.emit('fit_start', algorithm='k-means', n_samples=len(X), n_dims=X.shape[1], k_list=[self.n_clusters])
+        with telemetry.heartbeat():
+            self.model_.fit(X)
+        # Iterations of the best of the n_init runs
+        telemetry.emit(
+            'k_end', k=self.n_clusters, n_iter=int(self.model_.n_iter_), converged=bool(self.model_.n_iter_ < self.max_iter),
+            elapsed_s=telemetry.get_elapsed(), inertia=float(self.model_.inertia_)
+        )
 
         self.cluster_labels_ = self.model_.labels_
         self.cluster_centers_ = self.model_.cluster_centers_
+        telemetry.emit('fit_end', n_clusters=len(self.cluster_centers_))
 
         self.print_result_summary()
 
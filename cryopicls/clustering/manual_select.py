@@ -15,7 +15,9 @@ class ManualSelector:
     def __init__(self, thresh_list):
         self.thresh_list = thresh_list
 
-    def fit(self, X):
+    def fit(self, X, telemetry=None):
+        if telemetry is not None:
+            telemetry.emit('fit_start', algorithm='manual', n_samples=len(X), n_dims=X.shape[1])
         self.idxs_select_ = np.ones(X.shape[0], dtype=bool)
         for thresh in self.thresh_list:
             z_dim, z_min, z_max = thresh
@@ -29,6 +31,8 @@ class ManualSelector:
             self.cluster_centers_.append(np.mean(X[~self.idxs_select_], axis=0))
             self.cluster_centers_.append(np.mean(X[self.idxs_select_], axis=0))
         self.cluster_labels_ = self.idxs_select_.astype(int)
+        if telemetry is not None:
+            telemetry.emit('fit_end', n_clusters=len(self.cluster_centers_))
 
         return self, self.cluster_labels_, self.cluster_centers_
 
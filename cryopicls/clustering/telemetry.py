@@ -0,0 +1,248 @@
+import sys
+import json
+import time
+import threading
+import contextlib
+
+
+class FitTelemetry:
+    """Events of a clustering fit, dispatched to handlers and kept for the run metadata.
+
+    An event is a dict of its type ('event'), its time since fit_start ('time_s') and its fields. The events are:
+
+        'fit_start' : algorithm, n_samples, n_dims, and k_list (the numbers of clusters to fit, if known in advance).
+        'k_start' : k, n_init.
+        'restart_start' : k, restart.
+        'iteration' : k, restart, iteration, max_iter, change (of the lower bound). Passed to the handlers only (not kept).
+        'restart_end' : k, restart, n_iter, converged, lower_bound and lower_bounds (the lower bound of each iteration).
+        'k_end' : k, n_iter, converged, lower_bound (of the best restart, if any), elapsed_s, and other fields of the wrapper (e.g. aic, bic).
+        'heartbeat' : elapsed_s. Emitted periodically while a fit without progress report (e.g. pyclustering) runs.
+        'fit_end' : n_clusters, and other fields of the wrapper.
+
+    Parameters
+    ----------
+    handlers : list of callable, optional
+        Called with each event. By default None (no handler).
+
+    heartbeat_interval : float, optional
+        Interval (s) of the heartbeat events. 0 disables them. By default 10.
+    """
+
+    def __init__(self, handlers=None, heartbeat_interval=10.):
+        self.handlers = list(handlers) if handlers is not None else []
+        self.heartbeat_interval = heartbeat_interval
+        self.events = []
+        self._lock = threading.Lock()
+        self._start = time.perf_counter()
+
+    @classmethod
+    def default(cls):
+        """Telemetry with the default progress handler."""
+        return cls(handlers=[ProgressHandler()])
+
+    def add_handler(self, handler):
+        self.handlers.append(handler)
+
+    def get_elapsed(self):
+        """Time (s) since fit_start."""
+        return time.perf_counter() - self._start
+
+    def emit(self, event, **fields):
+        if event == 'fit_start':
+            self._start = time.perf_counter()
+        record = dict(event=event, time_s=self.get_elapsed(), **fields)
+        with self._lock:
+            if event != 'iteration':
+                self.events.append(record)
+            for handler in self.handlers:
+                handler(record)
+
+    @contextlib.contextmanager
+    def heartbeat(self, **fields):
+        """Context manager emitting a heartbeat event every heartbeat_interval seconds, from a background thread."""
+        interval = self.heartbeat_interval
+        if interval <= 0:
+            yield
+            return
+        stop_event = threading.Event()
+        start = time.perf_counter()
+
+        def beat():
+            while not stop_event.wait(interval):
+                self.emit('heartbeat', elapsed_s=time.perf_counter() - start, **fields)
+
+        thread = threading.Thread(target=beat, name='cryopicls-fit-heartbeat', daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stop_event.set()
+            thread.join()
+
+    @contextlib.contextmanager
+    def track_mixture(self, model, k):
+        """Context manager reporting the restarts and EM iterations of a scikit-learn mixture model (e.g. GaussianMixture) fitted in it.
+
+        The verbose message hooks of the model (_print_verbose_msg_*) are replaced by instance attributes,
+        which are deleted at the end so that the model can still be pickled.
+
+        Parameters
+        ----------
+        model : sklearn.mixture.GaussianMixture instance
+            Model to fit.
+
+        k : int
+            Number of components of the model.
+
+        Yields
+        ------
+        dict
+            Other fields of the k_end event (e.g. the information criteria), to be set in the context.
+        """
+        k = int(k)
+        fields = dict()
+        state = dict(restart=-1, changes=[], best=None, start=time.perf_counter())
+
+        def init_beg(restart):
+            state.update(restart=restart, changes=[])
+            self.emit('restart_start', k=k, restart=restart)
+
+        def iter_end(n_iter, change):
+            state['changes'].append(float(change))
+            self.emit('iteration', k=k, restart=state['restart'], iteration=n_iter, change=float(change), max_iter=model.max_iter)
+
+        def init_end(lower_bound, *args):
+            # Lower bound of each iteration, back from the last one (the change of the first iteration is infinite)
+            changes = state['changes']
+            lower_bounds = [float(lower_bound)]
+            for change in changes[:0:-1]:
+                lower_bounds.append(lower_bounds[-1] - change)
+            record = dict(
+                k=k, restart=state['restart'], n_iter=len(changes), converged=len(changes) > 0 and abs(changes[-1]) < model.tol,
+                lower_bound=float(lower_bound), lower_bounds=lower_bounds[::-1]
+            )
+            if state['best'] is None or record['lower_bound'] > state['best']['lower_bound']:
+                state['best'] = record
+            self.emit('restart_end', **record)
+
+        self.emit('k_start', k=k, n_init=model.n_init)
+        model._print_verbose_msg_init_beg = init_beg
+        model._print_verbose_msg_iter_end = iter_end
+        model._print_verbose_msg_init_end = init_end
+        try:
+            yield fields
+        finally:
+            for name in ['_print_verbose_msg_init_beg', '_print_verbose_msg_iter_end', '_print_verbose_msg_init_end']:
+                model.__dict__.pop(name, None)
+        best = state['best'] or dict(n_iter=0, converged=False, lower_bound=None)
+        self.emit(
+            'k_end', k=k, n_iter=best['n_iter'], converged=best['converged'], lower_bound=best['lower_bound'],
+            elapsed_s=time.perf_counter() - state['start'], **fields
+        )
+
+    def get_summary(self):
+        """Summary of the fit per k: number of restarts, their iterations, convergence and lower bounds, and elapsed time."""
+        summary = dict()
+        for x in self.events:
+            if x['event'] == 'restart_end':
+                s = summary.setdefault(x['k'], dict(k=x['k'], n_iter=[], converged=[], lower_bound=[]))
+                for key in ['n_iter', 'converged', 'lower_bound']:
+                    s[key].append(x[key])
+            elif x['event'] == 'k_end':
+                s = summary.setdefault(x['k'], dict(k=x['k'], n_iter=[], converged=[], lower_bound=[]))
+                s.update({key: value for key, value in x.items() if key not in ['event', 'time_s', 'k', 'n_iter', 'converged', 'lower_bound']})
+        n_restarts = sum(len(x['converged']) for x in summary.values())
+        n_not_converged = sum(x['converged'].count(False) for x in summary.values())
+        return dict(k=list(summary.values()), n_restarts=n_restarts, n_not_converged=n_not_converged)
+
+    def save(self, outfile, **info):
+        """Save the events and their summary as JSON. info (e.g. the fit parameters tol and max_iter) is saved with them."""
+        with self._lock:
+            events = list(self.events)
+        with open(outfile, 'w') as f:
+            json.dump(dict(info=info, summary=self.get_summary(), events=events), f, indent=2, default=float)
+
+
+def format_time(seconds):
+    if seconds < 60:
+        return f'{seconds:.1f} s'
+    elif seconds < 3600:
+        return f'{int(seconds // 60)} min {int(seconds % 60)} s'
+    return f'{int(seconds // 3600)} h {int(seconds % 3600 // 60)} min'
+
+
+class ProgressHandler:
+    """Default handler of the fit events, printing the progress of a fit and its estimated remaining time.
+
+    One line is printed at the end of each k, and the running restart (iteration and lower bound change) or the elapsed time
+    of a fit without progress report is printed at most every interval seconds. The remaining time is estimated from the
+    time spent so far, assuming that the time of a k is proportional to k (the cost of an EM iteration is).
+
+    Parameters
+    ----------
+    interval : float, optional
+        Minimum interval (s) between the lines of a running k. 0 prints only the end of each k. By default 10.
+
+    stream : file-like, optional
+        Output stream. By default sys.stdout.
+    """
+
+    def __init__(self, interval=10., stream=None):
+        self.interval = interval
+        self.stream = stream
+        self.k_list = []
+        self.n_init = 1
+        self.done = 0.
+        self.last_print = 0.
+        self.n_converged = 0
+        self.n_restarts = 0
+
+    def print(self, message):
+        print(message, file=self.stream or sys.stdout, flush=True)
+
+    def get_eta(self, time_s, k=None, restart=None):
+        done = self.done + (k * restart / self.n_init if k is not None and restart is not None else 0)
+        total = sum(self.k_list)
+        if done <= 0 or total <= done:
+            return ''
+        return f', ETA {format_time(time_s / done * (total - done))}'
+
+    def __call__(self, event):
+        name = event['event']
+        t = event['time_s']
+        if name == 'fit_start':
+            self.k_list = list(event.get('k_list') or [])
+            self.done = 0.
+            self.last_print = t
+            self.print(f'Fitting {event["algorithm"]} to {event["n_samples"]} samples of {event["n_dims"]} dimensions...')
+        elif name == 'k_start':
+            self.n_init = event['n_init']
+            self.n_converged = self.n_restarts = 0
+            self.last_print = t
+            self.print(f'Fitting K={event["k"]}...')
+        elif name == 'iteration':
+            if self.interval > 0 and t - self.last_print >= self.interval:
+                self.last_print = t
+                self.print(
+                    f'\tK={event["k"]} restart {event["restart"] + 1}/{self.n_init} iteration {event["iteration"]}/{event["max_iter"]}: '
+                    f'lower bound change {event["change"]:.3g} ({format_time(t)}{self.get_eta(t, event["k"], event["restart"])})'
+                )
+        elif name == 'restart_end':
+            self.n_restarts += 1
+            self.n_converged += event['converged']
+        elif name == 'k_end':
+            self.done += event['k']
+            if self.n_restarts > 0:
+                parts = [f'{self.n_converged}/{self.n_restarts} restarts converged', f'best in {event["n_iter"]} iterations']
+            else:
+                parts = [f'{event["n_iter"]} iterations', f'converged {event["converged"]}']
+            if event.get('lower_bound') is not None:
+                parts.append(f'lower bound {event["lower_bound"]:.4f}')
+            parts.append(format_time(event['elapsed_s']) + self.get_eta(t))
+            self.print(f'\tK={event["k"]}: ' + ', '.join(parts))
+        elif name == 'heartbeat':
+            if self.interval > 0 and t - self.last_print >= self.interval:
+                self.last_print = t
+                self.print(f'\tRunning... ({format_time(event["elapsed_s"])})')
+        elif name == 'fit_end':
+            self.print(f'Fitted in {format_time(t)}')
@@ -63,7 +63,7 @@ class XMeansClustering:
         self.alpha = alpha
         self.beta = beta
 
-    def fit(self, X):
+    def fit(self, X, telemetry=None):
         """X-Means fitting
 
         Parameters
@@ -71,6 +71,9 @@ class XMeansClustering:
         X : array-like of shape (n_samples, n_latent_dims)
             Input data for clustering.
 
+        telemetry : cryopicls.clustering.telemetry.FitTelemetry, optional
+            Receives the events of the fit. Only heartbeats are reported while running. By default FitTelemetry.default() (progress printed).
+
         Returns
         -------
         xmeans
@@ -101,7 +104,14 @@ class XMeansClustering:
             alpha=self.alpha,
             beta=self.beta)
 
-        self.xmeans_.process()
+        if telemetry is None:
+            telemetry = cryopicls.clustering.telemetry.FitTelemetry.default()
+        self.telemetry_ = telemetry
+
+        telemetry.emit('fit_start', algorithm='x-means', n_samples=len(X), n_dims=X.shape[1])
+        # pyclustering reports nothing until the end
+        with telemetry.heartbeat():
+            self.xmeans_.process()
 
         self.sse_ = self.xmeans_.get_total_wce()
         self.cluster_centers_ = self.xmeans_.get_centers()
@@ -109,6 +119,8 @@ class XMeansClustering:
             self.xmeans_, self.X_
         )
 
+        telemetry.emit('fit_end', n_clusters=len(self.cluster_centers_), sse=float(self.sse_))
+
         self.print_result_summary()
 
         return self.xmeans_, self.cluster_labels_, self.cluster_centers_
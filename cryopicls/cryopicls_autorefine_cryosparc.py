@@ -1,5 +1,8 @@
 '''Perform auto-refinement of clusters found by cryoPICLS'''
 
+import os
+import sys
+import time
 import glob
 
 import cryopicls
@@ -17,89 +20,222 @@ def main():
     csg_files = find_result_group_files(
         args.cryopicls_result_dir, args.cryopicls_result_basename)
 
-    # Create workspace (if needed)
-    csparc_com = cryopicls.autorefine.cryosparc.CryoSPARCCom(
-        args.ssh_user, args.ssh_host, args.ssh_port, args.csparc_user_email
-    )
-    if args.csparc_workspace_uid == '':
-        workspace_uid = csparc_com.make_workspace(
-            args.csparc_project_uid,
-            title=args.csparc_workspace_title
-        )
-    else:
-        workspace_uid = args.csparc_workspace_uid
+    metrics = cryopicls.profiling.PipelineMetrics.from_args(
+        args, 'cryopicls_autorefine_cryosparc',
+        os.path.join(args.cryopicls_result_dir, f'{args.cryopicls_result_basename}_autorefine_metrics.json'))
+    metrics.set_inputs(n_result_groups=len(csg_files))
+    metrics.set_input_files(*csg_files)
+    with metrics:
+        # One communicator (thus one ssh connection and one user id lookup) for the whole run
+        with metrics.stage('connect'):
+            if args.transport == 'local':
+                transport = cryopicls.autorefine.transport.LocalTransport()
+            else:
+                transport = cryopicls.autorefine.transport.SSHTransport(
+                    args.ssh_user, args.ssh_host, args.ssh_port,
+                    multiplexing=not args.ssh_no_multiplexing,
+                    control_persist=args.ssh_control_persist,
+                    max_retries=args.ssh_retries
+                )
+            csparc_com = cryopicls.autorefine.cryosparc.CryoSPARCCom(
+                args.ssh_user, args.ssh_host, args.ssh_port, args.csparc_user_email,
+                transfer_mode=args.transfer_mode,
+                transfer_verify=args.transfer_verify,
+                transfer_threads=args.transfer_threads,
+                transport=transport
+            )
+        try:
+            run(args, csparc_com, csg_files, metrics=metrics)
+        finally:
+            csparc_com.print_latency_stats()
+            metrics.set_info(transport=args.transport, remote_latency=csparc_com.get_latency_stats())
+            csparc_com.close()
 
-    for csg_file in csg_files:
-        # Instanciate communicator
-        csparc_com = cryopicls.autorefine.cryosparc.CryoSPARCCom(
-            args.ssh_user, args.ssh_host, args.ssh_port, args.csparc_user_email
-        )
-        # Should assert cryoSPARC version >= v3 here or inside CryoSPARCCom
 
-        # Import result group
-        job_uid = csparc_com.import_clustering_result_group(
-            args.csparc_project_uid, workspace_uid, csg_file,
-            cache_dir=args.cache_dir, lane=args.csparc_lane,
-            title=f'Import of cryoPICLS clustering result : {csg_file}'
-        )
+def get_cluster_job_ops(args, csparc_com, workspace_uid, import_job_uid, csg_file, reconstruct_job_uid=None):
+    """Batch operations making the reconstruction (or ab-initio) and refinement jobs of one cluster.
 
-        if args.csparc_abinitio:
-            # Ab-initio reconstruction
-            job_uid = csparc_com.make_job(
-                'homo_abinit',
-                args.csparc_project_uid, workspace_uid,
-                params={
-                    'abinit_symmetry': args.csparc_abinitio_symmetry,
-                },
-                input_group_connects={
-                    'particles': f'{job_uid}.particles'
-                },
-                title=csg_file
-            )
-        else:
-            # Reconstruction without refinement (reconstruction only)
-            job_uid = csparc_com.make_job(
-                'homo_reconstruct',
-                args.csparc_project_uid, workspace_uid,
-                params={
-                    'refine_symmetry': args.csparc_refine_symmetry,
-                    'refine_gs_resplit': True
-                },
-                input_group_connects={
-                    'particles': f'{job_uid}.particles',
-                    'mask': f'{args.csparc_consensus_job_uid}.mask'
-                },
-                title=csg_file
-            )
-        csparc_com.enqueue_job(
-            args.csparc_project_uid, job_uid, lane=args.csparc_lane
-        )
+    If reconstruct_job_uid is given, only the refinement job is made, connected to that existing reconstruction job.
+    """
 
-        # Refinement
-        if args.csparc_abinitio:
-            input_group_connects = {
-                'particles': f'{job_uid}.particles_class_0',
-                'volume': f'{job_uid}.volume_class_0'
-            }
-        else:
-            input_group_connects = {
-                'particles': f'{job_uid}.particles',
-                'volume': f'{job_uid}.volume'
-            }
-        job_uid = csparc_com.make_job(
-            'homo_refine_new',
+    ref = cryopicls.autorefine.batch.ref
+    ops = []
+
+    if reconstruct_job_uid is None and args.csparc_abinitio:
+        # Ab-initio reconstruction
+        ops.append(csparc_com.make_job_op(
+            'homo_abinit',
+            args.csparc_project_uid, workspace_uid,
+            params={
+                'abinit_symmetry': args.csparc_abinitio_symmetry,
+            },
+            input_group_connects={
+                'particles': f'{import_job_uid}.particles'
+            },
+            title=csg_file
+        ))
+    elif reconstruct_job_uid is None:
+        # Reconstruction without refinement (reconstruction only)
+        ops.append(csparc_com.make_job_op(
+            'homo_reconstruct',
             args.csparc_project_uid, workspace_uid,
             params={
                 'refine_symmetry': args.csparc_refine_symmetry,
                 'refine_gs_resplit': True
             },
-            input_group_connects=input_group_connects,
+            input_group_connects={
+                'particles': f'{import_job_uid}.particles',
+                'mask': f'{args.csparc_consensus_job_uid}.mask'
+            },
             title=csg_file
+        ))
+
+    # Refinement, connected to the outputs of the reconstruction job made just before in the same batch
+    if reconstruct_job_uid is None:
+        reconstruct_job_uid = ref(0)
+    if args.csparc_abinitio:
+        input_group_connects = {
+            'particles': f'{reconstruct_job_uid}.particles_class_0',
+            'volume': f'{reconstruct_job_uid}.volume_class_0'
+        }
+    else:
+        input_group_connects = {
+            'particles': f'{reconstruct_job_uid}.particles',
+            'volume': f'{reconstruct_job_uid}.volume'
+        }
+    ops.append(csparc_com.make_job_op(
+        'homo_refine_new',
+        args.csparc_project_uid, workspace_uid,
+        params={
+            'refine_symmetry': args.csparc_refine_symmetry,
+            'refine_gs_resplit': True
+        },
+        input_group_connects=input_group_connects,
+        title=csg_file
+    ))
+
+    return ops
+
+
+def needs_new_job(entry):
+    """Whether a step has to be (re)made, given its journal entry."""
+    return entry is None or entry['status'] in ['failed', 'killed']
+
+
+def run_step(args, scheduler, journal, csg_file, step):
+    """Run a job made beforehand (status 'building'), or reattach to it if it is already in flight, and record its final status."""
+    entry = journal.get(csg_file, step)
+    if entry['status'] != 'completed':
+        status = scheduler.run_job(
+            args.csparc_project_uid, entry['job_uid'], lane=args.csparc_lane, enqueue=entry['status'] == 'building')
+        journal.set(csg_file, step, entry['job_uid'], status)
+        assert status == 'completed', f'Job {args.csparc_project_uid}-{entry["job_uid"]} ({step}) {status}'
+    return entry['job_uid']
+
+
+def run_cluster_pipeline(args, scheduler, journal, workspace_uid, csg_file):
+    """Import, reconstruction (or ab-initio) and refinement of one cluster. Each job is enqueued once its parent has completed.
+
+    Steps completed in a previous run (according to the journal) are skipped, and jobs still in flight are waited for.
+    """
+
+    csparc_com = scheduler.csparc_com
+    job_uids = dict()
+
+    job_uids['import'] = run_step(args, scheduler, journal, csg_file, 'import')
+
+    # The outputs of the import job are known once it has completed. Both the following jobs are made in a single remote call.
+    # A failed reconstruction is made again together with a new refinement, since the refinement is connected to it.
+    if needs_new_job(journal.get(csg_file, 'reconstruct')):
+        reconstruct_job_uid, refine_job_uid = csparc_com.run_batch(
+            get_cluster_job_ops(args, csparc_com, workspace_uid, job_uids['import'], csg_file)
+        )
+        journal.set(csg_file, 'reconstruct', reconstruct_job_uid, 'building')
+        journal.set(csg_file, 'refine', refine_job_uid, 'building')
+    elif needs_new_job(journal.get(csg_file, 'refine')):
+        refine_job_uid, = csparc_com.run_batch(
+            get_cluster_job_ops(args, csparc_com, workspace_uid, job_uids['import'], csg_file,
+                                reconstruct_job_uid=journal.get(csg_file, 'reconstruct')['job_uid'])
         )
-        csparc_com.enqueue_job(
-            args.csparc_project_uid, job_uid, lane=args.csparc_lane
+        journal.set(csg_file, 'refine', refine_job_uid, 'building')
+
+    job_uids['reconstruct'] = run_step(args, scheduler, journal, csg_file, 'reconstruct')
+    job_uids['refine'] = run_step(args, scheduler, journal, csg_file, 'refine')
+
+    return job_uids
+
+
+def run(args, csparc_com, csg_files, metrics=None):
+    if metrics is None:
+        metrics = cryopicls.profiling.PipelineMetrics('cryopicls_autorefine_cryosparc', enabled=False)
+
+    journal_file = os.path.join(args.cryopicls_result_dir, f'{args.cryopicls_result_basename}_autorefine_journal.json')
+    if args.no_resume and os.path.exists(journal_file):
+        os.remove(journal_file)
+    journal = cryopicls.autorefine.journal.Journal(journal_file, args.csparc_project_uid)
+
+    # Current statuses of the jobs of a previous run, in a single remote call
+    jobs = journal.get_jobs()
+    if len(jobs) > 0:
+        with metrics.stage('resume', n_jobs=len(jobs)):
+            journal.update_statuses(csparc_com.get_job_statuses([(args.csparc_project_uid, job_uid) for _, _, job_uid in jobs]))
+        print(f'Resuming from {journal_file}: ' + ', '.join(f'{key} {step} {job_uid} ({journal.get(key, step)["status"]})' for key, step, job_uid in jobs))
+
+    # Create the workspace (if needed) and all the missing import jobs in a single remote call
+    ops = []
+    if args.csparc_workspace_uid != '':
+        workspace_uid = args.csparc_workspace_uid
+    elif journal.workspace_uid is not None:
+        workspace_uid = journal.workspace_uid
+    else:
+        ops.append(csparc_com.make_workspace_op(
+            args.csparc_project_uid,
+            title=args.csparc_workspace_title
+        ))
+        workspace_uid = cryopicls.autorefine.batch.ref(0)
+    import_csg_files = [x for x in csg_files if needs_new_job(journal.get(x, 'import'))]
+    if len(import_csg_files) > 0:
+        # All the result groups are transferred to the cache directory at once
+        with metrics.stage('transfer', n_result_groups=len(import_csg_files)):
+            cached_csg_files = csparc_com.transfer_result_groups_to_cache(import_csg_files, args.cache_dir)
+        for csg_file, cached_csg_file in zip(import_csg_files, cached_csg_files):
+            ops.append(csparc_com.make_import_job_op(
+                args.csparc_project_uid, workspace_uid, cached_csg_file,
+                title=f'Import of cryoPICLS clustering result : {csg_file}'
+            ))
+    with metrics.stage('import', n_ops=len(ops)):
+        results = csparc_com.run_batch(ops) if len(ops) > 0 else []
+    if len(results) > len(import_csg_files):
+        workspace_uid = results.pop(0)
+        journal.set_workspace_uid(workspace_uid)
+    for csg_file, job_uid in zip(import_csg_files, results):
+        journal.set(csg_file, 'import', job_uid, 'building')
+
+    # Should assert cryoSPARC version >= v3 here or inside CryoSPARCCom
+
+    # The job chains of all the clusters run concurrently, and the statuses of all the jobs in flight are polled at once
+    monitor = cryopicls.autorefine.monitor.JobStatusMonitor(
+        csparc_com, min_interval=args.poll_interval_min, max_interval=args.poll_interval_max
+    )
+    scheduler = cryopicls.autorefine.scheduler.JobScheduler(
+        csparc_com, max_in_flight=args.max_jobs_in_flight if args.max_jobs_in_flight > 0 else None, monitor=monitor
+    )
+    t_start = time.perf_counter()
+    with metrics.stage('jobs', n_result_groups=len(csg_files)), monitor:
+        results = scheduler.run_pipelines(
+            lambda csg_file: run_cluster_pipeline(args, scheduler, journal, workspace_uid, csg_file), csg_files
         )
 
+    print(f'##### Jobs ({time.perf_counter() - t_start:.1f} s) #####')
+    for csg_file, (job_uids, error) in zip(csg_files, results):
+        if error is None:
+            print(f'\t{os.path.basename(csg_file)} : ' + ', '.join(f'{k} {v}' for k, v in job_uids.items()))
+        else:
+            print(f'\t{os.path.basename(csg_file)} : failed ({error!r})')
+    n_failed = sum(error is not None for _, error in results)
+    if n_failed > 0:
+        sys.exit(f'{n_failed} of {len(csg_files)} cluster pipelines failed. Run again to resume.')
+
 
 if __name__ == '__main__':
     main()
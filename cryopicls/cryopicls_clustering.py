@@ -13,31 +13,45 @@ import cryopicls
 def main():
     args = cryopicls.args.clustering.parse_args()
 
+    metrics = cryopicls.profiling.PipelineMetrics.from_args(
+        args, 'cryopicls_clustering', os.path.join(args.output_dir, f'{args.output_file_rootname}_metrics.json'))
+    with metrics:
+        run(args, metrics)
+
+
+def run(args, metrics):
     # Load particle metadata
-    if args.cryodrgn:
-        # Input is cryoDRGN result
-        if os.path.splitext(args.metadata)[1] == '.csg':
+    with metrics.stage('load_metadata'):
+        if args.cryodrgn:
+            # Input is cryoDRGN result
+            if os.path.splitext(args.metadata)[1] == '.csg':
+                md = cryopicls.data_handling.cryosparc.CryoSPARCMetaData.load(
+                    args.metadata)
+            elif os.path.splitext(args.metadata)[1] == '.star':
+                md = cryopicls.data_handling.relion.RelionMetaData.load(
+                    args.metadata)
+            else:
+                sys.exit(
+                    f'--metadata {args.metadata} is neither a cryoSPARC group file nor a RELION star file!'
+                )
+        elif args.cryosparc:
+            # Input is cryoSPARC 3D variability job
             md = cryopicls.data_handling.cryosparc.CryoSPARCMetaData.load(
-                args.metadata)
-        elif os.path.splitext(args.metadata)[1] == '.star':
-            md = cryopicls.data_handling.relion.RelionMetaData.load(
-                args.metadata)
-        else:
-            sys.exit(
-                f'--metadata {args.metadata} is neither a cryoSPARC group file nor a RELION star file!'
-            )
-    elif args.cryosparc:
-        # Input is cryoSPARC 3D variability job
-        md = cryopicls.data_handling.cryosparc.CryoSPARCMetaData.load(
-            args.threedvar_csg)
+                args.threedvar_csg)
 
     # Load latent representations, Z
-    if args.cryodrgn:
-        Z = cryopicls.data_handling.cryodrgn.load_latent_variables(args.z_file)
-    elif args.cryosparc:
-        cs_file, _ = cryopicls.data_handling.cryosparc.get_metafiles_from_csg(args.threedvar_csg)
-        Z = cryopicls.data_handling.cryosparc.load_latent_variables(
-            cs_file, args.threedvar_num_components)
+    with metrics.stage('load_latent'):
+        if args.cryodrgn:
+            if cryopicls.data_handling.columnar.is_columnar_file(args.z_file):
+                Z = cryopicls.data_handling.columnar.load_latent_variables(args.z_file)
+            else:
+                Z = cryopicls.data_handling.cryodrgn.load_latent_variables(args.z_file)
+        elif args.cryosparc:
+            cs_file, _ = cryopicls.data_handling.cryosparc.get_metafiles_from_csg(args.threedvar_csg)
+            Z = cryopicls.data_handling.cryosparc.load_latent_variables(
+                cs_file, args.threedvar_num_components)
+    metrics.set_inputs(n_particles=Z.shape[0], n_dims=Z.shape[1])
+    metrics.set_input_files(args.z_file, args.metadata, args.threedvar_csg)
 
     # Initialize clustering model
     if args.algorithm == 'auto-gmm':
@@ -53,53 +67,73 @@ def main():
         model = cryopicls.clustering.manual_select.ManualSelector(thresh_list)
 
     # Do clustering
-    fitted_model, cluster_labels, cluster_centers = model.fit(Z)
+    telemetry = cryopicls.clustering.telemetry.FitTelemetry(
+        handlers=[cryopicls.clustering.telemetry.ProgressHandler(interval=args.progress_interval)],
+        heartbeat_interval=args.progress_interval)
+    with metrics.stage('fit'):
+        fitted_model, cluster_labels, cluster_centers = model.fit(Z, telemetry=telemetry)
+    label_list = np.unique(cluster_labels)
+    metrics.set_info(algorithm=args.algorithm, n_clusters=len(label_list))
 
     # Save metadatas and model
     os.makedirs(args.output_dir, exist_ok=True)
-    # The best model
-    with open(os.path.join(args.output_dir,
-              f'{args.output_file_rootname}_model.pkl'), 'wb') as f:
-        pickle.dump(fitted_model, f, protocol=4)
-    # Cluster centers
-    np.savetxt(
-        os.path.join(args.output_dir, f'{args.output_file_rootname}_cluster_centers.txt'),
-        cluster_centers)
+    # Restarts, iterations and convergence of the fit, with the parameters of the model
+    telemetry.save(
+        os.path.join(args.output_dir, f'{args.output_file_rootname}_fit_telemetry.json'),
+        algorithm=args.algorithm,
+        parameters={k: v for k, v in vars(model).items() if not k.endswith('_') and isinstance(v, (bool, int, float, str, type(None)))})
+    with metrics.stage('save_model'):
+        # The best model
+        with open(os.path.join(args.output_dir,
+                  f'{args.output_file_rootname}_model.pkl'), 'wb') as f:
+            pickle.dump(fitted_model, f, protocol=4)
+        # Cluster centers
+        np.savetxt(
+            os.path.join(args.output_dir, f'{args.output_file_rootname}_cluster_centers.txt'),
+            cluster_centers)
     # Coordinates in Z nearest to the cluster centers
-    label_list = np.unique(cluster_labels)
-    nearest_points = []
-    for i, cluster_center in enumerate(cluster_centers):
-        label = label_list[i]
-        Z_cluster_center = Z[np.nonzero(cluster_labels == label)[0]]
-        _, nearest_point = cryopicls.utils.nearest_in_array(
-            Z_cluster_center, cluster_center)
-        nearest_points.append(nearest_point)
-    np.savetxt(
-        os.path.join(
-            args.output_dir,
-            f'{args.output_file_rootname}_nearest_points_to_cluster_centers.txt'
-        ), nearest_points)
+    with metrics.stage('nearest_points'):
+        nearest_points = []
+        for i, cluster_center in enumerate(cluster_centers):
+            label = label_list[i]
+            Z_cluster_center = Z[np.nonzero(cluster_labels == label)[0]]
+            _, nearest_point = cryopicls.utils.nearest_in_array(
+                Z_cluster_center, cluster_center)
+            nearest_points.append(nearest_point)
+        np.savetxt(
+            os.path.join(
+                args.output_dir,
+                f'{args.output_file_rootname}_nearest_points_to_cluster_centers.txt'
+            ), nearest_points)
     # Metadata and Z of each cluster
-    for label in label_list:
-        idxs = np.nonzero(cluster_labels == label)[0]
-        md_cluster = md.iloc(idxs)
-        md_cluster.write(args.output_dir,
-                         f'{args.output_file_rootname}_cluster{label:03d}')
-        Z_cluster = Z[idxs]
-        np.save(
-            os.path.join(args.output_dir,
-                         f'{args.output_file_rootname}_cluster{label:03d}_Z'),
-            Z_cluster)
+    with metrics.stage('export_clusters', n_clusters=len(label_list)):
+        for label in label_list:
+            idxs = np.nonzero(cluster_labels == label)[0]
+            md_cluster = md.iloc(idxs)
+            md_cluster.write(args.output_dir,
+                             f'{args.output_file_rootname}_cluster{label:03d}')
+            Z_cluster = Z[idxs]
+            np.save(
+                os.path.join(args.output_dir,
+                             f'{args.output_file_rootname}_cluster{label:03d}_Z'),
+                Z_cluster)
 
     # Save Z and cluster_labels as dataframe (input for cryopicls_visualizer)
-    col_names = [f'dim_{x}' for x in range(1, Z.shape[1] + 1)]
-    df = pd.concat([
-        pd.DataFrame(data=Z, columns=col_names),
-        pd.Series(data=cluster_labels, name='cluster')
-    ], axis=1)
-    df.to_pickle(
-        os.path.join(args.output_dir,
-                     f'{args.output_file_rootname}_dataframe.pkl'))
+    with metrics.stage('save_dataframe'):
+        col_names = [f'dim_{x}' for x in range(1, Z.shape[1] + 1)]
+        df = pd.concat([
+            pd.DataFrame(data=Z, columns=col_names),
+            pd.Series(data=cluster_labels, name='cluster')
+        ], axis=1)
+        if args.output_format == 'columnar':
+            cryopicls.data_handling.columnar.save_columnar(
+                os.path.join(args.output_dir,
+                             f'{args.output_file_rootname}_dataframe{cryopicls.data_handling.columnar.EXTENSION}'),
+                df, attrs={'source': 'cryopicls_clustering', 'algorithm': args.algorithm})
+        else:
+            df.to_pickle(
+                os.path.join(args.output_dir,
+                             f'{args.output_file_rootname}_dataframe.pkl'))
 
 
 if __name__ == '__main__':
@@ -1,7 +1,5 @@
 import os
 
-import umap
-import sklearn.decomposition
 import pandas as pd
 
 import cryopicls
@@ -10,15 +8,29 @@ import cryopicls
 def main():
     args = cryopicls.args.projector.parser_args()
 
+    metrics = cryopicls.profiling.PipelineMetrics.from_args(
+        args, 'cryopicls_projector', os.path.join(args.output_dir, f'{args.output_file_rootname}_{args.algorithm}_metrics.json'))
+    with metrics:
+        run(args, metrics)
+
+
+def run(args, metrics):
     # Load latent representations
-    if args.cryodrgn:
-        Z = cryopicls.data_handling.cryodrgn.load_latent_variables(args.z_file)
-    elif args.cryosparc:
-        cs_file, _ = cryopicls.data_handling.cryosparc.get_metafiles_from_csg(args.threedvar_csg)
-        Z = cryopicls.data_handling.cryosparc.load_latent_variables(cs_file)
+    with metrics.stage('load_latent'):
+        if args.cryodrgn:
+            if cryopicls.data_handling.columnar.is_columnar_file(args.z_file):
+                Z = cryopicls.data_handling.columnar.load_latent_variables(args.z_file)
+            else:
+                Z = cryopicls.data_handling.cryodrgn.load_latent_variables(args.z_file)
+        elif args.cryosparc:
+            cs_file, _ = cryopicls.data_handling.cryosparc.get_metafiles_from_csg(args.threedvar_csg)
+            Z = cryopicls.data_handling.cryosparc.load_latent_variables(cs_file)
+    metrics.set_inputs(n_particles=Z.shape[0], n_dims=Z.shape[1])
+    metrics.set_input_files(args.z_file, args.threedvar_csg)
 
-    # Initialize projector
+    # Initialize projector. umap (with numba) and scikit-learn are only imported by their algorithm.
     if args.algorithm == 'umap':
+        import umap
         assert Z.shape[1] > args.n_components
         projector = umap.UMAP(n_neighbors=args.n_neighbors,
                               n_components=args.n_components,
@@ -27,21 +39,31 @@ def main():
                               random_state=args.random_state)
         axis_label = 'umap'
     elif args.algorithm == 'pca':
+        import sklearn.decomposition
         assert args.n_components is None or Z.shape[1] > args.n_components
         projector = sklearn.decomposition.PCA(n_components=args.n_components,
                                               random_state=args.random_state)
         axis_label = 'pc'
 
     # Projection
-    Z_proj = projector.fit_transform(Z)
+    with metrics.stage('fit_transform'):
+        Z_proj = projector.fit_transform(Z)
+    metrics.set_info(algorithm=args.algorithm, n_components=Z_proj.shape[1])
 
     # Save result
-    col_names = [f'{axis_label}_{x}' for x in range(1, Z_proj.shape[1] + 1)]
-    df = pd.DataFrame(data=Z_proj, columns=col_names)
-    os.makedirs(args.output_dir, exist_ok=True)
-    df.to_pickle(
-        os.path.join(args.output_dir,
-                     f'{args.output_file_rootname}_{args.algorithm}.pkl'))
+    with metrics.stage('save'):
+        col_names = [f'{axis_label}_{x}' for x in range(1, Z_proj.shape[1] + 1)]
+        df = pd.DataFrame(data=Z_proj, columns=col_names)
+        os.makedirs(args.output_dir, exist_ok=True)
+        if args.output_format == 'columnar':
+            cryopicls.data_handling.columnar.save_columnar(
+                os.path.join(args.output_dir,
+                             f'{args.output_file_rootname}_{args.algorithm}{cryopicls.data_handling.columnar.EXTENSION}'),
+                df, attrs={'source': 'cryopicls_projector', 'algorithm': args.algorithm})
+        else:
+            df.to_pickle(
+                os.path.join(args.output_dir,
+                             f'{args.output_file_rootname}_{args.algorithm}.pkl'))
 
 
 if __name__ == '__main__':
@@ -1,17 +1,27 @@
 """Web app for visualizing cryoPICLS results."""
 
 import os
+import json
+import signal
+import functools
+import shutil
 import argparse
+import tempfile
+import urllib.parse
 
 import numpy as np
 import pandas as pd
 import plotly.express as px
+import plotly.graph_objects as go
+import plotly.io as pio
+from plotly.subplots import make_subplots
 import dash
 import dash_bootstrap_components as dbc
 import dash_core_components as dcc
 import dash_html_components as html
 import dash_daq as daq
-from dash.dependencies import Input, Output, State
+from dash.dependencies import Input, Output, State, ALL
+from dash.exceptions import PreventUpdate
 from dash_table import DataTable
 
 import cryopicls
@@ -23,103 +33,305 @@ templates = [
     ['ggplot2', 'seaborn', 'simple_white', 'plotly', 'plotly_white', 'plotly_dark',
      'presentation', 'xgridoff', 'ygridoff', 'gridon', 'none']]
 
-df = pd.DataFrame()
-datatable_data = dict()
 datatable_columns = [
     dict(id='datatable_groups', name='Groups'),
     dict(id='datatable_num_samples', name='Num Samples', type='numeric')
 ]
-df_mins = pd.Series(dtype='float64')
-df_maxs = pd.Series(dtype='float64')
-clustering_result_file = None
-projection_result_file = None
-cryodrgn_result_file = None
-threedva_result_file = None
+# Datasets served by the app, loaded lazily on first access
+registry = cryopicls.visualization.registry.DatasetRegistry()
+# Pages of each dataset: (URL path component, label, minimum number of dimensions)
+views = [('scatter3d', 'Scatter 3D', 3), ('scatter2d', 'Scatter 2D', 2), ('hist1d', 'Histogram 1D', 1), ('dashboard', 'Dashboard', 2)]
+# View shown at the root URL when a single dataset is served
+default_view = None
+# Point budget of scatter plots
+max_points = 100000
+# Default output directory of the selected particles
+export_dir = '.'
+# Render mode of the 2D scatter plot, and the number of samples in view above which 'auto' renders a density image
+render_mode = 'auto'
+raster_threshold = 1000000
+render_modes = [
+    {'label': 'Auto', 'value': 'auto'},
+    {'label': 'WebGL', 'value': 'webgl'},
+    {'label': 'SVG', 'value': 'svg'},
+    {'label': 'Density image', 'value': 'raster'}]
+# Render modes of the 3D scatter plot. The density modes send a voxel grid, whose size does not depend on the number of samples.
+render_modes_3d = [
+    {'label': 'Markers', 'value': 'markers'},
+    {'label': 'Density isosurfaces', 'value': 'isosurface'},
+    {'label': 'Density volume', 'value': 'volume'}]
+# Size limit of the rug plot of histograms
+rug_max_samples = 5000
+# Maximum number of linked histograms in the dashboard
+dashboard_max_dims = 12
+# Cluster colors. Fixed regardless of the plot theme, so that themes can be switched on the client side.
+colorway = px.colors.qualitative.Plotly
+# Serialized figures keyed by (view, dataset, data version (see LoadedDataset.get_version()), axes, color, ...). Plot theme and marker size are applied on the client side.
+figure_cache = cryopicls.visualization.figure_cache.FigureCache()
+# Stages of the callbacks (per view), recorded with --profile
+metrics = cryopicls.profiling.PipelineMetrics('cryopicls_visualizer', enabled=False)
 
 # dash.Dash automatically loads .css files in the assets directory.
 app = dash.Dash(__name__, title="cryoPICLS", suppress_callback_exceptions=True)
 
 
-navvar = dbc.Row([
-    dbc.NavbarSimple(
-        brand='cryoPICLS Visualizer',
-        brand_style={'color': 'white', 'font-weight': 'bold', 'font-size': '2rem'}, color='primary',
-        fluid=True,
-        style={'min-width': '100vw'},
-        className='pl-0')
+app.layout = html.Div([
+    dcc.Location(id='url', refresh=False),
+    html.Div(id='page-content')
 ])
 
 
-def get_options():
-    axes = df.drop('cluster', axis=1, errors='ignore').columns
-    options = [{'label': x, 'value': x} for x in axes]
-    return options
-
-
-def get_color_switch_disable():
-    if 'cluster' in df.columns:
+def profiled(name):
+    """Decorator running a callback in the metrics stage name."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with metrics.stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def get_page_path(dataset_name, view):
+    return f'/{urllib.parse.quote(dataset_name, safe="")}/{view}'
+
+
+def create_navvar(dataset_name=None):
+    """Navigation bar, with links to the dataset list and to the views of the current dataset."""
+    links = [dbc.NavItem(dbc.NavLink('Datasets', href='/'))]
+    if dataset_name is not None:
+        links += [dbc.NavItem(dbc.NavLink(label, href=get_page_path(dataset_name, view))) for view, label, _ in views]
+    return dbc.Row([
+        dbc.NavbarSimple(
+            links,
+            brand='cryoPICLS Visualizer',
+            brand_href='/',
+            brand_style={'color': 'white', 'font-weight': 'bold', 'font-size': '2rem'}, color='primary',
+            dark=True,
+            fluid=True,
+            style={'min-width': '100vw'},
+            className='pl-0')
+    ])
+
+
+def get_color_switch_disable(data):
+    if 'cluster' in data.df.columns:
         val = False
     else:
         val = True
     return val
 
 
-def get_color(color_by_cluster):
-    if color_by_cluster:
+def get_color(color_by_cluster, metadata_column=None):
+    if metadata_column:
+        color = metadata_column
+    elif color_by_cluster:
         color = 'cluster'
     else:
         color = None
     return color
 
 
-def get_range(axis, margin=0.5):
-    vmin = df_mins[axis] - margin
-    vmax = df_maxs[axis] + margin
-    return [vmin, vmax]
-
+def get_metadata_options(data):
+    return [{'label': x, 'value': x} for x in data.get_metadata_columns()]
 
-def create_datatable_data(df_in):
-    groups = []
-    num_samples = []
-    if 'cluster' in df_in.columns:
-        cluster_ids, cluster_num_samples = np.unique(df_in['cluster'], return_counts=True)
-        cluster_ids = [f'cluter_{x}' for x in cluster_ids]
-        cluster_num_samples = list(cluster_num_samples)
-        groups += cluster_ids
-        num_samples += cluster_num_samples
-    groups.append('Total')
-    num_samples.append(df_in.shape[0])
 
-    data = [
-        {'datatable_groups': x, 'datatable_num_samples': y}
-        for x, y in zip(groups, num_samples)
-    ]
+def get_color_frame(data, idxs, color):
+    """Samples at the row positions idxs to plot, the column to color them by, and the legend order of the colors.
 
-    return data
+    A particle metadata column is joined to the plotted samples only. A categorical column with too many categories
+    for a legend (e.g. micrographs) is colored by the index of the category on a continuous scale.
+    """
+    df = data.df.iloc[idxs]
+    if color is None or color == 'cluster':
+        return df, color, get_category_orders(data, color)
+    values = data.get_metadata_column(color)
+    if isinstance(values, pd.Categorical):
+        if len(values.categories) <= data.max_categories:
+            return df.assign(**{color: values[idxs]}), color, {color: list(values.categories)}
+        color_index = f'{color} (index)'
+        return df.assign(**{color_index: values.codes[idxs]}), color_index, None
+    return df.assign(**{color: values[idxs]}), color, None
 
 
-def get_file_info():
+def get_color_codes(data, color):
+    """Integer codes of the colors of all the samples and the names of the codes. (None, None) unless colored by categories."""
+    if color == 'cluster':
+        return data.get_cluster_codes()
+    if color is not None:
+        values = data.get_metadata_column(color)
+        if isinstance(values, pd.Categorical) and len(values.categories) <= data.max_categories:
+            return values.codes, [str(x) for x in values.categories]
+    return None, None
+
+
+def get_lod_samples(data, axes, ranges=None):
+    """Row positions of the data to plot for the axes, and the number of samples within the ranges."""
+    index = data.get_lod_index(axes)
+    # max_points <= 0 disables level-of-detail
+    budget = max_points if max_points > 0 else index.n_samples
+    idxs = index.query(ranges=ranges, max_points=budget)
+    return idxs, index.count(ranges)
+
+
+def get_relayout_ranges(relayout_data, axis_names=('xaxis', 'yaxis')):
+    """Visible axis ranges from relayoutData of a graph. None for autoscaled (or unknown) axes."""
+    if not relayout_data:
+        return None
+    ranges = []
+    for name in axis_names:
+        if f'{name}.range[0]' in relayout_data:
+            ranges.append([relayout_data[f'{name}.range[0]'], relayout_data[f'{name}.range[1]']])
+        elif f'{name}.range' in relayout_data:
+            ranges.append(list(relayout_data[f'{name}.range']))
+        else:
+            ranges.append(None)
+    if all(x is None for x in ranges):
+        return None
+    return ranges
+
+
+def get_category_orders(data, color):
+    """Legend order and colors of the clusters, fixed regardless of which clusters are in the plotted samples."""
+    if color == 'cluster':
+        return {'cluster': data.get_cluster_codes()[1]}
+    return None
+
+
+def get_render_mode(mode, n_visible):
+    if mode == 'auto':
+        mode = 'raster' if n_visible > raster_threshold else 'webgl'
+    return mode
+
+
+def create_raster_figure(data, x_axis, y_axis, x_range, y_range, color):
+    """2D density image of all the samples within the ranges, colored by the share of each cluster (or category) in each pixel."""
+    codes, names = get_color_codes(data, color)
+    show_legend = codes is not None
+    if codes is None:
+        names = ['all']
+    counts = cryopicls.visualization.raster.aggregate(
+        data.df[x_axis].to_numpy(), data.df[y_axis].to_numpy(), x_range, y_range,
+        codes=codes, n_codes=len(names))
+    image = cryopicls.visualization.raster.shade(counts, colorway)
+
+    fig = go.Figure()
+    # Legend entries (the image itself is a layout image)
+    for i, name in enumerate(names):
+        fig.add_trace(go.Scatter(
+            x=[None], y=[None], mode='markers', name=name,
+            marker_color=colorway[i % len(colorway)], showlegend=show_legend))
+    fig.add_layout_image(
+        source=cryopicls.visualization.raster.to_png_data_uri(image),
+        xref='x', yref='y', x=min(x_range), y=max(y_range),
+        sizex=abs(x_range[1] - x_range[0]), sizey=abs(y_range[1] - y_range[0]),
+        sizing='stretch', layer='above')
+    fig.update_layout(xaxis_title=x_axis, yaxis_title=y_axis)
+    fig.update_xaxes(range=x_range, showgrid=False)
+    fig.update_yaxes(range=y_range, showgrid=False)
+    return fig
+
+
+def get_lod_info(n_shown, n_total):
+    if n_shown < n_total:
+        text = f'Showing {n_shown} of {n_total} samples (level of detail). Zoom in to show more.'
+    else:
+        text = f'Showing all {n_total} samples.'
+    return text
+
+
+def get_template_data():
+    """Plot theme templates, sent to the browser once so that the theme can be switched on the client side."""
+    return {x['value']: pio.templates[x['value']].to_plotly_json() for x in templates}
+
+
+# Apply the plot theme (and marker size) to a figure built on the server, without a round trip to the server.
+# The coordinates of volume traces are sent as a regular grid (meta.grid: [start, step, number] of x, y and z), and expanded here.
+clientside_apply_style = """
+function(figure, templates, theme, markerSize) {
+    if (!figure) {
+        return window.dash_clientside.no_update;
+    }
+    const layout = Object.assign({}, figure.layout, {template: templates[theme]});
+    let data = figure.data.map(trace => {
+        if (!(trace.meta && trace.meta.grid) || trace.x) {
+            return trace;
+        }
+        const [gx, gy, gz] = trace.meta.grid;
+        const n = gx[2] * gy[2] * gz[2];
+        const x = new Float32Array(n), y = new Float32Array(n), z = new Float32Array(n);
+        let i = 0;
+        for (let ix = 0; ix < gx[2]; ix++) {
+            for (let iy = 0; iy < gy[2]; iy++) {
+                for (let iz = 0; iz < gz[2]; iz++, i++) {
+                    x[i] = gx[0] + ix * gx[1];
+                    y[i] = gy[0] + iy * gy[1];
+                    z[i] = gz[0] + iz * gz[1];
+                }
+            }
+        }
+        return Object.assign({}, trace, {x: x, y: y, z: z});
+    });
+    if (markerSize !== undefined) {
+        data = data.map(trace => trace.type && trace.type.startsWith('scatter') ?
+            Object.assign({}, trace, {marker: Object.assign({}, trace.marker, {size: markerSize})}) : trace);
+    }
+    return {data: data, layout: layout};
+}
+"""
+
+
+def get_file_info(dataset_name):
     info = []
-    if clustering_result_file:
-        info.append(html.H6('Clustering result:', style={'font-weight': 'bold'}))
-        info.append(html.Div(clustering_result_file, className='ml-4'))
-    if projection_result_file:
-        info.append(html.H6('Projection result:', style={'font-weight': 'bold'}, className='mt-2'))
-        info.append(html.Div(projection_result_file, className='ml-4'))
-    if cryodrgn_result_file:
-        info.append(html.H6('cryoDRGN result:', style={'font-weight': 'bold'}, className='mt-2'))
-        info.append(html.Div(cryodrgn_result_file, className='ml-4'))
-    if threedva_result_file:
-        info.append(html.H6('3DVA result:', style={'font-weight': 'bold'}, className='mt-2'))
-        info.append(html.Div(threedva_result_file, className='ml-4'))
+    for i, (label, file) in enumerate(registry.get_dataset(dataset_name).get_files()):
+        info.append(html.H6(f'{label}:', style={'font-weight': 'bold'}, className='mt-2' if i > 0 else None))
+        info.append(html.Div(file, className='ml-4'))
     return info
 
 
-def create_container_scatter_3d():
-    options = get_options()
+def create_container_index():
+    """List of the datasets, with links to their views."""
+    cards = []
+    for dataset in registry.get_datasets():
+        if dataset.data is not None:
+            status = f'Loaded ({dataset.data.nbytes / 1024 ** 2:.1f} MB)'
+        else:
+            status = 'Not loaded'
+        cards.append(dbc.Card([
+            dbc.CardBody([
+                html.H5(dataset.name, className='card-title'),
+                *get_file_info(dataset.name),
+                html.Div(status, className='mt-2 text-muted'),
+                html.Div([
+                    dcc.Link(label, href=get_page_path(dataset.name, view), className='mr-4')
+                    for view, label, _ in views
+                ], className='mt-2')
+            ])
+        ], className='mt-3'))
+
+    container_index = dbc.Container([
+        create_navvar(),
+        dbc.Row([
+            dbc.Col(cards, width={'size': 8})
+        ])
+    ], fluid=True)
+
+    return container_index
+
+
+def create_container_message(message, dataset_name=None):
+    return dbc.Container([
+        create_navvar(dataset_name),
+        dbc.Alert(message, color='warning', className='mt-3')
+    ], fluid=True)
+
+
+def create_container_scatter_3d(dataset_name):
+    data = registry.get(dataset_name)
+    options = data.get_options()
 
     container_scatter_3d = dbc.Container([
-        navvar,
+        create_navvar(dataset_name),
 
         dbc.Row([
             dbc.Col([
@@ -165,8 +377,45 @@ def create_container_scatter_3d():
                         html.H6('Color by cluster:'),
                         daq.BooleanSwitch(
                             id='container-scatter-3d-switch-color',
-                            on=not get_color_switch_disable(),
-                            disabled=get_color_switch_disable()
+                            on=not get_color_switch_disable(data),
+                            disabled=get_color_switch_disable(data)
+                        ),
+                        html.H6('Color by metadata:'),
+                        dcc.Dropdown(
+                            id='container-scatter-3d-dropdown-metadata',
+                            options=get_metadata_options(data),
+                            value=None,
+                            placeholder='Specify the particle metadata of the dataset' if data.metadata_file is None else 'None',
+                            disabled=data.metadata_file is None
+                        ),
+                        html.H6('Render mode:'),
+                        dcc.Dropdown(
+                            id='container-scatter-3d-dropdown-render',
+                            options=render_modes_3d,
+                            value='markers',
+                            clearable=False
+                        ),
+                        html.H6('Density grid resolution:'),
+                        dcc.Slider(
+                            id='container-scatter-3d-slider-voxels',
+                            min=16, max=96,
+                            step=8,
+                            value=40,
+                            marks={
+                                16: '16',
+                                96: '96'
+                            }
+                        ),
+                        html.H6('Density level (% of maximum):'),
+                        dcc.Slider(
+                            id='container-scatter-3d-slider-level',
+                            min=5, max=95,
+                            step=5,
+                            value=20,
+                            marks={
+                                5: '5',
+                                95: '95'
+                            }
                         ),
                         dbc.Button(
                             'Update', id='container-scatter-3d-card-1-button-update',
@@ -179,7 +428,7 @@ def create_container_scatter_3d():
                         html.H5('Data statistics', className='card-title'),
                         DataTable(
                             columns=datatable_columns,
-                            data=datatable_data,
+                            data=data.datatable_data,
                             cell_selectable=False
                         )
                     ])
@@ -188,6 +437,9 @@ def create_container_scatter_3d():
 
             dbc.Col([
                 dcc.Graph(id='container-scatter-3d-graph-1', figure={}, style={'height': '70vh', 'display': 'none'}),
+                dcc.Store(id='container-scatter-3d-store-figure'),
+                dcc.Store(id='container-scatter-3d-store-dataset', data=dataset_name),
+                dcc.Store(id='container-scatter-3d-store-templates', data=get_template_data()),
                 dbc.Alert(id='container-scatter-3d-text', color='light')
             ], width={'size': 8}, style={'min-height': '100vh'}),
         ])
@@ -196,56 +448,144 @@ def create_container_scatter_3d():
     return container_scatter_3d
 
 
-@app.callback(
-    [Output('container-scatter-3d-graph-1', 'figure'),
-     Output('container-scatter-3d-graph-1', 'style'),
-     Output('container-scatter-3d-text', 'children')],
-    Input('container-scatter-3d-card-1-button-update', 'n_clicks'),
-    [State('container-scatter-3d-graph-1', 'style'),
-     State('container-scatter-3d-dropdown-x', 'value'),
-     State('container-scatter-3d-dropdown-y', 'value'),
-     State('container-scatter-3d-dropdown-z', 'value'),
-     State('container-scatter-3d-switch-color', 'on'),
-     State('container-scatter-3d-slider-marker', 'value'),
-     State('container-scatter-3d-dropdown-theme', 'value')]
-)
-def update_scatter3d(n_clicks, style, x_axis, y_axis, z_axis, color_by_cluster,
-                     marker_size, theme):
-    color = get_color(color_by_cluster)
+def create_scatter3d(data, x_axis, y_axis, z_axis, color):
+    idxs, n_total = get_lod_samples(data, [x_axis, y_axis, z_axis])
+    df, color_column, category_orders = get_color_frame(data, idxs, color)
 
     fig = px.scatter_3d(
         data_frame=df,
         x=x_axis,
         y=y_axis,
         z=z_axis,
-        color=color,
-        template=theme,
-        range_x=get_range(x_axis),
-        range_y=get_range(y_axis),
-        range_z=get_range(z_axis)
-    )
-
-    fig.update_traces(
-        marker_size=marker_size
+        color=color_column,
+        color_discrete_sequence=colorway,
+        category_orders=category_orders,
+        range_x=data.get_range(x_axis),
+        range_y=data.get_range(y_axis),
+        range_z=data.get_range(z_axis)
     )
 
     if color == 'cluster':
         fig.update_layout(
             legend_title_text='ClusterID',
         )
+    # Keep the camera when only the theme or the marker size changes
+    fig.update_layout(uirevision=f'{x_axis},{y_axis},{z_axis}')
+
+    return {'figure': fig, 'info': get_lod_info(len(idxs), n_total)}
+
+
+def create_density3d(data, x_axis, y_axis, z_axis, color, mode, n_voxels, level):
+    """Density of all the samples on a voxel grid, as isosurfaces per cluster (or category) or as a volume rendering of the total."""
+    codes, names = get_color_codes(data, color)
+    if codes is None or mode == 'volume':
+        codes, names = None, ['all']
+    axes = [x_axis, y_axis, z_axis]
+
+    key = (tuple(axes), n_voxels, color if codes is not None else None)
+    if key not in data.volume_cache:
+        edges, counts = cryopicls.visualization.volume.voxelize(
+            *[data.df[x].to_numpy() for x in axes], [[data.df_mins[x], data.df_maxs[x]] for x in axes], n_voxels,
+            codes=codes, n_codes=len(names))
+        volumes = np.stack([cryopicls.visualization.volume.quantize(cryopicls.visualization.volume.smooth(x)) for x in counts])
+        data.volume_cache[key] = (edges, volumes, names, counts.sum(axis=(1, 2, 3)))
+    edges, volumes, names, n_samples = data.volume_cache[key]
+
+    def get_grid(volume):
+        # Only the bounding box of the non-zero voxels is sent. Voxel centers are expanded to the coordinates of each voxel
+        # in the browser (see clientside_apply_style).
+        offsets, cropped = cryopicls.visualization.volume.crop(volume)
+        grid = [[float(x[i] + x[i + 1]) / 2, float(x[1] - x[0]), n] for x, i, n in zip(edges, offsets, cropped.shape)]
+        return cropped.ravel(), grid
+
+    isomin = 255 * level / 100
+    fig = go.Figure()
+    if mode == 'volume':
+        value, grid = get_grid(volumes[0])
+        fig.add_trace(go.Volume(
+            value=value, meta={'grid': grid}, isomin=isomin, isomax=255,
+            opacity=0.1, surface_count=12, colorscale='Viridis', colorbar_title='density'))
+    else:
+        for i, name in enumerate(names):
+            if n_samples[i] == 0:
+                continue
+            value, grid = get_grid(volumes[i])
+            fig.add_trace(go.Isosurface(
+                value=value, meta={'grid': grid}, isomin=isomin, isomax=255, surface_count=1,
+                colorscale=[[0, colorway[i % len(colorway)]], [1, colorway[i % len(colorway)]]], showscale=False,
+                opacity=0.6 if len(names) == 1 else 0.4, caps=dict(x_show=False, y_show=False, z_show=False),
+                name=name, showlegend=codes is not None))
+    fig.update_layout(scene=dict(
+        xaxis=dict(title=x_axis, range=data.get_range(x_axis)),
+        yaxis=dict(title=y_axis, range=data.get_range(y_axis)),
+        zaxis=dict(title=z_axis, range=data.get_range(z_axis))))
+    if codes is not None:
+        fig.update_layout(
+            legend_title_text='ClusterID' if color == 'cluster' else color
+        )
+    fig.update_layout(uirevision=f'{x_axis},{y_axis},{z_axis}')
+
+    info = f'Showing the density of {int(n_samples.sum())} samples on a {n_voxels} x {n_voxels} x {n_voxels} grid.'
+    if color is not None and mode == 'volume':
+        info += ' The density volume shows all the samples. Use the density isosurfaces to color by categories.'
+    elif color is not None and codes is None:
+        info += f' The density cannot be colored by {color}. Use the markers render mode.'
+    return {'figure': fig, 'info': info}
+
+
+@app.callback(
+    [Output('container-scatter-3d-store-figure', 'data'),
+     Output('container-scatter-3d-graph-1', 'style'),
+     Output('container-scatter-3d-text', 'children')],
+    Input('container-scatter-3d-card-1-button-update', 'n_clicks'),
+    [State('container-scatter-3d-graph-1', 'style'),
+     State('container-scatter-3d-dropdown-x', 'value'),
+     State('container-scatter-3d-dropdown-y', 'value'),
+     State('container-scatter-3d-dropdown-z', 'value'),
+     State('container-scatter-3d-switch-color', 'on'),
+     State('container-scatter-3d-dropdown-metadata', 'value'),
+     State('container-scatter-3d-dropdown-render', 'value'),
+     State('container-scatter-3d-slider-voxels', 'value'),
+     State('container-scatter-3d-slider-level', 'value'),
+     State('container-scatter-3d-store-dataset', 'data')]
+)
+@profiled('scatter3d')
+def update_scatter3d(n_clicks, style, x_axis, y_axis, z_axis, color_by_cluster, metadata_column, mode, n_voxels, level, dataset_name):
+    color = get_color(color_by_cluster, metadata_column)
+    data = registry.get(dataset_name)
+
+    if mode == 'markers':
+        key = ('scatter3d', dataset_name, data.get_version(color), x_axis, y_axis, z_axis, color)
+        result = figure_cache.get_or_create(
+            key, lambda: create_scatter3d(data, x_axis, y_axis, z_axis, color))
+    else:
+        key = ('density3d', dataset_name, data.get_version(color), x_axis, y_axis, z_axis, color, mode, n_voxels, level)
+        result = figure_cache.get_or_create(
+            key, lambda: create_density3d(data, x_axis, y_axis, z_axis, color, mode, n_voxels, level))
 
     style['display'] = 'block'
 
-    text = get_file_info()
+    text = [html.Div(result['info'], className='mb-2')] + get_file_info(dataset_name)
+
+    return result['figure'], style, text
 
-    return fig, style, text
+
+app.clientside_callback(
+    clientside_apply_style,
+    Output('container-scatter-3d-graph-1', 'figure'),
+    [Input('container-scatter-3d-store-figure', 'data'),
+     Input('container-scatter-3d-store-templates', 'data'),
+     Input('container-scatter-3d-dropdown-theme', 'value'),
+     Input('container-scatter-3d-slider-marker', 'value')]
+)
 
 
-def create_container_scatter_2d():
-    options = get_options()
+def create_container_scatter_2d(dataset_name):
+    data = registry.get(dataset_name)
+    options = data.get_options()
 
     container_scatter_2d = dbc.Container([
-        navvar,
+        create_navvar(dataset_name),
 
         dbc.Row([
             dbc.Col([
@@ -285,8 +625,23 @@ def create_container_scatter_2d():
                         html.H6('Color by cluster:'),
                         daq.BooleanSwitch(
                             id='container-scatter-2d-switch-color',
-                            on=not get_color_switch_disable(),
-                            disabled=get_color_switch_disable()
+                            on=not get_color_switch_disable(data),
+                            disabled=get_color_switch_disable(data)
+                        ),
+                        html.H6('Color by metadata:'),
+                        dcc.Dropdown(
+                            id='container-scatter-2d-dropdown-metadata',
+                            options=get_metadata_options(data),
+                            value=None,
+                            placeholder='Specify the particle metadata of the dataset' if data.metadata_file is None else 'None',
+                            disabled=data.metadata_file is None
+                        ),
+                        html.H6('Render mode:'),
+                        dcc.Dropdown(
+                            id='container-scatter-2d-dropdown-render',
+                            options=render_modes,
+                            value=render_mode,
+                            clearable=False
                         ),
                         dbc.Button(
                             'Update', id='container-scatter-2d-card-1-button-update',
@@ -294,12 +649,13 @@ def create_container_scatter_2d():
                         )
                     ])
                 ], id='container-scatter-2d-card-1', className='mt-3'),
+                create_card_selection(dataset_name),
                 dbc.Card([
                     dbc.CardBody([
                         html.H5('Data statistics', className='card-title'),
                         DataTable(
                             columns=datatable_columns,
-                            data=datatable_data,
+                            data=data.datatable_data,
                             cell_selectable=False
                         )
                     ])
@@ -308,6 +664,11 @@ def create_container_scatter_2d():
 
             dbc.Col([
                 dcc.Graph(id='container-scatter-2d-graph-1', figure={}, style={'height': '70vh', 'display': 'none'}),
+                dcc.Store(id='container-scatter-2d-store-figure'),
+                dcc.Store(id='container-scatter-2d-store-dataset', data=dataset_name),
+                dcc.Store(id='container-scatter-2d-store-axes'),
+                dcc.Store(id='container-scatter-2d-store-selection'),
+                dcc.Store(id='container-scatter-2d-store-templates', data=get_template_data()),
                 dbc.Alert(id='container-scatter-2d-text', color='light')
             ], width={'size': 8}, style={'min-height': '100vh'}),
         ])
@@ -316,53 +677,199 @@ def create_container_scatter_2d():
     return container_scatter_2d
 
 
+def create_card_selection(dataset_name):
+    """Card of the lasso/box selection in the 2D scatter plot, and its export."""
+    dataset = registry.get_dataset(dataset_name)
+    if dataset.metadata_file:
+        export = [
+            html.H6('Output directory:', className='mt-2'),
+            dbc.Input(id='container-scatter-2d-input-outdir', value=export_dir, type='text'),
+            html.H6('Output file rootname:', className='mt-2'),
+            dbc.Input(id='container-scatter-2d-input-rootname', value='selected', type='text'),
+            dbc.Button(
+                'Export', id='container-scatter-2d-button-export',
+                outline=True, color='primary', n_clicks=0, className='mt-2'
+            ),
+            html.Div(id='container-scatter-2d-export-text', className='mt-2')
+        ]
+    else:
+        export = [html.Div('Specify the particle metadata of the dataset to export the selection.', className='mt-2 text-muted')]
+
+    card = dbc.Card([
+        dbc.CardBody([
+            html.H5('Selection', className='card-title'),
+            html.Div('Select samples with the lasso or box select tool of the plot.',
+                     id='container-scatter-2d-selection-text'),
+            *export
+        ])
+    ], id='container-scatter-2d-card-3', className='mt-3')
+
+    return card
+
+
+def get_selection_mask(data, selection):
+    """Resolve a selection of the 2D scatter plot against all the samples (not only the plotted ones)."""
+    x_axis, y_axis = selection['axes']
+    return cryopicls.visualization.selection.resolve_selection(
+        data.df[x_axis].to_numpy(), data.df[y_axis].to_numpy(), selection,
+        y_order=data.get_sorted_order(y_axis))
+
+
+def create_scatter2d(data, x_axis, y_axis, color, mode, ranges):
+    range_x = ranges[0] if ranges is not None and ranges[0] is not None else data.get_range(x_axis)
+    range_y = ranges[1] if ranges is not None and ranges[1] is not None else data.get_range(y_axis)
+
+    if mode == 'raster':
+        fig = create_raster_figure(data, x_axis, y_axis, range_x, range_y, color)
+        info = f'Showing density image of {data.get_lod_index([x_axis, y_axis]).count(ranges)} samples.'
+        if color is not None and get_color_codes(data, color)[0] is None:
+            info += f' The density image cannot be colored by {color}. Use the WebGL or SVG render mode.'
+    else:
+        idxs, n_total = get_lod_samples(data, [x_axis, y_axis], ranges)
+        df, color_column, category_orders = get_color_frame(data, idxs, color)
+        fig = px.scatter(
+            data_frame=df,
+            x=x_axis,
+            y=y_axis,
+            color=color_column,
+            color_discrete_sequence=colorway,
+            category_orders=category_orders,
+            range_x=range_x,
+            range_y=range_y,
+            render_mode=mode
+        )
+        info = get_lod_info(len(idxs), n_total)
+
+    if color == 'cluster':
+        fig.update_layout(
+            legend_title_text='ClusterID'
+        )
+    fig.update_layout(uirevision=f'{x_axis},{y_axis}')
+
+    return {'figure': fig, 'info': info}
+
+
 @app.callback(
-    [Output('container-scatter-2d-graph-1', 'figure'),
+    [Output('container-scatter-2d-store-figure', 'data'),
      Output('container-scatter-2d-graph-1', 'style'),
-     Output('container-scatter-2d-text', 'children')],
-    Input('container-scatter-2d-card-1-button-update', 'n_clicks'),
+     Output('container-scatter-2d-text', 'children'),
+     Output('container-scatter-2d-store-axes', 'data')],
+    [Input('container-scatter-2d-card-1-button-update', 'n_clicks'),
+     Input('container-scatter-2d-graph-1', 'relayoutData')],
     [State('container-scatter-2d-graph-1', 'style'),
      State('container-scatter-2d-dropdown-x', 'value'),
      State('container-scatter-2d-dropdown-y', 'value'),
      State('container-scatter-2d-switch-color', 'on'),
-     State('container-scatter-2d-slider-marker', 'value'),
-     State('container-scatter-2d-dropdown-theme', 'value')],
+     State('container-scatter-2d-dropdown-metadata', 'value'),
+     State('container-scatter-2d-dropdown-render', 'value'),
+     State('container-scatter-2d-store-dataset', 'data')],
 )
-def update_scatter2d(n_clicks, style, x_axis, y_axis, color_by_cluster,
-                     marker_size, theme):
-    color = get_color(color_by_cluster)
+@profiled('scatter2d')
+def update_scatter2d(n_clicks, relayout_data, style, x_axis, y_axis, color_by_cluster, metadata_column, mode, dataset_name):
+    color = get_color(color_by_cluster, metadata_column)
+    data = registry.get(dataset_name)
+
+    ranges = None
+    triggered = [x['prop_id'] for x in dash.callback_context.triggered]
+    if 'container-scatter-2d-graph-1.relayoutData' in triggered:
+        # Zoom or pan. Re-query the visible range at a higher density.
+        ranges = get_relayout_ranges(relayout_data)
+        autoscaled = relayout_data is not None and any(k.endswith('autorange') for k in relayout_data)
+        if ranges is None and not autoscaled:
+            raise PreventUpdate
+
+    mode = get_render_mode(mode, data.get_lod_index([x_axis, y_axis]).count(ranges))
+
+    ranges_key = None if ranges is None else tuple(None if x is None else tuple(x) for x in ranges)
+    key = ('scatter2d', dataset_name, data.get_version(color), x_axis, y_axis, color, mode, ranges_key)
+    result = figure_cache.get_or_create(
+        key, lambda: create_scatter2d(data, x_axis, y_axis, color, mode, ranges))
 
-    fig = px.scatter(
-        data_frame=df,
-        x=x_axis,
-        y=y_axis,
-        color=color,
-        template=theme,
-        range_x=get_range(x_axis),
-        range_y=get_range(y_axis)
-    )
+    style['display'] = 'block'
 
-    fig.update_traces(
-        marker_size=marker_size
-    )
+    text = [html.Div(result['info'], className='mb-2')] + get_file_info(dataset_name)
 
-    if color == 'cluster':
-        fig.update_layout(
-            legend_title_text='ClusterID'
-        )
+    return result['figure'], style, text, [x_axis, y_axis]
 
-    style['display'] = 'block'
 
-    text = get_file_info()
+@app.callback(
+    [Output('container-scatter-2d-store-selection', 'data'),
+     Output('container-scatter-2d-selection-text', 'children')],
+    Input('container-scatter-2d-graph-1', 'selectedData'),
+    [State('container-scatter-2d-store-axes', 'data'),
+     State('container-scatter-2d-store-dataset', 'data')],
+    prevent_initial_call=True
+)
+@profiled('selection')
+def update_selection(selected_data, axes, dataset_name):
+    if not selected_data or not ('range' in selected_data or 'lassoPoints' in selected_data):
+        return None, 'Select samples with the lasso or box select tool of the plot.'
+
+    # Only the geometry is kept, the selected points of selected_data are the plotted subsample.
+    selection = {'axes': axes}
+    if 'lassoPoints' in selected_data:
+        selection['lassoPoints'] = selected_data['lassoPoints']
+    else:
+        selection['range'] = selected_data['range']
+
+    data = registry.get(dataset_name)
+    n_selected = int(get_selection_mask(data, selection).sum())
+    text = f'{n_selected} of {data.df.shape[0]} samples selected.'
+    stride = registry.get_dataset(dataset_name).stride
+    if stride > 1:
+        text += f' Only one in every {stride} samples is loaded (stride).'
+
+    return selection, text
 
-    return fig, style, text
+
+@app.callback(
+    Output('container-scatter-2d-export-text', 'children'),
+    Input('container-scatter-2d-button-export', 'n_clicks'),
+    [State('container-scatter-2d-store-selection', 'data'),
+     State('container-scatter-2d-input-outdir', 'value'),
+     State('container-scatter-2d-input-rootname', 'value'),
+     State('container-scatter-2d-store-dataset', 'data')],
+    prevent_initial_call=True
+)
+@profiled('export_selection')
+def export_selection(n_clicks, selection, outdir, rootname, dataset_name):
+    if selection is None:
+        return 'Nothing is selected.'
+    if not outdir or not rootname:
+        return 'Specify the output directory and the output file rootname.'
+    # The paths come from the browser. Only the files of rootname in --export-dir (or its subdirectories) are written.
+    if os.sep in rootname or (os.altsep and os.altsep in rootname) or '..' in rootname:
+        return f'Invalid output file rootname {rootname}.'
+    root_dir = os.path.realpath(export_dir)
+    outdir = os.path.realpath(os.path.join(root_dir, outdir))
+    if os.path.commonpath([root_dir, outdir]) != root_dir:
+        return f'The output directory must be in the export directory {root_dir}.'
+
+    data = registry.get(dataset_name)
+    # Row labels of the data are the sample indices in the metadata
+    idxs = data.df.index.to_numpy()[get_selection_mask(data, selection)]
+    md = data.get_metadata().iloc(idxs)
+    md.write(outdir, rootname)
+
+    return f'Exported {len(idxs)} particles to {os.path.join(outdir, rootname)}.'
+
+
+app.clientside_callback(
+    clientside_apply_style,
+    Output('container-scatter-2d-graph-1', 'figure'),
+    [Input('container-scatter-2d-store-figure', 'data'),
+     Input('container-scatter-2d-store-templates', 'data'),
+     Input('container-scatter-2d-dropdown-theme', 'value'),
+     Input('container-scatter-2d-slider-marker', 'value')]
+)
 
 
-def create_container_hist_1d():
-    options = get_options()
+def create_container_hist_1d(dataset_name):
+    data = registry.get(dataset_name)
+    options = data.get_options()
 
     container_hist_1d = dbc.Container([
-        navvar,
+        create_navvar(dataset_name),
 
         dbc.Row([
             dbc.Col([
@@ -381,11 +888,22 @@ def create_container_hist_1d():
                             options=templates,
                             value='plotly_white'
                         ),
+                        html.H6('Number of bins:'),
+                        dcc.Slider(
+                            id='container-hist-1d-slider-bins',
+                            min=10, max=200,
+                            step=10,
+                            value=50,
+                            marks={
+                                10: '10',
+                                200: '200'
+                            }
+                        ),
                         html.H6('Color by cluster:'),
                         daq.BooleanSwitch(
                             id='container-hist-1d-switch-color',
-                            on=not get_color_switch_disable(),
-                            disabled=get_color_switch_disable()
+                            on=not get_color_switch_disable(data),
+                            disabled=get_color_switch_disable(data)
                         ),
                         dbc.Button(
                             'Update', id='container-hist-1d-card-1-button-update',
@@ -398,7 +916,7 @@ def create_container_hist_1d():
                         html.H5('Data statistics', className='card-title'),
                         DataTable(
                             columns=datatable_columns,
-                            data=datatable_data,
+                            data=data.datatable_data,
                             cell_selectable=False
                         )
                     ])
@@ -407,6 +925,9 @@ def create_container_hist_1d():
 
             dbc.Col([
                 dcc.Graph(id='container-hist-1d-graph-1', figure={}, style={'height': '70vh', 'display': 'none'}),
+                dcc.Store(id='container-hist-1d-store-figure'),
+                dcc.Store(id='container-hist-1d-store-dataset', data=dataset_name),
+                dcc.Store(id='container-hist-1d-store-templates', data=get_template_data()),
                 dbc.Alert(id='container-hist-1d-text', color='light'),
             ], width={'size': 8}, style={'min-height': '100vh'}),
         ])
@@ -415,62 +936,365 @@ def create_container_hist_1d():
     return container_hist_1d
 
 
+def create_hist1d(data, x_axis, color, n_bins):
+    key = (x_axis, n_bins, color)
+    if key not in data.hist_cache:
+        if color == 'cluster':
+            codes, names = data.get_cluster_codes()
+        else:
+            codes, names = None, [x_axis]
+        edges, counts = cryopicls.visualization.histogram.binned_counts(
+            data.df[x_axis].to_numpy(), n_bins, [data.df_mins[x_axis], data.df_maxs[x_axis]],
+            codes=codes, n_codes=len(names))
+        data.hist_cache[key] = (edges, counts, names)
+    edges, counts, names = data.hist_cache[key]
+
+    show_rug = rug_max_samples > 0
+    if show_rug:
+        fig = make_subplots(rows=2, cols=1, shared_xaxes=True, row_heights=[0.15, 0.85], vertical_spacing=0.02)
+        hist_row = dict(row=2, col=1)
+    else:
+        fig = go.Figure()
+        hist_row = dict()
+
+    centers = (edges[:-1] + edges[1:]) / 2
+    for i, name in enumerate(names):
+        fig.add_trace(go.Bar(
+            x=centers, y=counts[i], width=edges[1] - edges[0], name=name, opacity=0.7,
+            marker_color=colorway[i % len(colorway)], legendgroup=name, showlegend=color == 'cluster'),
+            **hist_row)
+
+    if show_rug:
+        # Rug of a density-preserving subsample, so that it does not grow with the number of samples.
+        idxs = data.get_lod_index([x_axis]).query(max_points=rug_max_samples)
+        values = data.df[x_axis].to_numpy()[idxs]
+        if color == 'cluster':
+            rug_codes = data.get_cluster_codes()[0][idxs]
+        else:
+            rug_codes = np.zeros(len(idxs), dtype=int)
+        for i, name in enumerate(names):
+            rug_values = values[rug_codes == i]
+            fig.add_trace(go.Scatter(
+                x=rug_values, y=[name] * len(rug_values), mode='markers',
+                marker=dict(symbol='line-ns-open', color=colorway[i % len(colorway)]),
+                name=name, legendgroup=name, showlegend=False), row=1, col=1)
+        fig.update_yaxes(showticklabels=False, row=1, col=1)
+
+    fig.update_layout(barmode='overlay', bargap=0, uirevision=x_axis)
+    fig.update_xaxes(range=data.get_range(x_axis))
+    fig.update_xaxes(title_text=x_axis, **hist_row)
+    fig.update_yaxes(title_text='count', **hist_row)
+
+    if color == 'cluster':
+        fig.update_layout(
+            legend_title_text='ClusterID'
+        )
+
+    n_rug = len(idxs) if show_rug else 0
+    if show_rug and n_rug < data.df.shape[0]:
+        info = f'The rug plot shows {n_rug} of {data.df.shape[0]} samples.'
+    else:
+        info = None
+
+    return {'figure': fig, 'info': info}
+
+
 @app.callback(
-    [Output('container-hist-1d-graph-1', 'figure'),
+    [Output('container-hist-1d-store-figure', 'data'),
      Output('container-hist-1d-graph-1', 'style'),
      Output('container-hist-1d-text', 'children')],
     Input('container-hist-1d-card-1-button-update', 'n_clicks'),
     [State('container-hist-1d-graph-1', 'style'), State('container-hist-1d-dropdown-x', 'value'),
      State('container-hist-1d-switch-color', 'on'),
-     State('container-hist-1d-dropdown-theme', 'value')],
+     State('container-hist-1d-slider-bins', 'value'),
+     State('container-hist-1d-store-dataset', 'data')],
 )
-def update_hist1d(n_clicks, style, x_axis, color_by_cluster, theme):
+@profiled('hist1d')
+def update_hist1d(n_clicks, style, x_axis, color_by_cluster, n_bins, dataset_name):
     color = get_color(color_by_cluster)
+    data = registry.get(dataset_name)
 
-    fig = px.histogram(
-        data_frame=df,
+    key = ('hist1d', dataset_name, data.get_version(color), x_axis, color, n_bins)
+    result = figure_cache.get_or_create(key, lambda: create_hist1d(data, x_axis, color, n_bins))
+
+    style['display'] = 'block'
+
+    if result['info'] is not None:
+        text = [html.Div(result['info'], className='mb-2')] + get_file_info(dataset_name)
+    else:
+        text = get_file_info(dataset_name)
+
+    return result['figure'], style, text
+
+
+app.clientside_callback(
+    clientside_apply_style,
+    Output('container-hist-1d-graph-1', 'figure'),
+    [Input('container-hist-1d-store-figure', 'data'),
+     Input('container-hist-1d-store-templates', 'data'),
+     Input('container-hist-1d-dropdown-theme', 'value')]
+)
+
+
+def create_container_dashboard(dataset_name):
+    data = registry.get(dataset_name)
+    options = data.get_options()
+    axes = [x['value'] for x in options[:dashboard_max_dims]]
+
+    if len(options) > dashboard_max_dims:
+        axes_info = html.Div(f'Histograms of the first {dashboard_max_dims} of {len(options)} axes are shown.', className='mt-2 text-muted')
+    else:
+        axes_info = None
+
+    container_dashboard = dbc.Container([
+        create_navvar(dataset_name),
+
+        dbc.Row([
+            dbc.Col([
+                dbc.Card([
+                    dbc.CardBody([
+                        html.H5('Dashboard', className='card-title'),
+                        html.Div('Select a range in a histogram with the box select tool to filter the other plots.', className='mb-2'),
+                        html.H6('X-axis:'),
+                        dcc.Dropdown(
+                            id='container-dashboard-dropdown-x',
+                            options=options,
+                            value=options[0]['value']
+                        ),
+                        html.H6('Y-axis:'),
+                        dcc.Dropdown(
+                            id='container-dashboard-dropdown-y',
+                            options=options,
+                            value=options[1]['value']
+                        ),
+                        html.H6('Color by cluster:'),
+                        daq.BooleanSwitch(
+                            id='container-dashboard-switch-color',
+                            on=not get_color_switch_disable(data),
+                            disabled=get_color_switch_disable(data)
+                        ),
+                        dbc.Button(
+                            'Update', id='container-dashboard-card-1-button-update',
+                            outline=True, color='primary', n_clicks=0, className='mr-2'
+                        ),
+                        dbc.Button(
+                            'Reset filters', id='container-dashboard-button-reset',
+                            outline=True, color='secondary', n_clicks=0
+                        ),
+                        html.Div(id='container-dashboard-filter-text', className='mt-2'),
+                        axes_info
+                    ])
+                ], id='container-dashboard-card-1', className='mt-3'),
+                dbc.Card([
+                    dbc.CardBody([
+                        html.H5('Data statistics', className='card-title'),
+                        DataTable(
+                            columns=datatable_columns,
+                            data=data.datatable_data,
+                            cell_selectable=False
+                        )
+                    ])
+                ], id='container-dashboard-card-2', className='mt-3')
+            ], width={'size': 3}, style={'min-height': '100vh', 'background-color': '#f5f5f5'}),
+
+            dbc.Col([
+                dcc.Graph(id='container-dashboard-graph-scatter', figure={}, style={'height': '50vh'}),
+                dbc.Row([
+                    dbc.Col(
+                        dcc.Graph(id={'type': 'container-dashboard-graph-hist', 'axis': axis}, figure={}, style={'height': '220px'}),
+                        width={'size': 4})
+                    for axis in axes
+                ]),
+                dcc.Store(id='container-dashboard-store-dataset', data=dataset_name),
+                dcc.Store(id='container-dashboard-store-axes', data=axes),
+                dcc.Store(id='container-dashboard-store-filters', data={}),
+                dbc.Alert(id='container-dashboard-text', color='light')
+            ], width={'size': 9}, style={'min-height': '100vh'}),
+        ])
+    ], fluid=True)
+
+    return container_dashboard
+
+
+def get_dashboard_bins(crossfilter, axes, filters):
+    """Filters {axis: [min, max]} of the dashboard as {dimension of crossfilter: range of bins}."""
+    return {axes.index(axis): crossfilter.to_bins(axes.index(axis), value_range) for axis, value_range in filters.items() if axis in axes}
+
+
+def create_dashboard_hist(crossfilter, dim, axis, counts, bins):
+    edges = crossfilter.edges_[dim]
+    centers = (edges[:-1] + edges[1:]) / 2
+    fig = go.Figure()
+    fig.add_trace(go.Bar(x=centers, y=crossfilter.counts_[dim], width=edges[1] - edges[0], name='all', marker_color='lightgray'))
+    fig.add_trace(go.Bar(x=centers, y=counts, width=edges[1] - edges[0], name='filtered', marker_color=colorway[0]))
+    if bins is not None:
+        fig.add_vrect(x0=edges[bins[0]], x1=edges[bins[1]], fillcolor=colorway[0], opacity=0.15, line_width=0)
+    fig.update_layout(
+        template='plotly_white', barmode='overlay', bargap=0, showlegend=False,
+        dragmode='select', selectdirection='h', margin=dict(l=40, r=10, t=10, b=40))
+    fig.update_xaxes(title_text=axis, range=[edges[0], edges[-1]])
+    fig.update_yaxes(fixedrange=True)
+    return fig
+
+
+def create_dashboard(data, axes, x_axis, y_axis, color, filters):
+    crossfilter = data.get_crossfilter(axes)
+    bins = get_dashboard_bins(crossfilter, axes, filters)
+    histograms = crossfilter.histograms(bins)
+    hists = [create_dashboard_hist(crossfilter, dim, axis, histograms[dim], bins.get(dim)) for dim, axis in enumerate(axes)]
+
+    # Density-preserving subsample of the filtered samples. The point budget is scaled up by the filtered fraction,
+    # so that about max_points of the subsample pass the filters.
+    mask = crossfilter.mask(bins)
+    n_filtered = int(mask.sum())
+    if max_points <= 0 or n_filtered <= max_points:
+        idxs = np.flatnonzero(mask)
+    else:
+        index = data.get_lod_index([x_axis, y_axis])
+        idxs = index.query(max_points=min(index.n_samples, max_points * index.n_samples // n_filtered))
+        idxs = idxs[mask[idxs]]
+    scatter = px.scatter(
+        data_frame=data.df.iloc[idxs],
         x=x_axis,
+        y=y_axis,
         color=color,
-        marginal='rug',
-        opacity=0.7,
-        template=theme,
-        barmode='overlay',
-        range_x=get_range(x_axis)
+        color_discrete_sequence=colorway,
+        category_orders=get_category_orders(data, color),
+        range_x=data.get_range(x_axis),
+        range_y=data.get_range(y_axis),
+        template='plotly_white',
+        render_mode='webgl'
     )
-
+    scatter.update_traces(marker_size=3)
     if color == 'cluster':
-        fig.update_layout(
+        scatter.update_layout(
             legend_title_text='ClusterID'
         )
+    scatter.update_layout(uirevision=f'{x_axis},{y_axis}')
 
-    style['display'] = 'block'
+    info = f'{n_filtered} of {data.df.shape[0]} samples pass the filters. ' + get_lod_info(len(idxs), n_filtered)
+    return {'hists': hists, 'scatter': scatter, 'info': info}
 
-    text = get_file_info()
 
-    return fig, style, text
+@app.callback(
+    Output('container-dashboard-store-filters', 'data'),
+    [Input({'type': 'container-dashboard-graph-hist', 'axis': ALL}, 'selectedData'),
+     Input('container-dashboard-button-reset', 'n_clicks')],
+    [State('container-dashboard-store-filters', 'data'),
+     State('container-dashboard-store-axes', 'data'),
+     State('container-dashboard-store-dataset', 'data')],
+    prevent_initial_call=True
+)
+@profiled('dashboard_filters')
+def update_dashboard_filters(selected_data, n_clicks, filters, axes, dataset_name):
+    triggered = dash.callback_context.triggered[0]
+    if triggered['prop_id'] == 'container-dashboard-button-reset.n_clicks':
+        return {}
+
+    # prop_id of a pattern-matching id is '<JSON of the id>.selectedData'
+    axis = json.loads(triggered['prop_id'].rsplit('.', 1)[0])['axis']
+    selection = triggered['value']
+    filters = dict(filters or {})
+    if selection and 'range' in selection:
+        crossfilter = registry.get(dataset_name).get_crossfilter(axes)
+        dim = axes.index(axis)
+        start, stop = crossfilter.to_bins(dim, selection['range']['x'])
+        # Snapped to the bin edges, so that the filter is resolved by the binned aggregates exactly
+        filters[axis] = [float(crossfilter.edges_[dim][start]), float(crossfilter.edges_[dim][stop])]
+    else:
+        filters.pop(axis, None)
+    return filters
 
 
-def array_to_df(Z):
-    col_names = [f'dim_{x}' for x in range(1, Z.shape[1] + 1)]
-    df = pd.DataFrame(data=Z, columns=col_names)
-    return df
+@app.callback(
+    [Output({'type': 'container-dashboard-graph-hist', 'axis': ALL}, 'figure'),
+     Output('container-dashboard-graph-scatter', 'figure'),
+     Output('container-dashboard-text', 'children'),
+     Output('container-dashboard-filter-text', 'children')],
+    [Input('container-dashboard-store-filters', 'data'),
+     Input('container-dashboard-card-1-button-update', 'n_clicks')],
+    [State('container-dashboard-store-axes', 'data'),
+     State('container-dashboard-dropdown-x', 'value'),
+     State('container-dashboard-dropdown-y', 'value'),
+     State('container-dashboard-switch-color', 'on'),
+     State('container-dashboard-store-dataset', 'data')],
+)
+@profiled('dashboard')
+def update_dashboard(filters, n_clicks, axes, x_axis, y_axis, color_by_cluster, dataset_name):
+    color = get_color(color_by_cluster)
+    data = registry.get(dataset_name)
+    filters = filters or {}
 
+    filters_key = tuple(sorted((axis, tuple(value_range)) for axis, value_range in filters.items()))
+    key = ('dashboard', dataset_name, data.get_version(color), tuple(axes), x_axis, y_axis, color, filters_key)
+    result = figure_cache.get_or_create(key, lambda: create_dashboard(data, axes, x_axis, y_axis, color, filters))
 
-def load_latent_variables_cryodrgn(cryodrgn_z_file):
-    Z = cryopicls.data_handling.cryodrgn.load_latent_variables(cryodrgn_z_file)
-    df = array_to_df(Z)
-    return df
+    text = [html.Div(result['info'], className='mb-2')] + get_file_info(dataset_name)
+    if filters:
+        filter_text = [html.Div(f'{axis}: {value_range[0]:.3g} to {value_range[1]:.3g}') for axis, value_range in sorted(filters.items())]
+    else:
+        filter_text = 'No filters.'
 
+    return result['hists'], result['scatter'], text, filter_text
 
-def load_latent_variables_threedva(threedva_csg_file):
-    cs_file, _ = cryopicls.data_handling.cryosparc.get_metafiles_from_csg(
-        threedva_csg_file
-    )
-    Z = cryopicls.data_handling.cryosparc.load_latent_variables(
-        cs_file
-    )
-    df = array_to_df(Z)
-    return df
+
+view_containers = {
+    'scatter3d': create_container_scatter_3d,
+    'scatter2d': create_container_scatter_2d,
+    'hist1d': create_container_hist_1d,
+    'dashboard': create_container_dashboard,
+}
+
+
+@app.callback(
+    Output('page-content', 'children'),
+    Input('url', 'pathname')
+)
+@profiled('page')
+def display_page(pathname):
+    """Route /<dataset>/<view> to the view of the dataset, and / to the list of the datasets."""
+    parts = [urllib.parse.unquote(x) for x in (pathname or '/').split('/') if x]
+    if not parts:
+        datasets = registry.get_datasets()
+        if default_view is not None and len(datasets) == 1:
+            parts = [datasets[0].name, default_view]
+        else:
+            return create_container_index()
+
+    if len(parts) != 2 or parts[0] not in registry or parts[1] not in view_containers:
+        return create_container_message(f'Page not found: {pathname}')
+    dataset_name, view = parts
+
+    data = registry.get(dataset_name)
+    _, label, min_dims = [x for x in views if x[0] == view][0]
+    if data.n_dims < min_dims:
+        return create_container_message(
+            f'Data dimension is {data.n_dims}, which cannot be used for {label} plotting.', dataset_name)
+
+    return view_containers[view](dataset_name)
+
+
+def parse_dataset(values, stride=1, columns=None):
+    """Create a Dataset from the values of a --dataset option, NAME KEY=VALUE [KEY=VALUE ...]."""
+    keys = {
+        'clustering': 'clustering_result_file',
+        'projection': 'projection_result_file',
+        'cryodrgn': 'cryodrgn_z_file',
+        'threedva': 'threedva_csg_file',
+        'metadata': 'metadata_file',
+    }
+    name, items = values[0], values[1:]
+    kwargs = dict(stride=stride, columns=columns)
+    for item in items:
+        key, sep, value = item.partition('=')
+        assert sep and key in list(keys) + ['stride', 'columns'], f'--dataset {name}: Invalid item {item}. Must be KEY=VALUE, where KEY is one of {list(keys)}, stride, columns.'
+        if key == 'stride':
+            kwargs['stride'] = int(value)
+        elif key == 'columns':
+            kwargs['columns'] = value.split(',')
+        else:
+            kwargs[keys[key]] = value
+    return cryopicls.visualization.registry.Dataset(name, **kwargs)
 
 
 def parse_args():
@@ -485,77 +1309,126 @@ def parse_args():
     parser.add_argument('--visualize-cryodrgn', action='store_true', help='Directly visualize cryoDRGN result.')
     parser.add_argument('--visualize-threedva', action='store_true', help='Directly visualize cryoSPARC 3DVA result.')
     parser.add_argument('--cryodrgn-z-file', type=str, help='Required for --visualize-cryodrgn. The pickled file containing the learned latent representation data (default z.pkl).')
+    parser.add_argument('--metadata', type=str, help='Particle metadata file (cryoSPARC .csg or RELION .star) of the samples, used to color the scatter plots by a metadata column (e.g. defocus, micrograph, optics group) and to export particles selected in the 2D scatter plot. Only the chosen column is read from the file. Not required for --visualize-threedva.')
+    parser.add_argument('--export-dir', type=str, default='.', help='Output directory of the particles selected in the 2D scatter plot. The selections are exported to this directory or its subdirectories only (a relative output directory given in the page is in it).')
     parser.add_argument('--threedva-csg-file', type=str, help='Required for --visualize-threedva. The 3D variability job .csg result group file. (e.g. <PJ>_<JOB>_particles.csg')
-    parser.add_argument('--scatter2d', action='store_true', help='2D scatter plot.')
-    parser.add_argument('--scatter3d', action='store_true', help='3D scatter plot.')
-    parser.add_argument('--hist1d', action='store_true', help='1D histogram plot.')
-    parser.add_argument('--stride', type=int, default=1, help='Only use one in every --stride number of samples, to reduce computational load for a large dataset.')
+    parser.add_argument('--dataset', nargs='+', action='append', metavar='NAME KEY=VALUE', help='Add a dataset to serve. Can be given multiple times. NAME is followed by the files of the dataset as KEY=VALUE items. KEY is one of clustering (clustering result file), projection (projection result file), cryodrgn (cryoDRGN z file), threedva (3DVA .csg file), metadata (particle .csg or .star file), stride and columns (comma separated). e.g. --dataset run1 clustering=run1_dataframe.pkl projection=run1_umap.pkl')
+    parser.add_argument('--max-memory', type=int, default=4096, help='Memory cap (MB) of the loaded datasets. Datasets are loaded on first access, and the least recently used ones are unloaded above the cap. 0 disables the cap.')
+    parser.add_argument('--scatter2d', action='store_true', help='Show the 2D scatter plot at the root URL, when a single dataset is served. All the views are available at /<dataset>/scatter2d, /<dataset>/scatter3d, /<dataset>/hist1d and /<dataset>/dashboard.')
+    parser.add_argument('--scatter3d', action='store_true', help='Show the 3D scatter plot at the root URL, when a single dataset is served.')
+    parser.add_argument('--hist1d', action='store_true', help='Show the 1D histogram plot at the root URL, when a single dataset is served.')
+    parser.add_argument('--dashboard', action='store_true', help='Show the dashboard of linked histograms and 2D scatter plot at the root URL, when a single dataset is served. A range selected in a histogram filters the other plots.')
+    parser.add_argument('--stride', type=int, default=1, help='Only use one in every --stride number of samples, to reduce computational load for a large dataset. Default of the datasets given by --dataset.')
+    parser.add_argument('--max-points', type=int, default=100000, help='Maximum number of samples sent to the browser in a scatter plot. A density-preserving subsample, which keeps sparsely populated regions, is shown. Zooming in a 2D scatter plot re-queries the visible range at a higher density. 0 shows all the samples.')
+    parser.add_argument('--render-mode', type=str, default='auto', choices=['auto', 'webgl', 'svg', 'raster'], help='Initial render mode of the 2D scatter plot. webgl: WebGL markers. svg: SVG markers. raster: density image aggregated per pixel on the server, colored by the share of each cluster. auto: raster if more than --raster-threshold samples are in view, else webgl. The 3D scatter plot is rendered by WebGL markers, or as density isosurfaces or volume on a voxel grid (chosen in the page).')
+    parser.add_argument('--raster-threshold', type=int, default=1000000, help='Number of samples in view above which the auto render mode switches to the density image.')
+    parser.add_argument('--rug-max-samples', type=int, default=5000, help='Maximum number of samples shown in the rug plot of the 1D histogram. A density-preserving subsample is shown for a larger dataset. 0 disables the rug plot.')
+    parser.add_argument('--workers', type=int, default=1, help='Number of worker processes. With more than one, the app is served by pre-forked worker processes sharing the port instead of the development server, so that users do not block each other. The workers share the loaded datasets through memory-mapped files in --shared-dir.')
+    parser.add_argument('--shared-dir', type=str, help='Directory of the memory-mapped dataset files shared by the worker processes. A RAM-backed file system (e.g. /dev/shm) is recommended. By default a temporary directory in /dev/shm (if available), removed at exit. Only used with --workers > 1, unless specified.')
+    parser.add_argument('--figure-cache-size', type=int, default=512, help='Maximum size (MB) of the server-side cache of plot figures. Changing the plot theme or the marker size does not need the server at all. 0 disables the cache.')
+    parser.add_argument('--reload-interval', type=float, default=2.0, help='Interval (s) at which the files of the loaded datasets are checked for changes (e.g. cryopicls_clustering rerun into the same output directory). Changed datasets are reloaded in the background, reading only the cluster labels if only they changed, and keeping the indexes and figures which only depend on unchanged coordinates. Press Update to show the new data. 0 disables the reloading.')
+    parser.add_argument('--columns', nargs='+', type=str, help='Only load these columns (axes) of the result file. With a columnar result file (.cpc), the other columns are not read from disk at all. Default of the datasets given by --dataset. By default load all the columns.')
+    cryopicls.args.profiling.add_profiling_arguments(parser, '<--export-dir>/cryopicls_visualizer_metrics.json (<--export-dir>/cryopicls_visualizer_metrics_worker<pid>.json per worker with --workers > 1). The stages are the callbacks of the views, aggregated over all the requests, and the metrics are saved when the app stops')
 
     args = parser.parse_args()
 
-    assert args.scatter2d + args.scatter3d + args.hist1d == 1, 'Must specify either one of --scatter2d, --scatter3d, --hist1d.'
+    assert args.scatter2d + args.scatter3d + args.hist1d + args.dashboard <= 1, 'Can specify only one of --scatter2d, --scatter3d, --hist1d, --dashboard.'
     assert args.stride > 0, '--stride must be a positive integer number.'
+    assert args.max_memory >= 0, '--max-memory must be a non-negative integer number.'
+    assert args.workers > 0, '--workers must be a positive integer number.'
+    assert not (args.workers > 1 and args.debug), '--debug cannot be used with --workers > 1.'
+    assert (not args.visualize_cryodrgn) or args.cryodrgn_z_file, '--visualize-cryodrgn requires --cryodrgn-z-file.'
+    assert (not args.visualize_threedva) or args.threedva_csg_file, '--visualize-threedva requires --threedva-csg-file.'
+    assert args.figure_cache_size >= 0, '--figure-cache-size must be a non-negative integer number.'
+    assert args.reload_interval >= 0, '--reload-interval must be a non-negative number.'
+    cryopicls.args.profiling.check_profiling_args(args)
 
     return args
 
 
 def main():
-    global df, datatable_data, df_mins, df_maxs, clustering_result_file, projection_result_file, cryodrgn_result_file, threedva_result_file
+    global registry, default_view, export_dir, max_points, render_mode, raster_threshold, rug_max_samples, figure_cache, metrics
 
     args = parse_args()
-
-    df_clustering = pd.DataFrame()
-    df_projection = pd.DataFrame()
-
-    if args.clustering_result:
-        assert os.path.exists(args.clustering_result), f'--clustering-result {args.clustering_result} : File not found.'
-        df_clustering = pd.read_pickle(args.clustering_result)
-        clustering_result_file = args.clustering_result
-
-    if args.projection_result:
-        assert os.path.exists(args.projection_result), f'--projection-result {args.projection_result} : File not found.'
-        df_projection = pd.read_pickle(args.projection_result)
-        projection_result_file = args.projection_result
-
-    if (not df_clustering.empty) and (not df_projection.empty):
-        assert df_clustering.shape[0] == df_projection.shape[0], f'Mismatch in the nubmer of samples. clustering: {df_clustering.shape[0]}, projection: {df_projection.shape[0]}'
-        # Assign cluster labels to projections, and use them for plotting.
-        df = df_projection.join(df_clustering['cluster'])
-    elif not df_clustering.empty:
-        df = df_clustering
-    elif not df_projection.empty:
-        df = df_projection
+    metrics = cryopicls.profiling.PipelineMetrics.from_args(
+        args, 'cryopicls_visualizer', os.path.join(args.export_dir, 'cryopicls_visualizer_metrics.json'))
+    max_points = args.max_points
+    export_dir = args.export_dir
+    render_mode = args.render_mode
+    raster_threshold = args.raster_threshold
+    rug_max_samples = args.rug_max_samples
+    figure_cache = cryopicls.visualization.figure_cache.FigureCache(max_bytes=args.figure_cache_size * 1024 ** 2)
+    shared_dir = args.shared_dir
+    if shared_dir:
+        os.makedirs(shared_dir, exist_ok=True)
+    elif args.workers > 1:
+        shared_dir = tempfile.mkdtemp(prefix='cryopicls_visualizer_', dir='/dev/shm' if os.path.isdir('/dev/shm') else None)
+    registry = cryopicls.visualization.registry.DatasetRegistry(
+        max_bytes=args.max_memory * 1024 ** 2 if args.max_memory > 0 else None, shared_dir=shared_dir)
+
+    # The dataset given by the single-dataset options
+    kwargs = dict()
+    if args.clustering_result or args.projection_result:
+        kwargs = dict(clustering_result_file=args.clustering_result, projection_result_file=args.projection_result)
     elif args.visualize_cryodrgn:
-        df = load_latent_variables_cryodrgn(args.cryodrgn_z_file)
-        cryodrgn_result_file = args.cryodrgn_z_file
+        kwargs = dict(cryodrgn_z_file=args.cryodrgn_z_file)
     elif args.visualize_threedva:
-        df = load_latent_variables_threedva(args.threedva_csg_file)
-        threedva_result_file = args.threedva_csg_file
-
-    datatable_data = create_datatable_data(df)
-
-    if args.stride > 1:
-        df = df[::args.stride]
+        kwargs = dict(threedva_csg_file=args.threedva_csg_file)
+    if kwargs:
+        name = os.path.splitext(os.path.basename([x for x in kwargs.values() if x][0]))[0]
+        registry.register(cryopicls.visualization.registry.Dataset(
+            name, stride=args.stride, columns=args.columns, metadata_file=args.metadata, **kwargs))
 
-    if 'cluster' in df.columns:
-        df.sort_values(by='cluster', axis=0, inplace=True)
-        df['cluster'] = df['cluster'].apply(lambda x: f'cluster_{x}')
+    with metrics.stage('register'):
+        for values in args.dataset or []:
+            registry.register(parse_dataset(values, stride=args.stride, columns=args.columns))
 
-    df_mins = df.min()
-    df_maxs = df.max()
-
-    n_samples, n_dims = df.drop('cluster', axis=1, errors='ignore').shape
+    assert len(registry) > 0, 'No dataset to visualize. Specify --dataset, or --clustering-result and/or --projection-result, or --visualize-cryodrgn, or --visualize-threedva.'
 
     if args.scatter3d:
-        assert n_dims >= 3, f'Data dimension is {n_dims}, which cannot be used for 3D scatter plotting.'
-        app.layout = create_container_scatter_3d()
+        default_view = 'scatter3d'
     elif args.scatter2d:
-        assert n_dims >= 2, f'Data dimension is {n_dims}, which cannot be used for 2D scatter plotting.'
-        app.layout = create_container_scatter_2d()
+        default_view = 'scatter2d'
     elif args.hist1d:
-        app.layout = create_container_hist_1d()
-
-    app.run_server(host="0.0.0.0", debug=args.debug, port=args.port)
+        default_view = 'hist1d'
+    elif args.dashboard:
+        default_view = 'dashboard'
+
+    metrics.set_inputs(n_datasets=len(registry))
+
+    def report_metrics():
+        metrics.status = 'stopped'
+        metrics.set_info(figure_cache=dict(hits=figure_cache.hits, misses=figure_cache.misses, n_bytes=figure_cache.n_bytes))
+        metrics.report()
+
+    def stop_worker(signum, frame):
+        report_metrics()
+        os._exit(0)
+
+    def start_watcher():
+        if args.reload_interval > 0:
+            registry.watch(interval=args.reload_interval)
+
+    def start_worker():
+        if metrics.enabled:
+            # The metrics of each worker are saved to its own file when it is stopped
+            metrics.outfile = f'{os.path.splitext(metrics.outfile)[0]}_worker{os.getpid()}.json'
+            signal.signal(signal.SIGTERM, stop_worker)
+        start_watcher()
+
+    if args.workers > 1:
+        try:
+            # Each worker watches the files, and the first one to reload a dataset writes its shared file
+            cryopicls.visualization.serving.serve_workers(app.server, '0.0.0.0', args.port, args.workers, on_worker_start=start_worker)
+        finally:
+            if not args.shared_dir:
+                shutil.rmtree(shared_dir, ignore_errors=True)
+    else:
+        start_watcher()
+        try:
+            app.run_server(host="0.0.0.0", debug=args.debug, port=args.port)
+        finally:
+            report_metrics()
 
 
 if __name__ == "__main__":
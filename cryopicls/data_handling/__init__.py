@@ -1,3 +1,9 @@
-from . import cryodrgn
-from . import cryosparc
-from . import relion
+from .. import lazy
+
+__getattr__, __dir__ = lazy.attach(__name__, [
+    'cryodrgn',
+    'cryosparc',
+    'relion',
+    'columnar',
+    'synthetic',
+])
@@ -0,0 +1,229 @@
+"""Columnar, memory-mappable storage of cryoPICLS results.
+
+An alternative to the pickled pandas.DataFrame files written by cryopicls_clustering and cryopicls_projector.
+Each column is stored as one contiguous little-endian array, so that a reader can memory-map the file and
+touch only the columns it needs.
+
+File layout::
+
+    magic          8 bytes    b'CPLSCOL1'
+    header size    8 bytes    little-endian uint64
+    header         UTF-8 JSON, padded with spaces to a multiple of ALIGNMENT bytes
+    column data    one array per column, each starting at a multiple of ALIGNMENT bytes
+
+The JSON header holds the number of rows, and the name, dtype and offset (relative to the start of the
+column data) of each column, plus free-form attributes.
+Coordinates are stored as float32 and cluster labels as int16.
+"""
+
+import os
+import json
+import struct
+
+import numpy as np
+import pandas as pd
+
+
+MAGIC = b'CPLSCOL1'
+FORMAT_VERSION = 1
+ALIGNMENT = 64
+EXTENSION = '.cpc'
+COORDINATE_DTYPE = np.dtype('<f4')
+LABEL_DTYPE = np.dtype('<i2')
+LABEL_COLUMNS = ('cluster',)
+
+
+def is_columnar_file(filename):
+    """Return True if filename has the columnar result file extension."""
+    return os.path.splitext(filename)[1] == EXTENSION
+
+
+def _padded_size(size):
+    return (size + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def _column_dtype(name, values):
+    if name in LABEL_COLUMNS:
+        info = np.iinfo(LABEL_DTYPE)
+        if values.size > 0:
+            assert info.min <= values.min() and values.max() <= info.max, \
+                f'Column {name} does not fit in {LABEL_DTYPE.name}.'
+        return LABEL_DTYPE
+    elif np.issubdtype(values.dtype, np.floating):
+        return COORDINATE_DTYPE
+    else:
+        assert np.issubdtype(values.dtype, np.integer) or np.issubdtype(values.dtype, np.bool_), \
+            f'Column {name} has non-numeric dtype {values.dtype}, which cannot be stored.'
+        return values.dtype.newbyteorder('<')
+
+
+def save_columnar(outfile, df, attrs=None):
+    """Save a DataFrame as a columnar result file.
+
+    Parameters
+    ----------
+    outfile : string
+        Output file name. (Typically with the .cpc extension)
+
+    df : pandas.DataFrame
+        DataFrame with numeric columns. Floating point columns are stored as float32, and label columns (cluster) as int16.
+
+    attrs : dict, optional
+        JSON serializable attributes stored in the header. By default None.
+    """
+
+    arrays = []
+    columns = []
+    offset = 0
+    for name in df.columns:
+        values = np.asarray(df[name])
+        dtype = _column_dtype(name, values)
+        arr = np.ascontiguousarray(values, dtype=dtype)
+        arrays.append(arr)
+        columns.append({'name': str(name), 'dtype': dtype.str, 'offset': offset})
+        offset += _padded_size(arr.nbytes)
+
+    header = {
+        'version': FORMAT_VERSION,
+        'n_rows': int(df.shape[0]),
+        'columns': columns,
+        'attrs': attrs if attrs is not None else {},
+    }
+    header_bytes = json.dumps(header).encode('utf-8')
+    # Pad so that the column data starts at an aligned position of the file
+    header_size = _padded_size(len(MAGIC) + 8 + len(header_bytes)) - len(MAGIC) - 8
+    header_bytes = header_bytes.ljust(header_size, b' ')
+
+    with open(outfile, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<Q', header_size))
+        f.write(header_bytes)
+        for arr in arrays:
+            f.write(arr.tobytes())
+            f.write(b'\0' * (_padded_size(arr.nbytes) - arr.nbytes))
+
+
+def _read_header(f, infile):
+    magic = f.read(len(MAGIC))
+    assert magic == MAGIC, f'{infile} is not a cryoPICLS columnar result file.'
+    header_size, = struct.unpack('<Q', f.read(8))
+    header = json.loads(f.read(header_size).decode('utf-8'))
+    assert header['version'] <= FORMAT_VERSION, \
+        f'{infile} has format version {header["version"]}, which is newer than supported ({FORMAT_VERSION}).'
+    header['data_offset'] = len(MAGIC) + 8 + header_size
+    return header
+
+
+def read_header(infile):
+    """Read the JSON header of a columnar result file.
+
+    Parameters
+    ----------
+    infile : string
+        Columnar result file.
+
+    Returns
+    -------
+    dict
+        Header containing 'n_rows', 'columns' (list of dicts with 'name', 'dtype' and 'offset') and 'attrs'.
+    """
+
+    assert os.path.exists(infile), f'{infile} not found.'
+    with open(infile, 'rb') as f:
+        header = _read_header(f, infile)
+    return header
+
+
+def get_column_names(infile):
+    """Return the column names stored in a columnar result file."""
+    return [column['name'] for column in read_header(infile)['columns']]
+
+
+def load_columns(infile, columns=None, mmap=True):
+    """Load columns of a columnar result file as numpy arrays.
+
+    Parameters
+    ----------
+    infile : string
+        Columnar result file.
+
+    columns : list of strings, optional
+        Columns to load. By default (None) load all the columns.
+
+    mmap : bool, optional
+        Return read-only memory-mapped arrays instead of reading the data into memory. By default True.
+
+    Returns
+    -------
+    dict
+        Column name to ndarray of shape (n_rows, ), in the order of columns.
+    """
+
+    header = read_header(infile)
+    n_rows = header['n_rows']
+    column_info = {column['name']: column for column in header['columns']}
+    if columns is None:
+        columns = list(column_info.keys())
+    for name in columns:
+        assert name in column_info, f'Column {name} not found in {infile}. Available: {list(column_info.keys())}'
+
+    arrays = dict()
+    with open(infile, 'rb') as f:
+        for name in columns:
+            dtype = np.dtype(column_info[name]['dtype'])
+            offset = header['data_offset'] + column_info[name]['offset']
+            if n_rows == 0:
+                arrays[name] = np.empty(0, dtype=dtype)
+            elif mmap:
+                arrays[name] = np.memmap(f, dtype=dtype, mode='r', offset=offset, shape=(n_rows, ))
+            else:
+                f.seek(offset)
+                arrays[name] = np.fromfile(f, dtype=dtype, count=n_rows)
+    return arrays
+
+
+def load_columnar(infile, columns=None, mmap=True):
+    """Load a columnar result file as a DataFrame.
+
+    Parameters
+    ----------
+    infile : string
+        Columnar result file.
+
+    columns : list of strings, optional
+        Columns to load. By default (None) load all the columns.
+
+    mmap : bool, optional
+        Read the selected columns through a memory map. By default True.
+
+    Returns
+    -------
+    pandas.DataFrame
+        DataFrame containing the selected columns.
+    """
+
+    arrays = load_columns(infile, columns=columns, mmap=mmap)
+    return pd.DataFrame({name: np.asarray(arr) for name, arr in arrays.items()})
+
+
+def load_latent_variables(infile):
+    """Load latent variables from a columnar result file.
+
+    All the non-label columns are regarded as latent dimensions.
+
+    Parameters
+    ----------
+    infile : string
+        Columnar result file (e.g. a clustering result saved with --output-format columnar).
+
+    Returns
+    -------
+    ndarray
+        Array containing the latent variables. shape=(num_samples, num_variables)
+    """
+
+    columns = [x for x in get_column_names(infile) if x not in LABEL_COLUMNS]
+    assert len(columns) > 0, f'No latent variable columns in {infile}'
+    arrays = load_columns(infile, columns=columns, mmap=False)
+    Z = np.vstack([arrays[x] for x in columns]).T
+    return Z
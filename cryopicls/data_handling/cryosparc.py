@@ -8,8 +8,8 @@ import yaml
 import numpy as np
 
 
-def load_cs(cs_file):
-    return np.load(cs_file)
+def load_cs(cs_file, mmap_mode=None):
+    return np.load(cs_file, mmap_mode=mmap_mode)
 
 
 def save_cs(cs_file, cs):
@@ -60,6 +60,64 @@ def get_metafiles_from_csg(csg_file):
     return cs_file, passthrough_file
 
 
+def get_field_names(cs):
+    """Names of the scalar columns of a .cs array. Elements of array fields are named like 'alignments3D/shift[0]'."""
+    names = []
+    for name in cs.dtype.names:
+        shape = cs.dtype.fields[name][0].shape
+        if len(shape) == 0:
+            names.append(name)
+        elif len(shape) == 1:
+            names += [f'{name}[{i}]' for i in range(shape[0])]
+    return names
+
+
+def get_csg_columns(csg_file):
+    """Names of the scalar columns of the .cs files of a .csg file (see get_field_names()), without loading the files."""
+    columns = []
+    for metafile in get_metafiles_from_csg(csg_file):
+        if metafile is not None:
+            columns += [x for x in get_field_names(load_cs(metafile, mmap_mode='r')) if x not in columns]
+    return columns
+
+
+def read_csg_column(csg_file, column):
+    """Read a single column of the .cs files of a .csg file.
+
+    The .cs file is memory-mapped, thus only the pages of the column which are accessed are read from the disk.
+
+    Parameters
+    ----------
+    csg_file : string
+        Particle group .csg file.
+
+    column : string
+        Column name (see get_csg_columns()).
+
+    Returns
+    -------
+    ndarray
+        Read-only memory-mapped values of the column. shape=(num_particles, )
+
+    Raises
+    ------
+    KeyError
+        If the column is not in the .cs files.
+    """
+
+    name, _, element = column.partition('[')
+    for metafile in get_metafiles_from_csg(csg_file):
+        if metafile is None:
+            continue
+        cs = load_cs(metafile, mmap_mode='r')
+        if name in cs.dtype.names:
+            values = cs[name]
+            if element:
+                values = values[:, int(element.rstrip(']'))]
+            return values
+    raise KeyError(f'Column {column} not found in {csg_file}')
+
+
 def find_cryosparc_files(dir):
     """Find required cryoSPARC files from a job directory
 
@@ -129,7 +187,8 @@ def load_latent_variables(infile, num_components=-1):
             break
     assert num_components <= components_mode
     Z = np.vstack(Z).T
-    Z = Z[:, :num_components]
+    if num_components > 0:
+        Z = Z[:, :num_components]
     return Z
 
 
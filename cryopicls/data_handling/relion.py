@@ -161,6 +161,78 @@ class RelionMetaData:
         assert len(headers) == body.shape[1]
         return headers, body
 
+    @classmethod
+    def _find_particle_block(cls, starfile):
+        """Find the particle data block (data_particles in RELION 3.1, data_ in RELION 2.x/3.0) of a star file.
+
+        Parameters
+        ----------
+        starfile : string
+            star file
+
+        Returns
+        -------
+        headers : list of strings
+            Metadata labels
+
+        offset : int
+            Byte offset of the first line of the data block body.
+        """
+
+        with open(starfile, 'rb') as f:
+            in_block = False
+            headers = []
+            while True:
+                offset = f.tell()
+                line = f.readline()
+                if not line:
+                    break
+                words = line.strip().split()
+                if not in_block:
+                    in_block = len(words) > 0 and words[0] in (b'data_particles', b'data_')
+                elif line.startswith(b'_'):
+                    headers.append(words[0].decode())
+                elif headers and len(words) > 0:
+                    return headers, offset
+        assert len(headers) > 0, f'Particle data block not found in {starfile}'
+        return headers, offset
+
+    @classmethod
+    def read_labels(cls, starfile):
+        """Metadata labels of the particle data block of a star file, without reading the data block body."""
+        headers, _ = cls._find_particle_block(starfile)
+        return headers
+
+    @classmethod
+    def read_column(cls, starfile, label):
+        """Read a single column of the particle data block of a star file, without loading the whole table.
+
+        Parameters
+        ----------
+        starfile : string
+            star file
+
+        label : string
+            Metadata label of the column (e.g. _rlnDefocusU)
+
+        Returns
+        -------
+        ndarray
+            Values of the column. Numerical columns are parsed as numbers. shape=(num_particles, )
+        """
+
+        headers, offset = cls._find_particle_block(starfile)
+        assert label in headers, f'{label} not found in {starfile}'
+        with open(starfile, 'rb') as f:
+            f.seek(offset)
+            # Only the column is parsed. Blank lines are kept as missing values, as the data block ends at the first one.
+            df = pd.read_csv(f, sep=r'\s+', header=None, usecols=[headers.index(label)], skip_blank_lines=False)
+        values = df.iloc[:, 0]
+        missing = values.isna().to_numpy()
+        if missing.any():
+            values = values.iloc[:np.argmax(missing)]
+        return values.to_numpy()
+
     def write(self, outdir, outfile_rootname):
         """Save metadata in file
 
@@ -203,8 +275,11 @@ class RelionMetaData:
         f.write('loop_\n')
         f.write('\n'.join(df.columns))
         f.write('\n')
-        for i in df.index:
-            f.write(' '.join(df.loc[i]))
+        if df.shape[0] > 0:
+            # Join the columns of all the rows at once, instead of row by row
+            lines = df.iloc[:, 0].astype(str).str.cat(
+                [df.iloc[:, i].astype(str) for i in range(1, df.shape[1])], sep=' ')
+            f.write('\n'.join(lines))
             f.write('\n')
         f.write('\n')
 
@@ -0,0 +1,562 @@
+"""Synthetic particle datasets, for testing and benchmarking at realistic sizes without real data.
+
+The generated files have the structure and the column sets of real files: RELION 3.0 and 3.1 particle star files,
+cryoSPARC particle .cs + passthrough .cs + .csg result groups (of a refinement, or of a 3D variability job with
+components_mode_N/value columns), and cryoDRGN z files. The latent variables are gaussian blobs.
+
+All the files of a dataset describe the same particles (micrographs, coordinates, CTF, poses), and the same seed
+always generates the same dataset.
+
+Example::
+
+    python -m cryopicls.data_handling.synthetic --n-particles 1000000 --output-dir synthetic
+"""
+
+import os
+import pickle
+import argparse
+
+import numpy as np
+import pandas as pd
+
+import cryopicls
+
+
+supported_formats = ('relion30', 'relion31', 'cryosparc', 'threedva', 'cryodrgn')
+
+# Acquisition parameters shared by all the particles
+voltage_kv = 300.0
+cs_mm = 2.7
+amp_contrast = 0.1
+pixel_size_A = 1.0
+box_size = 256
+micrograph_shape = (4096, 4096)
+
+
+def make_latent(n_particles, n_dims=8, n_clusters=5, spread=3.0, seed=0):
+    """Latent variables of gaussian blobs.
+
+    Parameters
+    ----------
+    n_particles : int
+        Number of particles.
+
+    n_dims : int, optional
+        Number of latent dimensions. By default 8.
+
+    n_clusters : int, optional
+        Number of blobs. By default 5.
+
+    spread : float, optional
+        Standard deviation of the blob centers. The blobs have unit standard deviation. By default 3.0.
+
+    seed : int, optional
+        Random seed. By default 0.
+
+    Returns
+    -------
+    Z : ndarray
+        Latent variables. shape=(n_particles, n_dims), dtype=float32
+
+    labels : ndarray
+        True cluster labels. shape=(n_particles, )
+    """
+
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(0, spread, size=(n_clusters, n_dims))
+    labels = rng.integers(0, n_clusters, size=n_particles)
+    Z = (centers[labels] + rng.normal(0, 1, size=(n_particles, n_dims))).astype(np.float32)
+    return Z, labels
+
+
+def _random_rotations(rng, n):
+    """Uniformly distributed random rotations, as unit quaternions (w, x, y, z)."""
+    q = rng.normal(size=(n, 4))
+    q /= np.linalg.norm(q, axis=1, keepdims=True)
+    # w >= 0, so that the rotation angle is within [0, pi]
+    q *= np.where(q[:, :1] < 0, -1, 1)
+    return q
+
+
+def _quaternion_to_euler_zyz(q):
+    """RELION (ZYZ) Euler angles rot, tilt and psi (degrees) of rotations given as unit quaternions."""
+    w, x, y, z = q.T
+    # Elements of the rotation matrix needed for ZYZ angles
+    r22 = 1 - 2 * (x ** 2 + y ** 2)
+    r20 = 2 * (x * z - w * y)
+    r21 = 2 * (y * z + w * x)
+    r02 = 2 * (x * z + w * y)
+    r12 = 2 * (y * z - w * x)
+    tilt = np.arccos(np.clip(r22, -1, 1))
+    rot = np.arctan2(r21, r20)
+    psi = np.arctan2(r12, -r02)
+    return np.rad2deg(rot), np.rad2deg(tilt), np.rad2deg(psi)
+
+
+def _quaternion_to_rotvec(q):
+    """cryoSPARC poses (rotation vectors, radians) of rotations given as unit quaternions.
+
+    A cryoSPARC pose is the inverse of the rotation of the RELION Euler angles of the same particle (as converted by pyem),
+    so this is the rotation vector of the conjugate of q, and matches _quaternion_to_euler_zyz(q).
+    """
+    w = np.clip(q[:, 0], -1, 1)
+    angle = 2 * np.arccos(w)
+    sin_half = np.sqrt(np.maximum(1 - w ** 2, 0))
+    scale = np.where(sin_half > 1e-8, angle / np.maximum(sin_half, 1e-8), 2)
+    return -q[:, 1:] * scale[:, None]
+
+
+def make_particles(n_particles, particles_per_micrograph=200, n_optics_groups=1, seed=0):
+    """Per-particle acquisition and alignment parameters, shared by the metadata of all the formats.
+
+    Parameters
+    ----------
+    n_particles : int
+        Number of particles.
+
+    particles_per_micrograph : int, optional
+        Number of particles picked in each micrograph. By default 200.
+
+    n_optics_groups : int, optional
+        Number of optics groups (exposure groups), assigned to the micrographs in turn. By default 1.
+
+    seed : int, optional
+        Random seed. By default 0.
+
+    Returns
+    -------
+    dict
+        Arrays of shape (n_particles, ...): uid, micrograph (index), micrograph_uid, micrograph_path (bytes),
+        idx (index in the micrograph), coordinate_x, coordinate_y (pixels), defocus_u, defocus_v (A), defocus_angle (degrees),
+        quaternion (n_particles, 4), shift_x, shift_y (A), optics_group (1, 2, ...), random_subset (1 or 2), class_number (1, 2, ...),
+        ncc_score and power. Also n_micrographs (int), and micrograph_names (list of the names of the n_micrographs movies).
+    """
+
+    rng = np.random.default_rng(seed)
+    n_micrographs = max(1, -(-n_particles // particles_per_micrograph))
+    micrograph = np.arange(n_particles) // particles_per_micrograph
+    micrograph_uids = rng.integers(0, 2 ** 63, size=n_micrographs, dtype=np.uint64)
+    micrograph_names = [
+        f'{uid}_FoilHole_{10000000 + i}_Data_{20000000 + i}_Fractions_patch_aligned_doseweighted'
+        for i, uid in enumerate(micrograph_uids)]
+    micrograph_paths = np.array([f'J2/motioncorrected/{x}.mrc' for x in micrograph_names], dtype=bytes)
+    # Defocus varies between micrographs, and a little within a micrograph
+    defocus = rng.uniform(5000, 30000, size=n_micrographs)[micrograph] + rng.normal(0, 50, size=n_particles)
+    astigmatism = np.abs(rng.normal(0, 300, size=n_micrographs))[micrograph]
+
+    return dict(
+        n_micrographs=n_micrographs,
+        micrograph_names=micrograph_names,
+        uid=rng.integers(0, 2 ** 63, size=n_particles, dtype=np.uint64),
+        micrograph=micrograph,
+        micrograph_uid=micrograph_uids[micrograph],
+        micrograph_path=micrograph_paths[micrograph],
+        idx=np.arange(n_particles) % particles_per_micrograph,
+        coordinate_x=rng.uniform(box_size / 2, micrograph_shape[1] - box_size / 2, size=n_particles).round(),
+        coordinate_y=rng.uniform(box_size / 2, micrograph_shape[0] - box_size / 2, size=n_particles).round(),
+        defocus_u=defocus + astigmatism / 2,
+        defocus_v=defocus - astigmatism / 2,
+        defocus_angle=rng.uniform(-180, 180, size=n_micrographs)[micrograph],
+        quaternion=_random_rotations(rng, n_particles),
+        shift_x=rng.normal(0, 3, size=n_particles),
+        shift_y=rng.normal(0, 3, size=n_particles),
+        optics_group=micrograph % n_optics_groups + 1,
+        random_subset=rng.integers(1, 3, size=n_particles),
+        class_number=np.ones(n_particles, dtype=int),
+        ncc_score=rng.uniform(0.2, 0.6, size=n_particles),
+        power=rng.uniform(5e4, 2e5, size=n_particles),
+    )
+
+
+def _per_micrograph(particles, values):
+    """Values given per micrograph (e.g. file paths) for each particle.
+
+    Strings are built per micrograph and then indexed, as string operations on millions of particles are slow.
+    """
+    return np.array(values, dtype=object)[particles['micrograph']]
+
+
+def make_relion_metadata(particles, relion31=True, latent=None):
+    """RELION particle metadata, as written by a 3D refinement.
+
+    Parameters
+    ----------
+    particles : dict
+        Particle parameters (see make_particles()).
+
+    relion31 : bool, optional
+        RELION 3.1 style (data_optics and data_particles blocks, shifts in A) if True,
+        RELION 3.0 style (a single data_ block, optics per particle, shifts in pixels) if False. By default True.
+
+    latent : ndarray, optional
+        Latent variables to append as columns _cryopiclsLatent1, _cryopiclsLatent2, ... By default None.
+
+    Returns
+    -------
+    cryopicls.data_handling.relion.RelionMetaData
+        The metadata. Real numbers are rounded to 6 decimals, as written by RELION.
+    """
+
+    n_particles = len(particles['uid'])
+    rot, tilt, psi = _quaternion_to_euler_zyz(particles['quaternion'])
+
+    def fmt(values):
+        return np.round(values, 6)
+
+    # <index in the stack, from 1>@<stack of the micrograph>
+    prefixes = np.array([f'{i + 1:06d}@' for i in range(particles['idx'].max() + 1)], dtype=object)
+    image_names = prefixes[particles['idx']] + _per_micrograph(particles, [f'Extract/job007/Movies/{x}.mrcs' for x in particles['micrograph_names']])
+    micrograph_names = _per_micrograph(particles, [f'MotionCorr/job002/Movies/{x}.mrc' for x in particles['micrograph_names']])
+
+    columns = {
+        '_rlnCoordinateX': fmt(particles['coordinate_x']),
+        '_rlnCoordinateY': fmt(particles['coordinate_y']),
+        '_rlnClassNumber': particles['class_number'],
+        '_rlnAutopickFigureOfMerit': fmt(particles['ncc_score']),
+        '_rlnImageName': image_names,
+        '_rlnMicrographName': micrograph_names,
+    }
+    if relion31:
+        columns['_rlnOpticsGroup'] = particles['optics_group']
+    else:
+        columns.update({
+            '_rlnVoltage': fmt(np.full(n_particles, voltage_kv)),
+            '_rlnSphericalAberration': fmt(np.full(n_particles, cs_mm)),
+            '_rlnAmplitudeContrast': fmt(np.full(n_particles, amp_contrast)),
+            '_rlnMagnification': fmt(np.full(n_particles, 10000.0)),
+            '_rlnDetectorPixelSize': fmt(np.full(n_particles, pixel_size_A)),
+        })
+    columns.update({
+        '_rlnCtfMaxResolution': fmt(np.full(n_particles, 4.0)),
+        '_rlnCtfFigureOfMerit': fmt(np.full(n_particles, 0.15)),
+        '_rlnDefocusU': fmt(particles['defocus_u']),
+        '_rlnDefocusV': fmt(particles['defocus_v']),
+        '_rlnDefocusAngle': fmt(particles['defocus_angle']),
+        '_rlnCtfBfactor': fmt(np.zeros(n_particles)),
+        '_rlnCtfScalefactor': fmt(np.ones(n_particles)),
+        '_rlnPhaseShift': fmt(np.zeros(n_particles)),
+        '_rlnGroupNumber': particles['micrograph'] % 100 + 1,
+        '_rlnAngleRot': fmt(rot),
+        '_rlnAngleTilt': fmt(tilt),
+        '_rlnAnglePsi': fmt(psi),
+    })
+    if relion31:
+        columns['_rlnOriginXAngst'] = fmt(particles['shift_x'])
+        columns['_rlnOriginYAngst'] = fmt(particles['shift_y'])
+    else:
+        columns['_rlnOriginX'] = fmt(particles['shift_x'] / pixel_size_A)
+        columns['_rlnOriginY'] = fmt(particles['shift_y'] / pixel_size_A)
+    columns.update({
+        '_rlnNormCorrection': fmt(np.ones(n_particles)),
+        '_rlnLogLikeliContribution': fmt(np.full(n_particles, 1e5)),
+        '_rlnMaxValueProbDistribution': fmt(np.full(n_particles, 0.5)),
+        '_rlnNrOfSignificantSamples': np.ones(n_particles, dtype=int),
+        '_rlnRandomSubset': particles['random_subset'],
+    })
+    if latent is not None:
+        for i in range(latent.shape[1]):
+            columns[f'_cryopiclsLatent{i + 1}'] = fmt(latent[:, i])
+    df_particles = pd.DataFrame(columns)
+
+    df_optics = None
+    if relion31:
+        n_optics_groups = int(particles['optics_group'].max())
+        groups = np.arange(1, n_optics_groups + 1)
+        df_optics = pd.DataFrame({
+            '_rlnOpticsGroupName': [f'opticsGroup{x}' for x in groups],
+            '_rlnOpticsGroup': groups,
+            '_rlnMicrographOriginalPixelSize': fmt(np.full(n_optics_groups, pixel_size_A)),
+            '_rlnVoltage': fmt(np.full(n_optics_groups, voltage_kv)),
+            '_rlnSphericalAberration': fmt(np.full(n_optics_groups, cs_mm)),
+            '_rlnAmplitudeContrast': fmt(np.full(n_optics_groups, amp_contrast)),
+            '_rlnImagePixelSize': fmt(np.full(n_optics_groups, pixel_size_A)),
+            '_rlnImageSize': np.full(n_optics_groups, box_size),
+            '_rlnImageDimensionality': np.full(n_optics_groups, 2),
+        })
+
+    return cryopicls.data_handling.relion.RelionMetaData(df_particles, df_optics)
+
+
+def _get_blob_fields(particles):
+    n_particles = len(particles['uid'])
+    stack_paths = np.array([f'J5/extract/{x}_particles.mrc' for x in particles['micrograph_names']], dtype=bytes)[particles['micrograph']]
+    return [
+        ('blob/path', stack_paths),
+        ('blob/idx', particles['idx'].astype('<u4')),
+        ('blob/shape', np.full((n_particles, 2), box_size, dtype='<u4')),
+        ('blob/psize_A', np.full(n_particles, pixel_size_A, dtype='<f4')),
+        ('blob/sign', np.full(n_particles, -1, dtype='<f4')),
+    ]
+
+
+def _get_ctf_fields(particles):
+    n_particles = len(particles['uid'])
+    zeros = np.zeros(n_particles, dtype='<f4')
+    return [
+        ('ctf/type', np.full(n_particles, b'spline', dtype='S7')),
+        ('ctf/exp_group_id', (particles['optics_group'] - 1).astype('<u4')),
+        ('ctf/accel_kv', np.full(n_particles, voltage_kv, dtype='<f4')),
+        ('ctf/cs_mm', np.full(n_particles, cs_mm, dtype='<f4')),
+        ('ctf/amp_contrast', np.full(n_particles, amp_contrast, dtype='<f4')),
+        ('ctf/df1_A', particles['defocus_u'].astype('<f4')),
+        ('ctf/df2_A', particles['defocus_v'].astype('<f4')),
+        ('ctf/df_angle_rad', np.deg2rad(particles['defocus_angle']).astype('<f4')),
+        ('ctf/phase_shift_rad', zeros),
+        ('ctf/scale', np.ones(n_particles, dtype='<f4')),
+        ('ctf/scale_const', zeros),
+        ('ctf/shift_A', np.zeros((n_particles, 2), dtype='<f4')),
+        ('ctf/tilt_A', np.zeros((n_particles, 2), dtype='<f4')),
+        ('ctf/trefoil_A', np.zeros((n_particles, 2), dtype='<f4')),
+        ('ctf/tetra_A', np.zeros((n_particles, 4), dtype='<f4')),
+        ('ctf/anisomag', np.zeros((n_particles, 4), dtype='<f4')),
+        ('ctf/bfactor', zeros),
+    ]
+
+
+def _get_alignment_fields(particles, name, rng):
+    """alignments2D or alignments3D fields."""
+    n_particles = len(particles['uid'])
+    shift = np.stack([particles['shift_x'], particles['shift_y']], axis=1) / pixel_size_A
+    if name == 'alignments3D':
+        pose = _quaternion_to_rotvec(particles['quaternion']).astype('<f4')
+        classes = particles['class_number'] - 1
+    else:
+        pose = rng.uniform(0, 2 * np.pi, size=n_particles).astype('<f4')
+        classes = rng.integers(0, 50, size=n_particles)
+    error = rng.normal(5000, 100, size=n_particles).astype('<f4')
+    return [
+        (f'{name}/split', (particles['random_subset'] - 1).astype('<u4')),
+        (f'{name}/shift', shift.astype('<f4')),
+        (f'{name}/pose', pose),
+        (f'{name}/psize_A', np.full(n_particles, pixel_size_A, dtype='<f4')),
+        (f'{name}/error', error),
+        (f'{name}/error_min', error - rng.uniform(0, 20, size=n_particles).astype('<f4')),
+        (f'{name}/resid_pow', error),
+        (f'{name}/slice_pow', rng.uniform(40, 60, size=n_particles).astype('<f4')),
+        (f'{name}/image_pow', rng.uniform(5000, 5200, size=n_particles).astype('<f4')),
+        (f'{name}/cross_cor', rng.uniform(100, 200, size=n_particles).astype('<f4')),
+        (f'{name}/alpha', rng.uniform(1, 2, size=n_particles).astype('<f4')),
+        (f'{name}/alpha_min', np.zeros(n_particles, dtype='<f4')),
+        (f'{name}/weight', np.zeros(n_particles, dtype='<f4')),
+        (f'{name}/pose_ess', np.zeros(n_particles, dtype='<f4')),
+        (f'{name}/shift_ess', np.zeros(n_particles, dtype='<f4')),
+        (f'{name}/class_posterior', np.ones(n_particles, dtype='<f4')),
+        (f'{name}/class', classes.astype('<u4')),
+        (f'{name}/class_ess', np.ones(n_particles, dtype='<f4')),
+    ]
+
+
+def _get_location_fields(particles):
+    n_particles = len(particles['uid'])
+    return [
+        ('location/micrograph_uid', particles['micrograph_uid'].astype('<u8')),
+        ('location/exp_group_id', (particles['optics_group'] - 1).astype('<u4')),
+        ('location/micrograph_path', particles['micrograph_path']),
+        ('location/micrograph_shape', np.tile(np.array(micrograph_shape, dtype='<u4'), (n_particles, 1))),
+        ('location/center_x_frac', (particles['coordinate_x'] / micrograph_shape[1]).astype('<f4')),
+        ('location/center_y_frac', (particles['coordinate_y'] / micrograph_shape[0]).astype('<f4')),
+    ]
+
+
+def _get_pick_stats_fields(particles):
+    n_particles = len(particles['uid'])
+    return [
+        ('pick_stats/ncc_score', particles['ncc_score'].astype('<f4')),
+        ('pick_stats/power', particles['power'].astype('<f4')),
+        ('pick_stats/template_idx', np.zeros(n_particles, dtype='<u4')),
+        ('pick_stats/angle_rad', np.zeros(n_particles, dtype='<f4')),
+    ]
+
+
+def _get_component_fields(latent):
+    fields = []
+    for i in range(latent.shape[1]):
+        fields.append((f'components_mode_{i}/component', np.full(latent.shape[0], i, dtype='<u4')))
+        fields.append((f'components_mode_{i}/value', latent[:, i].astype('<f4')))
+    return fields
+
+
+def _to_cs(uid, fields):
+    """Structured .cs array of the uid and (name, values) fields."""
+    dtype = [('uid', '<u8')] + [(name, values.dtype, values.shape[1:]) for name, values in fields]
+    cs = np.empty(len(uid), dtype=dtype)
+    cs['uid'] = uid
+    for name, values in fields:
+        cs[name] = values
+    return cs
+
+
+def make_cryosparc_metadata(particles, latent=None, rootname='synthetic', seed=0):
+    """cryoSPARC particle metadata (a particles .cs, a passthrough .cs and a .csg result group).
+
+    Parameters
+    ----------
+    particles : dict
+        Particle parameters (see make_particles()).
+
+    latent : ndarray, optional
+        Latent variables. If given, the result group of a 3D variability job, whose particles .cs holds the components_mode_N/component
+        and components_mode_N/value columns of the latent variables, and whose passthrough .cs holds all the others.
+        Otherwise the result group of a refinement, whose particles .cs holds the blob, ctf and alignments3D columns,
+        and whose passthrough .cs holds the alignments2D, location and pick_stats columns. By default None.
+
+    rootname : str, optional
+        Root name of the .cs files referred to by the .csg, which are <rootname>_particles.cs and <rootname>_passthrough_particles.cs
+        (as written by CryoSPARCMetaData.write()). By default 'synthetic'.
+
+    seed : int, optional
+        Random seed of the columns which are not in particles (e.g. alignment errors). By default 0.
+
+    Returns
+    -------
+    cryopicls.data_handling.cryosparc.CryoSPARCMetaData
+        The metadata.
+    """
+
+    rng = np.random.default_rng(seed)
+    n_particles = len(particles['uid'])
+    groups = dict(
+        blob=_get_blob_fields(particles),
+        ctf=_get_ctf_fields(particles),
+        alignments3D=_get_alignment_fields(particles, 'alignments3D', rng),
+        alignments2D=_get_alignment_fields(particles, 'alignments2D', rng),
+        location=_get_location_fields(particles),
+        pick_stats=_get_pick_stats_fields(particles),
+    )
+    if latent is None:
+        cs_groups = ['blob', 'ctf', 'alignments3D']
+    else:
+        assert latent.shape[0] == n_particles
+        component_fields = _get_component_fields(latent)
+        for i in range(latent.shape[1]):
+            groups[f'components_mode_{i}'] = component_fields[2 * i:2 * i + 2]
+        cs_groups = [x for x in groups if x.startswith('components_mode_')]
+    passthrough_groups = [x for x in groups if x not in cs_groups]
+
+    cs = _to_cs(particles['uid'], sum([groups[x] for x in cs_groups], []))
+    passthrough = _to_cs(particles['uid'], sum([groups[x] for x in passthrough_groups], []))
+
+    results = dict()
+    for name in sorted(groups):
+        metafile = f'>{rootname}_particles.cs' if name in cs_groups else f'>{rootname}_passthrough_particles.cs'
+        group_type = 'particle.components' if name.startswith('components_mode_') else f'particle.{name}'
+        results[name] = dict(metafile=metafile, num_items=n_particles, type=group_type)
+    csg = dict(
+        created=None,
+        group=dict(description='All particles that were processed, including alignments', name='particles', title='All particles', type='particle'),
+        results=results,
+        version='v3.2.0',
+    )
+    return cryopicls.data_handling.cryosparc.CryoSPARCMetaData(csg, cs, passthrough)
+
+
+def save_cryodrgn_z(outfile, Z):
+    """Save latent variables as a cryoDRGN z file (a pickled float32 array, like z.pkl)."""
+    with open(outfile, 'wb') as f:
+        pickle.dump(np.asarray(Z, dtype=np.float32), f)
+
+
+def generate(output_dir, n_particles, rootname='synthetic', formats=supported_formats, n_dims=8, n_clusters=5,
+             particles_per_micrograph=200, n_optics_groups=1, seed=0):
+    """Write the files of a synthetic dataset.
+
+    Parameters
+    ----------
+    output_dir : str
+        Output directory.
+
+    n_particles : int
+        Number of particles.
+
+    rootname : str, optional
+        Output file root name. By default 'synthetic'.
+
+    formats : list of str, optional
+        Files to write, among
+            'relion30' : RELION 3.0 star file, <rootname>_relion30.star.
+            'relion31' : RELION 3.1 star file, <rootname>_relion31.star.
+            'cryosparc' : cryoSPARC refinement result group, <rootname>_refine_particles.csg and its .cs files.
+            'threedva' : cryoSPARC 3D variability result group, <rootname>_3dva_particles.csg and its .cs files.
+            'cryodrgn' : cryoDRGN z file, <rootname>_z.pkl.
+        By default all.
+
+    n_dims, n_clusters : int, optional
+        Number of latent dimensions and of gaussian blobs of the latent variables (see make_latent()). By default 8 and 5.
+
+    particles_per_micrograph, n_optics_groups : int, optional
+        See make_particles(). By default 200 and 1.
+
+    seed : int, optional
+        Random seed. By default 0.
+
+    Returns
+    -------
+    files : dict
+        Format to the written file (the .csg file for the cryoSPARC formats).
+
+    labels : ndarray
+        True cluster labels of the particles. shape=(n_particles, )
+    """
+
+    for x in formats:
+        assert x in supported_formats, f'Not supported format: {x}'
+    os.makedirs(output_dir, exist_ok=True)
+
+    # Independent streams, so that each part is the same regardless of the formats written
+    seeds = np.random.SeedSequence(seed).spawn(3)
+    Z, labels = make_latent(n_particles, n_dims=n_dims, n_clusters=n_clusters, seed=seeds[0])
+    particles = make_particles(n_particles, particles_per_micrograph=particles_per_micrograph, n_optics_groups=n_optics_groups, seed=seeds[1])
+
+    files = dict()
+    for x in formats:
+        if x in ['relion30', 'relion31']:
+            md = make_relion_metadata(particles, relion31=x == 'relion31')
+            md.write(output_dir, f'{rootname}_{x}')
+            files[x] = os.path.join(output_dir, f'{rootname}_{x}.star')
+        elif x in ['cryosparc', 'threedva']:
+            name = f'{rootname}_refine' if x == 'cryosparc' else f'{rootname}_3dva'
+            md = make_cryosparc_metadata(particles, latent=Z if x == 'threedva' else None, rootname=name, seed=seeds[2])
+            md.write(output_dir, name)
+            files[x] = os.path.join(output_dir, f'{name}_particles.csg')
+        elif x == 'cryodrgn':
+            files[x] = os.path.join(output_dir, f'{rootname}_z.pkl')
+            save_cryodrgn_z(files[x], Z)
+
+    return files, labels
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+        description=__doc__.split('\n\n')[0]
+    )
+    parser.add_argument('--n-particles', type=int, required=True, help='Number of particles.')
+    parser.add_argument('--output-dir', type=str, default='.', help='Output directory.')
+    parser.add_argument('--output-file-rootname', type=str, default='synthetic', help='Output file root name.')
+    parser.add_argument('--formats', nargs='+', type=str, default=list(supported_formats), choices=supported_formats, help='Files to write.')
+    parser.add_argument('--n-dims', type=int, default=8, help='Number of latent dimensions.')
+    parser.add_argument('--n-clusters', type=int, default=5, help='Number of gaussian blobs in the latent space.')
+    parser.add_argument('--particles-per-micrograph', type=int, default=200, help='Number of particles picked in each micrograph.')
+    parser.add_argument('--n-optics-groups', type=int, default=1, help='Number of optics groups.')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed.')
+    args = parser.parse_args()
+
+    assert args.n_particles > 0, '--n-particles must be a positive integer number.'
+    assert args.particles_per_micrograph > 0, '--particles-per-micrograph must be a positive integer number.'
+    assert args.n_optics_groups > 0, '--n-optics-groups must be a positive integer number.'
+
+    return args
+
+
+def main():
+    args = parse_args()
+    files, _ = generate(
+        args.output_dir, args.n_particles, rootname=args.output_file_rootname, formats=args.formats, n_dims=args.n_dims,
+        n_clusters=args.n_clusters, particles_per_micrograph=args.particles_per_micrograph,
+        n_optics_groups=args.n_optics_groups, seed=args.seed)
+    for x, file in files.items():
+        print(f'{x} : {file}')
+
+
+if __name__ == '__main__':
+    main()
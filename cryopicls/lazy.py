@@ -0,0 +1,36 @@
+import importlib
+
+
+def attach(package_name, submodules):
+    """Import the submodules of a package on first access (PEP 562), instead of when the package is imported.
+
+    Heavy dependencies (e.g. scikit-learn, pyclustering, umap, dash) are then only imported by the programs using them,
+    and a command line program starts (and prints its --help) without them.
+
+    Parameters
+    ----------
+    package_name : str
+        Name of the package (__name__ in its __init__.py).
+
+    submodules : list of str
+        Names of the submodules (and subpackages) accessible as attributes of the package.
+
+    Returns
+    -------
+    __getattr__
+        Module __getattr__ of the package.
+
+    __dir__
+        Module __dir__ of the package.
+    """
+
+    def __getattr__(name):
+        if name in submodules:
+            # import_module also sets the submodule as an attribute of the package, so this is called once per submodule
+            return importlib.import_module(f'{package_name}.{name}')
+        raise AttributeError(f'module {package_name!r} has no attribute {name!r}')
+
+    def __dir__():
+        return sorted(set(vars(importlib.import_module(package_name))) | set(submodules))
+
+    return __getattr__, __dir__
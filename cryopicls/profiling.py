@@ -0,0 +1,315 @@
+import os
+import sys
+import json
+import time
+import socket
+import platform
+import threading
+import contextlib
+import collections
+
+import cryopicls
+
+
+def get_rss():
+    """Return the current resident set size (MB) of this process, or None if not available."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 ** 2
+    except (OSError, ValueError):
+        return None
+
+
+def get_max_rss():
+    """Return the peak resident set size (MB) of this process since its start (getrusage), or None if not available."""
+    try:
+        # Unix only
+        import resource
+    except ImportError:
+        return None
+    # ru_maxrss is in kB on Linux and in bytes on macOS, and cannot be reset
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss / 1024 ** 2 if sys.platform == 'darwin' else maxrss / 1024
+
+
+def get_peak_rss():
+    """Return the peak resident set size (MB) of this process since its start, or since the last reset_peak_rss(). None if not available."""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except (OSError, ValueError):
+        pass
+    return get_max_rss()
+
+
+def reset_peak_rss():
+    """Reset the peak resident set size of this process to the current one (Linux only). Return True on success."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+class StackSampler:
+    """Sampling profiler of the Python stack of one thread, running in a background thread.
+
+    The stack of the target thread is recorded every interval seconds, and the samples are kept as collapsed stacks
+    ("outermost;...;innermost count" lines, the input format of flame graph tools such as flamegraph.pl and speedscope).
+    The sampler needs the GIL, so a C extension holding the GIL for a long time is attributed to the Python frame calling it.
+
+    Parameters
+    ----------
+    interval : float, optional
+        Sampling interval (s). By default 0.005.
+
+    thread_id : int, optional
+        Identifier of the thread to sample. By default the thread creating the sampler.
+
+    skip : int, optional
+        Number of outermost frames dropped from the stacks (e.g. the frames of the program calling the profiled function).
+        By default 0.
+    """
+
+    def __init__(self, interval=0.005, thread_id=None, skip=0):
+        self.interval = interval
+        self.thread_id = thread_id if thread_id is not None else threading.get_ident()
+        self.skip = skip
+        self.samples = collections.Counter()
+        self.n_samples = 0
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def get_frame_name(frame):
+        code = frame.f_code
+        return f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+
+    def _sample(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            names = []
+            while frame is not None:
+                names.append(self.get_frame_name(frame))
+                frame = frame.f_back
+            self.samples[';'.join(names[::-1][self.skip:])] += 1
+            self.n_samples += 1
+
+    def start(self):
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._sample, name='cryopicls-stack-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def save_collapsed(self, outfile):
+        """Save the samples as collapsed stacks."""
+        with open(outfile, 'w') as f:
+            for stack, count in self.samples.most_common():
+                f.write(f'{stack} {count}\n')
+
+    def get_top_functions(self, n=20):
+        """Return the n functions with the most samples, as a list of dict of function, self (samples in the function itself) and total (samples with the function on the stack)."""
+        self_samples = collections.Counter()
+        total_samples = collections.Counter()
+        for stack, count in self.samples.items():
+            names = stack.split(';')
+            self_samples[names[-1]] += count
+            for name in set(names):
+                total_samples[name] += count
+        return [
+            dict(function=name, self=self_samples[name], total=total)
+            for name, total in sorted(total_samples.items(), key=lambda x: (-self_samples[x[0]], -x[1]))[:n]
+        ]
+
+
+class PipelineMetrics:
+    """Wall time, CPU time and peak memory of the stages of a pipeline (e.g. a command line program), saved as JSON.
+
+    Each stage is run in the context manager stage(name). A stage run several times (e.g. a figure created per request)
+    is aggregated under its name. When disabled, stage() does nothing, so that the pipelines are written with their stages
+    whether or not they are profiled.
+
+    The peak memory of a stage is the peak resident set size of the process during the stage on Linux (the peak is reset
+    at the start of the stage), and the peak since the start of the process elsewhere. Stages running at the same time
+    in several threads share their peak, and the CPU time is that of the whole process (all threads).
+
+    Parameters
+    ----------
+    command : str
+        Name of the pipeline.
+
+    enabled : bool, optional
+        Whether to record the stages. By default True.
+
+    outfile : str, optional
+        JSON file written by report(). By default None (not saved).
+
+    profile_stage : str, optional
+        Name of the stage to run under the sampling profiler (StackSampler). The collapsed stacks are saved next to outfile,
+        as <outfile root>_<stage>_stacks.txt. By default None.
+
+    profile_interval : float, optional
+        Sampling interval (s) of the profiler. By default 0.005.
+    """
+
+    def __init__(self, command, enabled=True, outfile=None, profile_stage=None, profile_interval=0.005):
+        self.command = command
+        self.enabled = enabled
+        self.outfile = outfile
+        self.profile_stage = profile_stage
+        self.profile_interval = profile_interval
+        self.stages = collections.OrderedDict()
+        self.inputs = dict()
+        self.info = dict()
+        self.status = 'running'
+        self.sampler = None
+        self._lock = threading.Lock()
+        self._n_active = 0
+        self._started_at = time.time()
+        self._wall_start = time.perf_counter()
+        self._cpu_start = time.process_time()
+
+    @classmethod
+    def from_args(cls, args, command, default_outfile):
+        """Metrics of a command line program with the profiling arguments (see cryopicls.args.profiling)."""
+        return cls(
+            command, enabled=args.profile, outfile=args.metrics_out or default_outfile,
+            profile_stage=args.profile_stage, profile_interval=args.profile_interval
+        )
+
+    def set_inputs(self, **sizes):
+        """Record the sizes of the inputs (e.g. number of particles)."""
+        self.inputs.update(sizes)
+
+    def set_input_files(self, *files):
+        """Record the sizes (bytes) of input files."""
+        self.inputs.setdefault('files', dict()).update({x: os.path.getsize(x) for x in files if x and os.path.isfile(x)})
+
+    def set_info(self, **info):
+        """Record other (JSON serializable) information on the run."""
+        self.info.update(info)
+
+    def get_profile_file(self):
+        root = os.path.splitext(self.outfile)[0] if self.outfile else self.command
+        return f'{root}_{self.profile_stage.replace("/", "_")}_stacks.txt'
+
+    @contextlib.contextmanager
+    def stage(self, name, **sizes):
+        """Context manager recording the stage name. sizes are recorded with the stage (e.g. number of samples)."""
+        if not self.enabled:
+            yield
+            return
+
+        with self._lock:
+            # The peak is not reset while other stages are running (in other threads)
+            if self._n_active == 0:
+                reset_peak_rss()
+            self._n_active += 1
+        sampler = None
+        if name == self.profile_stage and self.sampler is None:
+            # The stacks start at the function running the stage (this generator is called by contextlib's __enter__)
+            frame, depth = sys._getframe(), 0
+            while frame is not None:
+                frame, depth = frame.f_back, depth + 1
+            sampler = self.sampler = StackSampler(interval=self.profile_interval, skip=depth - 3)
+            sampler.start()
+        rss_start = get_rss()
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            yield
+        finally:
+            wall_time = time.perf_counter() - wall_start
+            cpu_time = time.process_time() - cpu_start
+            peak_rss = get_peak_rss()
+            rss_end = get_rss()
+            if sampler is not None:
+                sampler.stop()
+            with self._lock:
+                self._n_active -= 1
+                x = self.stages.get(name)
+                if x is None:
+                    x = self.stages[name] = dict(
+                        n=0, wall_time_s=0., cpu_time_s=0., max_wall_time_s=0., rss_start_mb=rss_start, rss_end_mb=None, peak_rss_mb=0.
+                    )
+                x['n'] += 1
+                x['wall_time_s'] += wall_time
+                x['cpu_time_s'] += cpu_time
+                x['max_wall_time_s'] = max(x['max_wall_time_s'], wall_time)
+                x['rss_end_mb'] = rss_end
+                if peak_rss is not None:
+                    x['peak_rss_mb'] = max(x['peak_rss_mb'], peak_rss)
+                if sizes:
+                    x['sizes'] = sizes
+
+    def to_dict(self):
+        with self._lock:
+            stages = {name: dict(x) for name, x in self.stages.items()}
+        if self.sampler is not None:
+            stages.setdefault(self.profile_stage, dict())['profile'] = dict(
+                interval_s=self.profile_interval, n_samples=self.sampler.n_samples,
+                stacks_file=self.get_profile_file(), top_functions=self.sampler.get_top_functions()
+            )
+        return dict(
+            command=self.command,
+            argv=sys.argv,
+            status=self.status,
+            started_at=time.strftime('%Y-%m-%dT%H:%M:%S%z', time.localtime(self._started_at)),
+            wall_time_s=time.perf_counter() - self._wall_start,
+            cpu_time_s=time.process_time() - self._cpu_start,
+            peak_rss_mb=get_max_rss(),
+            inputs=self.inputs,
+            stages=stages,
+            info=self.info,
+            environment=dict(
+                cryopicls=cryopicls.__version__, python=platform.python_version(), platform=platform.platform(),
+                host=socket.gethostname(), pid=os.getpid(), cpu_count=os.cpu_count()
+            ),
+        )
+
+    def save(self, outfile=None):
+        outfile = outfile or self.outfile
+        if self.sampler is not None:
+            self.sampler.save_collapsed(self.get_profile_file())
+        with open(outfile, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2, default=str)
+        return outfile
+
+    def print_summary(self):
+        print('##### Stages #####')
+        print(f'\t{"stage":<24}{"n":>6}{"wall":>10}{"cpu":>10}{"peak rss":>12}  (s, MB)')
+        with self._lock:
+            stages = list(self.stages.items())
+        for name, x in stages:
+            print(f'\t{name:<24}{x["n"]:>6}{x["wall_time_s"]:>10.2f}{x["cpu_time_s"]:>10.2f}{x["peak_rss_mb"]:>12.1f}')
+        print(f'\t{"total":<24}{"":>6}{time.perf_counter() - self._wall_start:>10.2f}{time.process_time() - self._cpu_start:>10.2f}')
+        if self.profile_stage is not None and self.sampler is None:
+            print(f'\tStage {self.profile_stage} to profile did not run. Stages: {", ".join(x for x, _ in stages)}')
+
+    def report(self):
+        """Print the stages, and save the metrics to outfile (if any). Does nothing if disabled."""
+        if not self.enabled:
+            return
+        self.print_summary()
+        if self.outfile:
+            os.makedirs(os.path.dirname(os.path.abspath(self.outfile)), exist_ok=True)
+            print(f'\tMetrics saved to {self.save()}')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # The metrics of a failed (or interrupted) run are saved too, with the stages which ran
+        self.status = 'completed' if exc_type is None else f'failed ({exc_type.__name__})'
+        self.report()
+        return False
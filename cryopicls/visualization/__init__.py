@@ -0,0 +1,13 @@
+from .. import lazy
+
+__getattr__, __dir__ = lazy.attach(__name__, [
+    'lod',
+    'raster',
+    'histogram',
+    'figure_cache',
+    'registry',
+    'selection',
+    'crossfilter',
+    'volume',
+    'serving',
+])
@@ -0,0 +1,158 @@
+import numpy as np
+
+
+class CrossFilter:
+    """Cross-filtering of samples by ranges of several dimensions, backed by binned aggregates.
+
+    Each dimension is divided into n_bins bins, and filter ranges are snapped to the bin edges.
+    The bin codes of each dimension are sorted once (a per-dimension index), so that the samples in a range of bins are a contiguous slice of the index.
+    The 2D bin counts of pairs of dimensions are computed once on demand, so that the histograms under a single filter (the usual case while brushing)
+    are sums of rows of these aggregates, without touching the samples at all.
+
+    Following the usual cross-filtering convention, the histogram of a dimension is filtered by the filters of the other dimensions only.
+
+    Parameters
+    ----------
+    columns : list of ndarray of shape (n_samples, )
+        Values of each dimension.
+
+    value_ranges : list of [min, max], optional
+        Range of the bins of each dimension. By default None (the range of the values).
+
+    n_bins : int, optional
+        Number of bins of each dimension. By default 50.
+
+    Attributes
+    ----------
+    edges_ : list of ndarray of shape (n_bins + 1, )
+        Bin edges of each dimension.
+
+    codes_ : list of ndarray of shape (n_samples, )
+        Bin index of each sample, in each dimension.
+
+    counts_ : list of ndarray of shape (n_bins, )
+        Unfiltered histogram of each dimension.
+
+    orders_ : list of ndarray of shape (n_samples, )
+        Samples sorted by the bin index, in each dimension.
+
+    bin_starts_ : list of ndarray of shape (n_bins + 1, )
+        Start position of each bin in orders_, in each dimension.
+    """
+
+    def __init__(self, columns, value_ranges=None, n_bins=50):
+        self.n_dims = len(columns)
+        self.n_samples = len(columns[0]) if self.n_dims > 0 else 0
+        self.n_bins = n_bins
+        code_dtype = np.min_scalar_type(n_bins - 1)
+
+        self.edges_, self.codes_, self.counts_, self.orders_, self.bin_starts_ = [], [], [], [], []
+        for dim, values in enumerate(columns):
+            if value_ranges is not None:
+                vmin, vmax = sorted(value_ranges[dim])
+            else:
+                vmin, vmax = (float(values.min()), float(values.max())) if len(values) else (0.0, 1.0)
+            if vmax == vmin:
+                vmin, vmax = vmin - 0.5, vmax + 0.5
+            codes = np.floor((np.asarray(values, dtype=np.float64) - vmin) * (n_bins / (vmax - vmin)))
+            codes = np.clip(codes, 0, n_bins - 1).astype(code_dtype)
+            counts = np.bincount(codes, minlength=n_bins)
+            self.edges_.append(np.linspace(vmin, vmax, n_bins + 1))
+            self.codes_.append(codes)
+            self.counts_.append(counts)
+            # Small integer codes, thus a radix sort
+            self.orders_.append(np.argsort(codes, kind='stable'))
+            self.bin_starts_.append(np.append(0, np.cumsum(counts)))
+        self._pair_counts = dict()
+
+    @property
+    def nbytes(self):
+        arrays = self.codes_ + self.orders_ + list(self._pair_counts.values())
+        return sum(x.nbytes for x in arrays)
+
+    def to_bins(self, dim, value_range):
+        """Range of bins [start, stop) covering value_range of the dimension."""
+        edges = self.edges_[dim]
+        vmin, vmax = sorted(value_range)
+        width = edges[1] - edges[0]
+        start = int(np.clip(np.floor((vmin - edges[0]) / width), 0, self.n_bins - 1))
+        stop = int(np.clip(np.ceil((vmax - edges[0]) / width), start + 1, self.n_bins))
+        return start, stop
+
+    def get_pair_counts(self, dim_a, dim_b):
+        """2D histogram of the bin indices of two dimensions, of shape (n_bins, n_bins)."""
+        key = (dim_a, dim_b)
+        if key not in self._pair_counts:
+            if (dim_b, dim_a) in self._pair_counts:
+                return self._pair_counts[(dim_b, dim_a)].T
+            codes = self.codes_[dim_a].astype(np.int64) * self.n_bins + self.codes_[dim_b]
+            self._pair_counts[key] = np.bincount(codes, minlength=self.n_bins ** 2).reshape(self.n_bins, self.n_bins)
+        return self._pair_counts[key]
+
+    def get_rows(self, dim, bins):
+        """Samples in the range of bins [start, stop) of the dimension."""
+        start, stop = bins
+        return self.orders_[dim][self.bin_starts_[dim][start]:self.bin_starts_[dim][stop]]
+
+    def _count_hits(self, filters):
+        # Number of filters each sample passes
+        hits = np.zeros(self.n_samples, dtype=np.uint8)
+        for dim, bins in filters.items():
+            hits[self.get_rows(dim, bins)] += 1
+        return hits
+
+    def histograms(self, filters):
+        """Histogram of each dimension, filtered by the filters of the other dimensions.
+
+        Parameters
+        ----------
+        filters : dict
+            Dimension to the range of bins [start, stop) (see to_bins()).
+
+        Returns
+        -------
+        list of ndarray of shape (n_bins, )
+            Filtered histogram of each dimension.
+        """
+
+        if len(filters) == 0:
+            return list(self.counts_)
+
+        if len(filters) == 1:
+            # Sums of rows of the precomputed 2D aggregates
+            (dim_f, (start, stop)), = filters.items()
+            return [
+                self.counts_[dim] if dim == dim_f else self.get_pair_counts(dim_f, dim)[start:stop].sum(axis=0)
+                for dim in range(self.n_dims)
+            ]
+
+        # Samples passing all the filters but one's are among the samples of any other filter,
+        # thus only the samples of the most selective other filter are visited for each dimension.
+        hits = self._count_hits(filters)
+        n_filters = len(filters)
+        sizes = {dim: self.bin_starts_[dim][stop] - self.bin_starts_[dim][start] for dim, (start, stop) in filters.items()}
+        histograms = []
+        for dim in range(self.n_dims):
+            dim_c = min([x for x in filters if x != dim], key=lambda x: sizes[x])
+            rows = self.get_rows(dim_c, filters[dim_c])
+            codes = self.codes_[dim][rows]
+            n_passed = hits[rows]
+            if dim in filters:
+                start, stop = filters[dim]
+                n_passed = n_passed - ((start <= codes) & (codes < stop))
+                mask = n_passed == n_filters - 1
+            else:
+                mask = n_passed == n_filters
+            histograms.append(np.bincount(codes[mask], minlength=self.n_bins))
+        return histograms
+
+    def mask(self, filters):
+        """Boolean mask of the samples passing all the filters (see histograms())."""
+        if len(filters) == 0:
+            return np.ones(self.n_samples, dtype=bool)
+        if len(filters) == 1:
+            (dim, bins), = filters.items()
+            mask = np.zeros(self.n_samples, dtype=bool)
+            mask[self.get_rows(dim, bins)] = True
+            return mask
+        return self._count_hits(filters) == len(filters)
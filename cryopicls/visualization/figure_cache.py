@@ -0,0 +1,77 @@
+import json
+import threading
+from collections import OrderedDict
+
+import plotly.utils
+
+
+class FigureCache:
+    """In-process LRU cache of serialized figures with a memory cap.
+
+    Values (plotly figures, or JSON serializable objects containing them) are stored as JSON strings,
+    which both bounds the memory usage and decouples the cached value from later modifications.
+
+    Parameters
+    ----------
+    max_bytes : int, optional
+        Maximum total size of the serialized values. The least recently used entries are evicted above it. By default 512 MiB.
+
+    Attributes
+    ----------
+    n_bytes : int
+        Current total size of the serialized values.
+
+    hits, misses : int
+        Number of cache hits and misses of get().
+    """
+
+    def __init__(self, max_bytes=512 * 1024 ** 2):
+        self.max_bytes = max_bytes
+        self.n_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key):
+        """Return the deserialized value for key, or None if not cached."""
+        with self._lock:
+            serialized = self._entries.get(key)
+            if serialized is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return json.loads(serialized)
+
+    def put(self, key, value):
+        """Cache value for key, and return its deserialized (JSON compatible) form."""
+        serialized = json.dumps(value, cls=plotly.utils.PlotlyJSONEncoder)
+        with self._lock:
+            if key in self._entries:
+                self.n_bytes -= len(self._entries.pop(key))
+            if len(serialized) <= self.max_bytes:
+                self._entries[key] = serialized
+                self.n_bytes += len(serialized)
+            while self.n_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.n_bytes -= len(evicted)
+        return json.loads(serialized)
+
+    def get_or_create(self, key, create):
+        """Return the cached value for key, or create, cache and return it by calling create()."""
+        value = self.get(key)
+        if value is None:
+            value = self.put(key, create())
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.n_bytes = 0
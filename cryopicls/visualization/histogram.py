@@ -0,0 +1,46 @@
+import numpy as np
+
+
+def binned_counts(values, n_bins, value_range, codes=None, n_codes=1):
+    """Histogram of values per group, computed with a single vectorized bincount.
+
+    Parameters
+    ----------
+    values : ndarray of shape (n_samples, )
+        Values to histogram.
+
+    n_bins : int
+        Number of bins.
+
+    value_range : [min, max]
+        Range covered by the bins. Values outside the range are ignored, the maximum value is included in the last bin.
+
+    codes : ndarray of shape (n_samples, ), optional
+        Integer group codes (e.g. cluster) in [0, n_codes). By default None (a single group).
+
+    n_codes : int, optional
+        Number of groups. By default 1.
+
+    Returns
+    -------
+    edges : ndarray of shape (n_bins + 1, )
+        Bin edges.
+
+    counts : ndarray of shape (n_codes, n_bins)
+        Number of samples of each group in each bin.
+    """
+
+    vmin, vmax = sorted(value_range)
+    if vmax == vmin:
+        vmin, vmax = vmin - 0.5, vmax + 0.5
+    edges = np.linspace(vmin, vmax, n_bins + 1)
+    values = np.asarray(values, dtype=np.float64)
+    idxs = np.floor((values - vmin) * (n_bins / (vmax - vmin))).astype(np.int64)
+    # The maximum value belongs to the last bin, as with numpy.histogram
+    idxs[(idxs == n_bins) & (values <= vmax)] = n_bins - 1
+    mask = (0 <= idxs) & (idxs < n_bins)
+    idxs = idxs[mask]
+    if codes is not None:
+        idxs += np.asarray(codes)[mask].astype(np.int64) * n_bins
+    counts = np.bincount(idxs, minlength=n_codes * n_bins).reshape(n_codes, n_bins)
+    return edges, counts
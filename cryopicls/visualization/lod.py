@@ -0,0 +1,197 @@
+import numpy as np
+
+
+class GridIndex:
+    """Uniform grid spatial index for level-of-detail queries on scatter plot data.
+
+    The samples are binned into a regular grid and sorted by grid cell, in a random order within each cell.
+    A query selects the cells overlapping the requested range and takes a number of samples from each cell, which is proportional to the cell population but at least min_points_per_cell.
+    Dense regions are thinned out with their relative density preserved, while sparsely populated regions (rare states) keep all or most of their samples.
+
+    Parameters
+    ----------
+    coords : array-like of shape (n_samples, n_dims)
+        Coordinates of the samples.
+
+    n_bins : int, optional
+        Number of grid bins along each dimension. By default (None) about 65536 grid cells in total, i.e. 256 bins for 2D and 40 bins for 3D.
+
+    min_points_per_cell : int, optional
+        Number of samples guaranteed to be kept in each cell as long as the budget allows. By default 5.
+
+    random_state : int, optional
+        Random seed value for the order of the samples within each cell. By default 0.
+
+    Attributes
+    ----------
+    mins_ : ndarray of shape (n_dims, )
+        Lower bounds of the grid.
+
+    widths_ : ndarray of shape (n_dims, )
+        Bin widths of the grid.
+
+    cell_bins_ : ndarray of shape (n_cells, n_dims)
+        Bin indices of the non-empty cells.
+
+    cell_starts_ : ndarray of shape (n_cells, )
+        Start positions of each non-empty cell in order_.
+
+    cell_counts_ : ndarray of shape (n_cells, )
+        Number of samples in each non-empty cell.
+
+    order_ : ndarray of shape (n_samples, )
+        Sample indices sorted by cell.
+    """
+
+    def __init__(self, coords, n_bins=None, min_points_per_cell=5, random_state=0):
+        self.coords = np.asarray(coords)
+        self.n_samples, self.n_dims = self.coords.shape
+        if n_bins is None:
+            n_bins = int(round(65536 ** (1 / self.n_dims)))
+        self.n_bins = n_bins
+        self.min_points_per_cell = min_points_per_cell
+
+        if self.n_samples > 0:
+            self.mins_ = self.coords.min(axis=0).astype(np.float64)
+            maxs = self.coords.max(axis=0).astype(np.float64)
+        else:
+            self.mins_ = np.zeros(self.n_dims)
+            maxs = np.ones(self.n_dims)
+        self.widths_ = (maxs - self.mins_) / self.n_bins
+        self.widths_[self.widths_ == 0] = 1
+
+        bins = self._to_bins(self.coords)
+        cell_ids = np.ravel_multi_index(tuple(bins.T), (self.n_bins, ) * self.n_dims)
+        # The smallest integer type, so that numpy uses radix sort for the stable sort below.
+        cell_ids = cell_ids.astype(np.min_scalar_type(self.n_bins ** self.n_dims - 1))
+
+        # Random order within each cell, so that the first samples of a cell are a random subsample of it.
+        rng = np.random.default_rng(random_state)
+        perm = rng.permutation(self.n_samples)
+        self.order_ = perm[np.argsort(cell_ids[perm], kind='stable')]
+
+        sorted_ids = cell_ids[self.order_]
+        if self.n_samples > 0:
+            self.cell_starts_ = np.append(0, np.flatnonzero(sorted_ids[1:] != sorted_ids[:-1]) + 1)
+        else:
+            self.cell_starts_ = np.array([], dtype=np.int64)
+        self.cell_counts_ = np.diff(np.append(self.cell_starts_, self.n_samples))
+        cells = sorted_ids[self.cell_starts_]
+        self.cell_bins_ = np.vstack(
+            np.unravel_index(cells, (self.n_bins, ) * self.n_dims)).T.astype(np.int32)
+
+    @property
+    def nbytes(self):
+        """Memory used by the index arrays (including the copy of the coordinates)."""
+        return sum(x.nbytes for x in [self.coords, self.order_, self.cell_starts_, self.cell_counts_, self.cell_bins_])
+
+    def _to_bins(self, coords):
+        bins = np.floor((np.asarray(coords, dtype=np.float64) - self.mins_) / self.widths_)
+        return np.clip(bins, 0, self.n_bins - 1).astype(np.int64)
+
+    def _select_cells(self, ranges):
+        mask = np.ones(len(self.cell_counts_), dtype=bool)
+        if ranges is None:
+            return mask
+        for dim, dim_range in enumerate(ranges):
+            if dim_range is None:
+                continue
+            bin_min, bin_max = np.clip(
+                np.floor((np.sort(dim_range) - self.mins_[dim]) / self.widths_[dim]), 0, self.n_bins - 1)
+            mask &= (bin_min <= self.cell_bins_[:, dim]) & (self.cell_bins_[:, dim] <= bin_max)
+        return mask
+
+    def _in_ranges(self, idxs, ranges):
+        mask = np.ones(len(idxs), dtype=bool)
+        for dim, dim_range in enumerate(ranges):
+            if dim_range is None:
+                continue
+            vmin, vmax = sorted(dim_range)
+            values = self.coords[idxs, dim]
+            mask &= (vmin <= values) & (values <= vmax)
+        return idxs[mask]
+
+    def _take(self, starts, quotas):
+        # The first quotas[i] samples of each cell i
+        offsets = np.repeat(starts - (np.cumsum(quotas) - quotas), quotas)
+        return self.order_[np.arange(quotas.sum()) + offsets]
+
+    def _quotas(self, counts, max_points):
+        if counts.sum() <= max_points:
+            return counts
+        floors = np.minimum(counts, self.min_points_per_cell)
+        if floors.sum() > max_points:
+            # Not even the floors fit in the budget. Cap the number of samples of each cell instead.
+            lo, hi = 0, self.min_points_per_cell
+            while lo < hi:
+                cap = (lo + hi + 1) // 2
+                if np.minimum(counts, cap).sum() <= max_points:
+                    lo = cap
+                else:
+                    hi = cap - 1
+            if lo > 0:
+                return np.minimum(counts, lo)
+            # More non-empty cells than the budget. One sample from each of randomly chosen cells.
+            quotas = np.zeros_like(counts)
+            rng = np.random.default_rng(0)
+            quotas[rng.choice(len(counts), max_points, replace=False)] = 1
+            return quotas
+        # Largest sampling fraction which keeps the total within the budget.
+        lo, hi = 0.0, 1.0
+        for _ in range(30):
+            frac = (lo + hi) / 2
+            if np.maximum(floors, np.floor(counts * frac)).sum() <= max_points:
+                lo = frac
+            else:
+                hi = frac
+        return np.maximum(floors, np.floor(counts * lo)).astype(counts.dtype)
+
+    def query(self, ranges=None, max_points=100000):
+        """Density-preserving subsample of the samples inside the given ranges.
+
+        Parameters
+        ----------
+        ranges : list of [min, max] or None, optional
+            Range of each dimension. None (for the whole list or for a dimension) means no restriction. By default None.
+
+        max_points : int, optional
+            Maximum number of samples to return (point budget). By default 100000.
+
+        Returns
+        -------
+        ndarray
+            Sorted indices of the selected samples.
+        """
+
+        cell_mask = self._select_cells(ranges)
+        starts = self.cell_starts_[cell_mask]
+        counts = self.cell_counts_[cell_mask]
+        quotas = self._quotas(counts, max_points)
+
+        idxs = self._take(starts, quotas)
+
+        if ranges is not None:
+            # Cells on the boundary of the ranges are only partially inside.
+            idxs = self._in_ranges(idxs, ranges)
+
+        return np.sort(idxs)
+
+    def count(self, ranges=None):
+        """Number of samples inside the given ranges.
+
+        Parameters
+        ----------
+        ranges : list of [min, max] or None, optional
+            Range of each dimension. By default None (all the samples).
+
+        Returns
+        -------
+        int
+            Number of samples.
+        """
+
+        if ranges is None:
+            return self.n_samples
+        cell_mask = self._select_cells(ranges)
+        candidates = self._take(self.cell_starts_[cell_mask], self.cell_counts_[cell_mask])
+        return len(self._in_ranges(candidates, ranges))
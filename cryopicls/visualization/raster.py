@@ -0,0 +1,92 @@
+import io
+import base64
+
+import numpy as np
+import plotly.colors
+from PIL import Image
+
+
+def aggregate(x, y, x_range, y_range, codes=None, n_codes=1, width=800, height=600):
+    """Count samples per pixel (and per group) on a regular pixel grid.
+
+    Parameters
+    ----------
+    x, y : ndarray of shape (n_samples, )
+        Coordinates of the samples.
+
+    x_range, y_range : [min, max]
+        Data range covered by the pixel grid. Samples outside the range are ignored.
+
+    codes : ndarray of shape (n_samples, ), optional
+        Integer group codes (e.g. cluster) in [0, n_codes). By default None (a single group).
+
+    n_codes : int, optional
+        Number of groups. By default 1.
+
+    width, height : int, optional
+        Size of the pixel grid. By default 800 x 600.
+
+    Returns
+    -------
+    ndarray of shape (n_codes, height, width)
+        Number of samples of each group in each pixel. Row 0 corresponds to the lower end of y_range.
+    """
+
+    x_min, x_max = sorted(x_range)
+    y_min, y_max = sorted(y_range)
+    ix = np.floor((x - x_min) * (width / (x_max - x_min))).astype(np.int64)
+    iy = np.floor((y - y_min) * (height / (y_max - y_min))).astype(np.int64)
+    mask = (0 <= ix) & (ix < width) & (0 <= iy) & (iy < height)
+    pixel = iy[mask] * width + ix[mask]
+    if codes is not None:
+        pixel += codes[mask].astype(np.int64) * (width * height)
+    counts = np.bincount(pixel, minlength=n_codes * width * height)
+    return counts.reshape(n_codes, height, width)
+
+
+def shade(counts, colors=None):
+    """Render per-pixel counts as an RGBA image.
+
+    The color of a pixel is the mix of the group colors weighted by the share of each group in the pixel,
+    and the opacity grows with the logarithm of the total count.
+
+    Parameters
+    ----------
+    counts : ndarray of shape (n_codes, height, width)
+        Output of aggregate().
+
+    colors : list of strings, optional
+        Plotly color of each group. By default the plotly qualitative color sequence.
+
+    Returns
+    -------
+    ndarray of shape (height, width, 4)
+        RGBA image (uint8).
+    """
+
+    n_codes = counts.shape[0]
+    if colors is None:
+        colors = plotly.colors.qualitative.Plotly
+    rgb = np.array([plotly.colors.hex_to_rgb(colors[i % len(colors)]) if colors[i % len(colors)].startswith('#')
+                    else plotly.colors.unlabel_rgb(colors[i % len(colors)]) for i in range(n_codes)], dtype=np.float64)
+
+    total = counts.sum(axis=0)
+    filled = total > 0
+    share = counts[:, filled] / total[filled]
+    image = np.zeros(total.shape + (4, ), dtype=np.uint8)
+    image[filled, :3] = np.clip(share.T @ rgb, 0, 255).astype(np.uint8)
+    if filled.any():
+        log_total = np.log1p(total[filled])
+        image[filled, 3] = (64 + 191 * log_total / log_total.max()).astype(np.uint8)
+    return image
+
+
+def to_png_data_uri(image):
+    """Encode an RGBA image from shade() as a PNG data URI (for a plotly layout image).
+
+    The image is flipped vertically, since row 0 of the image is the lower end of the y axis while it is the top row of a PNG.
+    """
+
+    buf = io.BytesIO()
+    Image.fromarray(np.ascontiguousarray(image[::-1]), mode='RGBA').save(buf, format='png')
+    return 'data:image/png;base64,' + base64.b64encode(buf.getvalue()).decode('ascii')
@@ -0,0 +1,743 @@
+import os
+import sys
+import time
+import zlib
+import threading
+import urllib.parse
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+import cryopicls
+
+
+def read_result_file(result_file, columns=None):
+    """Read a cryoPICLS result file, either a pickled DataFrame (.pkl) or a columnar file (.cpc).
+
+    The cluster label column is always read if the file has it. Only the requested columns are read from disk for a columnar file.
+    """
+    label_columns = list(cryopicls.data_handling.columnar.LABEL_COLUMNS)
+    if cryopicls.data_handling.columnar.is_columnar_file(result_file):
+        available = cryopicls.data_handling.columnar.get_column_names(result_file)
+        if columns is not None:
+            columns = list(columns) + [x for x in label_columns if x in available and x not in columns]
+        df = cryopicls.data_handling.columnar.load_columnar(result_file, columns=columns)
+    else:
+        df = pd.read_pickle(result_file)
+        if columns is not None:
+            for x in columns:
+                assert x in df.columns, f'Column {x} not found in {result_file}. Available: {list(df.columns)}'
+            columns = list(columns) + [x for x in label_columns if x in df.columns and x not in columns]
+            df = df[columns]
+    return df
+
+
+def array_to_df(Z):
+    col_names = [f'dim_{x}' for x in range(1, Z.shape[1] + 1)]
+    df = pd.DataFrame(data=Z, columns=col_names)
+    return df
+
+
+def load_latent_variables_cryodrgn(cryodrgn_z_file):
+    Z = cryopicls.data_handling.cryodrgn.load_latent_variables(cryodrgn_z_file)
+    df = array_to_df(Z)
+    return df
+
+
+def load_latent_variables_threedva(threedva_csg_file):
+    cs_file, _ = cryopicls.data_handling.cryosparc.get_metafiles_from_csg(
+        threedva_csg_file
+    )
+    Z = cryopicls.data_handling.cryosparc.load_latent_variables(
+        cs_file
+    )
+    df = array_to_df(Z)
+    return df
+
+
+def load_metadata(metadata_file):
+    """Load particle metadata, a cryoSPARC group file (.csg) or a RELION star file (.star)."""
+    if os.path.splitext(metadata_file)[1] == '.csg':
+        return cryopicls.data_handling.cryosparc.CryoSPARCMetaData.load(metadata_file)
+    else:
+        return cryopicls.data_handling.relion.RelionMetaData.load(metadata_file)
+
+
+def get_metadata_columns(metadata_file):
+    """Column names of particle metadata, without loading the metadata."""
+    if os.path.splitext(metadata_file)[1] == '.csg':
+        return cryopicls.data_handling.cryosparc.get_csg_columns(metadata_file)
+    else:
+        return cryopicls.data_handling.relion.RelionMetaData.read_labels(metadata_file)
+
+
+def load_metadata_column(metadata_file, column):
+    """Load a single column of particle metadata. Memory-mapped for a .csg file, and parsing only the column for a .star file."""
+    if os.path.splitext(metadata_file)[1] == '.csg':
+        return cryopicls.data_handling.cryosparc.read_csg_column(metadata_file, column)
+    else:
+        return cryopicls.data_handling.relion.RelionMetaData.read_column(metadata_file, column)
+
+
+def get_num_particles(md):
+    if isinstance(md, cryopicls.data_handling.cryosparc.CryoSPARCMetaData):
+        return md.cs.shape[0]
+    else:
+        return md.df_particles.shape[0]
+
+
+def to_compact_df(df):
+    """Compact representation of the data to plot.
+
+    The axes are stored as float32, and the cluster labels as a categorical (integer codes and a lookup of the sorted labels) instead of a column of Python objects.
+    """
+    axes = [x for x in df.columns if x != 'cluster']
+    df_compact = df[axes].astype(np.float32)
+    if 'cluster' in df.columns:
+        codes, labels = pd.factorize(df['cluster'], sort=True)
+        df_compact['cluster'] = pd.Categorical.from_codes(codes, categories=labels)
+    return df_compact
+
+
+def get_cluster_labels(df):
+    """Plot labels of the categorical cluster column (cluster_<label>) of to_compact_df() output."""
+    return df['cluster'].cat.rename_categories([f'cluster_{x}' for x in df['cluster'].cat.categories])
+
+
+def create_datatable_data(df_in):
+    groups = []
+    num_samples = []
+    if 'cluster' in df_in.columns:
+        cluster_ids = df_in['cluster'].cat.categories
+        cluster_num_samples = np.bincount(df_in['cluster'].cat.codes, minlength=len(cluster_ids))
+        groups += [f'cluter_{x}' for x in cluster_ids]
+        num_samples += [int(x) for x in cluster_num_samples]
+    groups.append('Total')
+    num_samples.append(df_in.shape[0])
+
+    data = [
+        {'datatable_groups': x, 'datatable_num_samples': y}
+        for x, y in zip(groups, num_samples)
+    ]
+
+    return data
+
+
+class LoadedDataset:
+    """In-memory data of a dataset, and the derived data structures built on demand for plotting.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        Samples to plot. One float32 column per axis, and an optional categorical 'cluster' column.
+
+    datatable_data : list of dict
+        Rows of the data statistics table.
+
+    version : int, optional
+        Version of the data, which changes whenever the underlying files change. By default 0.
+
+    coords_version : int, optional
+        Version of the coordinates (the axes), which is kept when only the cluster labels change. By default None (same as version).
+
+    metadata_file : str, optional
+        Particle metadata file (.csg or .star) of the samples, for exporting selected particles. By default None.
+
+    Attributes
+    ----------
+    df_mins, df_maxs : pandas.Series
+        Minimum and maximum of each axis.
+
+    n_dims : int
+        Number of axes (columns other than 'cluster').
+
+    hist_cache : dict
+        Binned histogram counts keyed by (axis, number of bins, color).
+
+    volume_cache : dict
+        Voxelized densities keyed by (axes, number of voxels, color).
+
+    max_categories : int
+        Integer metadata columns with at most this number of distinct values are categorical (see get_metadata_column()).
+    """
+
+    max_categories = 32
+
+    def __init__(self, df, datatable_data, version=0, metadata_file=None, coords_version=None):
+        self.df = df
+        self.datatable_data = datatable_data
+        self.version = version
+        self.coords_version = version if coords_version is None else coords_version
+        self.metadata_file = metadata_file
+        axes = df.drop('cluster', axis=1, errors='ignore').columns
+        # Column by column, so that memory-mapped columns are not copied into a 2D array
+        self.df_mins = pd.Series([df[x].to_numpy().min() if len(df) else np.nan for x in axes], index=axes, dtype=np.float64)
+        self.df_maxs = pd.Series([df[x].to_numpy().max() if len(df) else np.nan for x in axes], index=axes, dtype=np.float64)
+        self.n_dims = len(axes)
+        self.hist_cache = dict()
+        self.volume_cache = dict()
+        self._lod_indexes = dict()
+        self._sorted_orders = dict()
+        self._crossfilters = dict()
+        self._cluster_codes = None
+        self._metadata = None
+        self._metadata_nbytes = 0
+        self._metadata_columns = dict()
+
+    def save(self, outfile):
+        """Save the data as a columnar file, which from_file() memory-maps."""
+        df = self.df.drop('cluster', axis=1, errors='ignore')
+        attrs = {'datatable_data': self.datatable_data}
+        if isinstance(df.index, pd.RangeIndex):
+            attrs['index'] = {'start': df.index.start, 'step': df.index.step}
+        else:
+            df = df.assign(__index__=df.index.to_numpy())
+        if 'cluster' in self.df.columns:
+            df = df.assign(cluster=self.df['cluster'].cat.codes.to_numpy())
+            attrs['cluster_categories'] = list(self.df['cluster'].cat.categories)
+        cryopicls.data_handling.columnar.save_columnar(outfile, df, attrs=attrs)
+
+    @classmethod
+    def from_file(cls, infile, version=0, metadata_file=None, coords_version=None):
+        """Load data saved by save(). The axes are read-only memory maps of the file, which are shared by all the processes mapping it."""
+        header = cryopicls.data_handling.columnar.read_header(infile)
+        attrs, n_rows = header['attrs'], header['n_rows']
+        arrays = cryopicls.data_handling.columnar.load_columns(infile, mmap=True)
+        codes = arrays.pop('cluster', None)
+        index = arrays.pop('__index__', None)
+        if index is None:
+            index = pd.RangeIndex(attrs['index']['start'], attrs['index']['start'] + n_rows * attrs['index']['step'], attrs['index']['step'])
+        df = pd.DataFrame(arrays, index=index, copy=False)
+        if codes is not None:
+            df['cluster'] = pd.Categorical.from_codes(codes, categories=attrs['cluster_categories'])
+        return cls(df, attrs['datatable_data'], version=version, metadata_file=metadata_file, coords_version=coords_version)
+
+    @property
+    def nbytes(self):
+        """Approximate memory used by the data and the derived data structures."""
+        n_bytes = int(self.df.memory_usage(index=True, deep=True).sum())
+        n_bytes += sum(x.nbytes for x in list(self._lod_indexes.values()))
+        n_bytes += sum(x.nbytes for x in list(self._sorted_orders.values()))
+        n_bytes += sum(x.nbytes for x in list(self._crossfilters.values()))
+        n_bytes += sum(x[1].nbytes for x in list(self.volume_cache.values()))
+        if self._cluster_codes is not None:
+            n_bytes += self._cluster_codes[0].nbytes
+        n_bytes += self._metadata_nbytes
+        n_bytes += sum(x.nbytes for x in list(self._metadata_columns.values()))
+        return n_bytes
+
+    def get_version(self, color=None):
+        """Version of the data which a figure colored by color (None, 'cluster' or a metadata column) depends on.
+
+        Figures without colors only depend on the coordinates, which may be kept across reloads (see reuse()).
+        """
+        return self.coords_version if color is None else self.version
+
+    def reuse(self, previous, reuse_metadata=False):
+        """Take over the derived data structures of the data loaded before the files changed, if the coordinates did not change.
+
+        The level-of-detail indexes, sorted orders, cross-filters and uncolored histograms and volumes only depend on the coordinates.
+
+        Parameters
+        ----------
+        previous : LoadedDataset
+            The data loaded before.
+
+        reuse_metadata : bool, optional
+            Also take over the particle metadata, which did not change. By default False.
+
+        Returns
+        -------
+        bool
+            Whether the coordinates are the same and the data structures are taken over.
+        """
+
+        axes = self.df.drop('cluster', axis=1, errors='ignore').columns
+        same_coords = (
+            list(axes) == list(previous.df.drop('cluster', axis=1, errors='ignore').columns)
+            and self.df.index.equals(previous.df.index)
+            and all(np.array_equal(self.df[x].to_numpy(), previous.df[x].to_numpy()) for x in axes))
+        if reuse_metadata and self.metadata_file == previous.metadata_file:
+            self._metadata, self._metadata_nbytes = previous._metadata, previous._metadata_nbytes
+            self._metadata_columns = dict(previous._metadata_columns)
+        if not same_coords:
+            return False
+        self.coords_version = previous.coords_version
+        self._lod_indexes = dict(previous._lod_indexes)
+        self._sorted_orders = dict(previous._sorted_orders)
+        self._crossfilters = dict(previous._crossfilters)
+        self.hist_cache = {k: v for k, v in list(previous.hist_cache.items()) if k[2] is None}
+        self.volume_cache = {k: v for k, v in list(previous.volume_cache.items()) if k[2] is None}
+        return True
+
+    def get_options(self):
+        axes = self.df.drop('cluster', axis=1, errors='ignore').columns
+        options = [{'label': x, 'value': x} for x in axes]
+        return options
+
+    def get_range(self, axis, margin=0.5):
+        vmin = float(self.df_mins[axis]) - margin
+        vmax = float(self.df_maxs[axis]) + margin
+        return [vmin, vmax]
+
+    def get_lod_index(self, axes):
+        key = tuple(axes)
+        if key not in self._lod_indexes:
+            self._lod_indexes[key] = cryopicls.visualization.lod.GridIndex(self.df[list(axes)].to_numpy())
+        return self._lod_indexes[key]
+
+    def get_sorted_order(self, axis):
+        """Row positions sorting the values of the axis."""
+        if axis not in self._sorted_orders:
+            self._sorted_orders[axis] = np.argsort(self.df[axis].to_numpy(), kind='stable')
+        return self._sorted_orders[axis]
+
+    def get_crossfilter(self, axes, n_bins=50):
+        """CrossFilter of the axes, binned over the range of each axis."""
+        key = (tuple(axes), n_bins)
+        if key not in self._crossfilters:
+            self._crossfilters[key] = cryopicls.visualization.crossfilter.CrossFilter(
+                [self.df[x].to_numpy() for x in axes],
+                value_ranges=[[self.df_mins[x], self.df_maxs[x]] for x in axes],
+                n_bins=n_bins)
+        return self._crossfilters[key]
+
+    def get_metadata(self):
+        """Particle metadata of all the samples (before stride), loaded on first access."""
+        assert self.metadata_file is not None, 'No particle metadata file is given.'
+        if self._metadata is None:
+            md = load_metadata(self.metadata_file)
+            n_samples = self.datatable_data[-1]['datatable_num_samples']
+            assert get_num_particles(md) == n_samples, f'Mismatch in the number of samples. metadata: {get_num_particles(md)}, data: {n_samples}'
+            self._metadata = md
+            if isinstance(md, cryopicls.data_handling.cryosparc.CryoSPARCMetaData):
+                self._metadata_nbytes = md.cs.nbytes + (md.passthrough.nbytes if md.passthrough is not None else 0)
+            else:
+                self._metadata_nbytes = int(md.df_particles.memory_usage(index=True, deep=True).sum())
+        return self._metadata
+
+    def get_metadata_columns(self):
+        """Column names of the particle metadata, or an empty list without a metadata file."""
+        if self.metadata_file is None:
+            return []
+        return get_metadata_columns(self.metadata_file)
+
+    def get_metadata_column(self, column):
+        """Values of a particle metadata column for the samples (rows of df), loaded on first access.
+
+        Only the column is read from the metadata file, and only the rows of the samples are kept (i.e. the stride is applied).
+        Non-numerical columns, and integer columns with at most max_categories distinct values (e.g. optics groups), are pandas.Categorical.
+        """
+        assert self.metadata_file is not None, 'No particle metadata file is given.'
+        if column not in self._metadata_columns:
+            values = load_metadata_column(self.metadata_file, column)
+            n_samples = self.datatable_data[-1]['datatable_num_samples']
+            assert len(values) == n_samples, f'Mismatch in the number of samples. metadata: {len(values)}, data: {n_samples}'
+            # Row labels of the data are the sample indices in the metadata
+            values = np.asarray(values[self.df.index.to_numpy()])
+            if values.dtype.kind == 'S':
+                values = values.astype(str)
+            if values.dtype.kind not in 'biuf' or (values.dtype.kind in 'biu' and len(np.unique(values)) <= self.max_categories):
+                values = pd.Categorical(values)
+            self._metadata_columns[column] = values
+        return self._metadata_columns[column]
+
+    def get_cluster_codes(self):
+        """Integer codes of df['cluster'] and the cluster names, in the order of the names."""
+        if self._cluster_codes is None:
+            self._cluster_codes = (self.df['cluster'].cat.codes.to_numpy(), list(self.df['cluster'].cat.categories))
+        return self._cluster_codes
+
+
+def get_version(signature):
+    """Version number of the data from the signature of the files (see Dataset.get_signature())."""
+    return zlib.crc32(repr(signature).encode('utf-8'))
+
+
+def get_shared_file(shared_dir, name, version):
+    return os.path.join(shared_dir, f'{urllib.parse.quote(name, safe="")}_v{version}.cpc')
+
+
+def remove_shared_file(shared_dir, name, version):
+    outfile = get_shared_file(shared_dir, name, version)
+    for file in [outfile, outfile + '.lock']:
+        try:
+            os.remove(file)
+        except FileNotFoundError:
+            pass
+
+
+class Dataset:
+    """A dataset served by the visualizer. The files are read lazily on first access.
+
+    The data is either a clustering result and/or a projection result of cryoPICLS (the cluster labels of the clustering result are assigned to the projections),
+    or the latent variables of a cryoDRGN or cryoSPARC 3DVA result.
+
+    Parameters
+    ----------
+    name : str
+        Name of the dataset, used in the page URLs.
+
+    clustering_result_file, projection_result_file : str, optional
+        Clustering and projection result files of cryoPICLS (.pkl or .cpc).
+
+    cryodrgn_z_file : str, optional
+        cryoDRGN latent variables file (z.pkl).
+
+    threedva_csg_file : str, optional
+        cryoSPARC 3D variability job .csg result group file.
+
+    stride : int, optional
+        Only use one in every stride number of samples. By default 1.
+
+    columns : list of str, optional
+        Only load these columns (axes). By default None (all the columns).
+
+    metadata_file : str, optional
+        Particle metadata file (.csg or .star) of the samples, for exporting selected particles.
+        By default None, which is the 3DVA .csg file for a 3DVA result.
+
+    Attributes
+    ----------
+    data : LoadedDataset or None
+        The loaded data, None if not loaded (yet, or evicted).
+
+    version : int
+        Version of the data, derived from the modification times and sizes of the files (see get_signature()),
+        so that it changes whenever the files change, and is the same in all the worker processes of a multi-worker server.
+    """
+
+    def __init__(self, name, clustering_result_file=None, projection_result_file=None,
+                 cryodrgn_z_file=None, threedva_csg_file=None, stride=1, columns=None, metadata_file=None):
+        assert clustering_result_file or projection_result_file or cryodrgn_z_file or threedva_csg_file, \
+            f'Dataset {name}: Must specify a clustering result, a projection result, a cryoDRGN z file or a 3DVA csg file.'
+        for file in [clustering_result_file, projection_result_file, cryodrgn_z_file, threedva_csg_file]:
+            assert file is None or os.path.exists(file), f'Dataset {name}: {file} : File not found.'
+        assert stride > 0, f'Dataset {name}: stride must be a positive integer number.'
+        if metadata_file is None and threedva_csg_file and not (clustering_result_file or projection_result_file or cryodrgn_z_file):
+            metadata_file = threedva_csg_file
+        if metadata_file is not None:
+            assert os.path.exists(metadata_file), f'Dataset {name}: {metadata_file} : File not found.'
+            assert os.path.splitext(metadata_file)[1] in ['.csg', '.star'], f'Dataset {name}: {metadata_file} is neither a cryoSPARC group file nor a RELION star file!'
+        self.name = name
+        self.clustering_result_file = clustering_result_file
+        self.projection_result_file = projection_result_file
+        self.cryodrgn_z_file = cryodrgn_z_file
+        self.threedva_csg_file = threedva_csg_file
+        self.stride = stride
+        self.columns = columns
+        self.metadata_file = metadata_file
+        self.data = None
+        self.version = 0
+        self._signature = None
+        self._lock = threading.Lock()
+        # Serializes reloads, without blocking the requests which use the current data
+        self._reload_lock = threading.Lock()
+
+    def get_files(self):
+        """(label, file) of the files the dataset is read from."""
+        if self.clustering_result_file or self.projection_result_file:
+            files = [('Clustering result', self.clustering_result_file), ('Projection result', self.projection_result_file)]
+        elif self.cryodrgn_z_file:
+            files = [('cryoDRGN result', self.cryodrgn_z_file)]
+        else:
+            files = [('3DVA result', self.threedva_csg_file)]
+        return [(label, file) for label, file in files if file]
+
+    def get_signature(self):
+        """(file, modification time, size) of the files of the dataset, including the metadata file. Missing files have None."""
+        files = [file for _, file in self.get_files()]
+        if self.metadata_file and self.metadata_file not in files:
+            files.append(self.metadata_file)
+        signature = []
+        for file in files:
+            try:
+                stat = os.stat(file)
+                signature.append((file, stat.st_mtime_ns, stat.st_size))
+            except FileNotFoundError:
+                signature.append((file, None, None))
+        return tuple(signature)
+
+    def is_stale(self):
+        """Whether the files changed since the data was loaded."""
+        return self.data is not None and self.get_signature() != self._signature
+
+    def load(self, version=None):
+        """Read the files, and return the data as a LoadedDataset labeled with version (by default self.version)."""
+        df_clustering = pd.DataFrame()
+        df_projection = pd.DataFrame()
+
+        if self.clustering_result_file:
+            if self.projection_result_file:
+                # Only the cluster labels are used in combination with a projection result.
+                df_clustering = read_result_file(self.clustering_result_file, columns=[])
+            else:
+                df_clustering = read_result_file(self.clustering_result_file, columns=self.columns)
+
+        if self.projection_result_file:
+            df_projection = read_result_file(self.projection_result_file, columns=self.columns)
+
+        if (not df_clustering.empty) and (not df_projection.empty):
+            assert df_clustering.shape[0] == df_projection.shape[0], f'Mismatch in the nubmer of samples. clustering: {df_clustering.shape[0]}, projection: {df_projection.shape[0]}'
+            # Assign cluster labels to projections, and use them for plotting.
+            df = df_projection.join(df_clustering['cluster'])
+        elif not df_clustering.empty:
+            df = df_clustering
+        elif not df_projection.empty:
+            df = df_projection
+        elif self.cryodrgn_z_file:
+            df = load_latent_variables_cryodrgn(self.cryodrgn_z_file)
+        else:
+            df = load_latent_variables_threedva(self.threedva_csg_file)
+
+        if self.columns and not (self.clustering_result_file or self.projection_result_file):
+            df = df[self.columns]
+
+        df = to_compact_df(df)
+
+        datatable_data = create_datatable_data(df)
+
+        if self.stride > 1:
+            df = df[::self.stride].copy()
+
+        if 'cluster' in df.columns:
+            df['cluster'] = get_cluster_labels(df).cat.remove_unused_categories()
+
+        return LoadedDataset(df, datatable_data, version=self.version if version is None else version, metadata_file=self.metadata_file)
+
+    def load_labels(self, previous, version=None):
+        """Read only the cluster labels of the clustering result, and combine them with the coordinates of previous.
+
+        Used when the clustering result changed but the projection result (the coordinates) did not.
+
+        Parameters
+        ----------
+        previous : LoadedDataset
+            The data loaded before the clustering result changed.
+
+        version : int, optional
+            Version of the data. By default None (self.version).
+
+        Returns
+        -------
+        LoadedDataset
+            The data with the new cluster labels, sharing the coordinates of previous.
+        """
+
+        df_clustering = to_compact_df(read_result_file(self.clustering_result_file, columns=[]))
+        n_samples = previous.datatable_data[-1]['datatable_num_samples']
+        assert df_clustering.shape[0] == n_samples, f'Mismatch in the nubmer of samples. clustering: {df_clustering.shape[0]}, projection: {n_samples}'
+        datatable_data = create_datatable_data(df_clustering)
+        # Row labels of the data are the sample indices
+        df = previous.df.drop('cluster', axis=1, errors='ignore').copy(deep=False)
+        df['cluster'] = df_clustering['cluster'].array[df.index.to_numpy()]
+        df['cluster'] = get_cluster_labels(df).cat.remove_unused_categories()
+        return LoadedDataset(df, datatable_data, version=self.version if version is None else version, metadata_file=self.metadata_file)
+
+    def load_shared(self, shared_dir, load=None, version=None):
+        """Load the data through a columnar file in shared_dir, which is shared by all the processes of a multi-worker server.
+
+        The first process to access the dataset reads the files and writes the columnar file, under a file lock.
+        The others wait for it, and all of them memory-map the same file instead of each keeping a copy of the data.
+        load (a function returning a LoadedDataset) reads the files. By default None (load()).
+        version is the version of the data, which names the columnar file. By default None (self.version).
+        """
+        # fcntl is Unix only. The registry is usable without a shared directory on the other platforms.
+        import fcntl
+        if version is None:
+            version = self.version
+        outfile = get_shared_file(shared_dir, self.name, version)
+        with open(outfile + '.lock', 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                if not os.path.exists(outfile):
+                    tmpfile = f'{outfile}.{os.getpid()}.tmp'
+                    (load or (lambda: self.load(version=version)))().save(tmpfile)
+                    os.replace(tmpfile, outfile)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+        return LoadedDataset.from_file(outfile, version=version, metadata_file=self.metadata_file)
+
+    def get_data(self, shared_dir=None):
+        """The loaded data. The files are read on first access.
+
+        Parameters
+        ----------
+        shared_dir : str, optional
+            Directory of the columnar files shared between processes (see load_shared()). By default None (private data of this process).
+        """
+        with self._lock:
+            if self.data is None:
+                # The signature is taken before reading, so that changes during the reading are detected later.
+                self._signature = self.get_signature()
+                self.version = get_version(self._signature)
+                self.data = self.load_shared(shared_dir) if shared_dir else self.load()
+            return self.data
+
+    def reload(self, shared_dir=None):
+        """Reload the data after the files changed, and swap it in. Requests keep using the current data until then.
+
+        If only the clustering result changed in combination with a projection result, only the cluster labels are read.
+        If the coordinates did not change, the data structures derived from them (indexes, uncolored histograms, ...) are taken over,
+        and so are the figures without colors in the figure cache (see LoadedDataset.get_version()).
+
+        Parameters
+        ----------
+        shared_dir : str, optional
+            Directory of the columnar files shared between processes (see load_shared()). By default None.
+
+        Returns
+        -------
+        bool
+            Whether the data was reloaded.
+        """
+
+        with self._reload_lock:
+            previous, previous_signature = self.data, self._signature
+            signature = self.get_signature()
+            if previous is None or signature == previous_signature:
+                return False
+            changed = set(x[0] for x, y in zip(signature, previous_signature) if x != y)
+            version = get_version(signature)
+
+            labels_only = (
+                self.clustering_result_file and self.projection_result_file and 'cluster' in previous.df.columns
+                and changed <= {self.clustering_result_file})
+            if labels_only:
+                load = lambda: self.load_labels(previous, version=version)
+            else:
+                load = lambda: self.load(version=version)
+            data = self.load_shared(shared_dir, load=load, version=version) if shared_dir else load()
+            data.reuse(previous, reuse_metadata=self.metadata_file not in changed)
+
+            # The version is that of the data, for the requests reading both (e.g. the figure cache keys)
+            with self._lock:
+                self.data, self._signature, self.version = data, signature, version
+            if shared_dir and previous.version != version:
+                # Mapped by the processes still using it, which keep their mapping
+                remove_shared_file(shared_dir, self.name, previous.version)
+            return True
+
+    def unload(self):
+        """Release the loaded data. Requests still using it keep their reference until they finish."""
+        with self._lock:
+            self.data = None
+
+
+class DatasetRegistry:
+    """Datasets served by the visualizer, loaded lazily and evicted in least recently used order above a memory cap.
+
+    Parameters
+    ----------
+    max_bytes : int, optional
+        Memory cap of the loaded datasets. The most recently accessed dataset is never evicted, even if it alone exceeds the cap.
+        By default None (no cap).
+
+    shared_dir : str, optional
+        Directory of the columnar files through which the datasets are shared between the worker processes of a multi-worker server.
+        By default None (each process keeps its own data).
+    """
+
+    def __init__(self, max_bytes=None, shared_dir=None):
+        self.max_bytes = max_bytes
+        self.shared_dir = shared_dir
+        self._datasets = dict()
+        # Dataset names from the least to the most recently accessed
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, name):
+        return name in self._datasets
+
+    def __len__(self):
+        return len(self._datasets)
+
+    def register(self, dataset):
+        assert dataset.name not in self._datasets, f'Dataset {dataset.name} is already registered.'
+        with self._lock:
+            self._datasets[dataset.name] = dataset
+            self._lru[dataset.name] = None
+
+    def get_dataset(self, name):
+        return self._datasets[name]
+
+    def get_datasets(self):
+        """All the datasets, in the order of registration."""
+        return list(self._datasets.values())
+
+    def get(self, name):
+        """The loaded data of a dataset. Loads it if needed, then evicts other datasets above the memory cap."""
+        dataset = self._datasets[name]
+        data = dataset.get_data(shared_dir=self.shared_dir)
+        with self._lock:
+            self._lru.move_to_end(name)
+            self._evict(keep=name)
+        return data
+
+    def reload_stale(self):
+        """Reload the loaded datasets whose files changed. Returns the names of the reloaded datasets."""
+        reloaded = []
+        for dataset in self.get_datasets():
+            if dataset.is_stale() and dataset.reload(shared_dir=self.shared_dir):
+                reloaded.append(dataset.name)
+        return reloaded
+
+    def watch(self, interval=2.0):
+        """Start a daemon thread which watches the files of the loaded datasets, and reloads them in the background when they change.
+
+        A dataset is reloaded once its files are unchanged for interval seconds, so that a result file being written is not read.
+        A failed reload (e.g. of a file being replaced) is retried.
+
+        Parameters
+        ----------
+        interval : float, optional
+            Interval (s) between the checks of the files. By default 2.0.
+
+        Returns
+        -------
+        threading.Thread
+            The watcher thread.
+        """
+
+        def run():
+            pending = dict()
+            while True:
+                time.sleep(interval)
+                for dataset in self.get_datasets():
+                    if not dataset.is_stale():
+                        pending.pop(dataset.name, None)
+                        continue
+                    signature = dataset.get_signature()
+                    if pending.get(dataset.name) != signature:
+                        # Changed since the last check, wait until the files are settled
+                        pending[dataset.name] = signature
+                        continue
+                    try:
+                        if dataset.reload(shared_dir=self.shared_dir):
+                            print(f'Reloaded dataset {dataset.name} (version {dataset.version}).')
+                    except Exception as e:
+                        print(f'Failed to reload dataset {dataset.name}: {e}', file=sys.stderr)
+                    pending.pop(dataset.name, None)
+
+        thread = threading.Thread(target=run, name='dataset-watcher', daemon=True)
+        thread.start()
+        return thread
+
+    @property
+    def nbytes(self):
+        """Approximate memory used by the loaded datasets."""
+        return sum(x.data.nbytes for x in self.get_datasets() if x.data is not None)
+
+    def _evict(self, keep):
+        if self.max_bytes is None:
+            return
+        loaded = [(x, self._datasets[x].data) for x in self._lru if self._datasets[x].data is not None]
+        n_bytes = sum(data.nbytes for _, data in loaded)
+        for name, data in loaded:
+            if n_bytes <= self.max_bytes:
+                break
+            if name == keep:
+                continue
+            self._datasets[name].unload()
+            n_bytes -= data.nbytes
@@ -0,0 +1,100 @@
+import numpy as np
+
+
+def points_in_box(x, y, x_range, y_range):
+    """Whether each point is inside an axis-aligned box (boundaries included).
+
+    Parameters
+    ----------
+    x, y : ndarray of shape (n_samples, )
+        Coordinates of the points.
+
+    x_range, y_range : [min, max]
+        Ranges of the box.
+
+    Returns
+    -------
+    ndarray of shape (n_samples, )
+        Boolean mask of the points inside the box.
+    """
+
+    x_min, x_max = sorted(x_range)
+    y_min, y_max = sorted(y_range)
+    return (x_min <= x) & (x <= x_max) & (y_min <= y) & (y <= y_max)
+
+
+def points_in_polygon(x, y, polygon_x, polygon_y, y_order=None):
+    """Whether each point is inside a polygon (even-odd rule).
+
+    A horizontal ray is cast to the right from each point, and the number of polygon edges it crosses is counted.
+    The points are sorted by y, so that the points whose ray can cross an edge are a contiguous slice found by binary search,
+    and each edge costs one vectorized operation over that slice only.
+
+    Parameters
+    ----------
+    x, y : ndarray of shape (n_samples, )
+        Coordinates of the points.
+
+    polygon_x, polygon_y : array-like of shape (n_vertices, )
+        Vertices of the polygon. The polygon is closed automatically.
+
+    y_order : ndarray of shape (n_samples, ), optional
+        Indices sorting y (np.argsort(y)). Pass it to reuse the sort across queries. By default None (computed here).
+
+    Returns
+    -------
+    ndarray of shape (n_samples, )
+        Boolean mask of the points inside the polygon.
+    """
+
+    if y_order is None:
+        y_order = np.argsort(y, kind='stable')
+    y_sorted = y[y_order]
+    x_sorted = x[y_order]
+
+    polygon_x = np.asarray(polygon_x, dtype=np.float64)
+    polygon_y = np.asarray(polygon_y, dtype=np.float64)
+    # Position of each vertex in the sorted y. Searched in the dtype of y, so that y is not converted on every search.
+    bounds = np.searchsorted(y_sorted, polygon_y.astype(y_sorted.dtype), side='left')
+    inside = np.zeros(len(y_order), dtype=bool)
+    for i in range(len(polygon_x)):
+        x1, y1, x2, y2 = polygon_x[i - 1], polygon_y[i - 1], polygon_x[i], polygon_y[i]
+        if y1 == y2:
+            continue
+        # Points with min(y1, y2) <= y < max(y1, y2), i.e. (y1 > y) != (y2 > y)
+        start, stop = sorted([bounds[i - 1], bounds[i]])
+        x_cross = x1 + (y_sorted[start:stop] - y1) * ((x2 - x1) / (y2 - y1))
+        inside[start:stop] ^= x_sorted[start:stop] < x_cross
+
+    mask = np.zeros(len(y_order), dtype=bool)
+    mask[y_order] = inside
+    return mask
+
+
+def resolve_selection(x, y, selection, y_order=None):
+    """Resolve a plotly box or lasso selection against all the points.
+
+    Parameters
+    ----------
+    x, y : ndarray of shape (n_samples, )
+        Coordinates of the points.
+
+    selection : dict
+        Selection in the format of the selectedData property of a dash graph.
+        Either {'range': {'x': [min, max], 'y': [min, max]}} (box) or {'lassoPoints': {'x': [...], 'y': [...]}} (lasso).
+
+    y_order : ndarray of shape (n_samples, ), optional
+        Indices sorting y, passed to points_in_polygon(). By default None.
+
+    Returns
+    -------
+    ndarray of shape (n_samples, )
+        Boolean mask of the selected points.
+    """
+
+    if 'lassoPoints' in selection:
+        return points_in_polygon(x, y, selection['lassoPoints']['x'], selection['lassoPoints']['y'], y_order=y_order)
+    elif 'range' in selection:
+        return points_in_box(x, y, selection['range']['x'], selection['range']['y'])
+    else:
+        raise ValueError(f'Unknown selection: {list(selection)}')
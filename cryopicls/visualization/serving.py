@@ -0,0 +1,81 @@
+import os
+import sys
+import signal
+import socket
+
+import werkzeug.serving
+
+
+def serve_workers(wsgi_app, host, port, n_workers, on_worker_start=None):
+    """Serve a WSGI app from several pre-forked worker processes sharing one listening socket.
+
+    The kernel distributes the incoming connections between the workers, so that a slow request (e.g. building a large figure)
+    in one worker does not block the requests handled by the others. Each worker is a threaded werkzeug server.
+    Workers which die are restarted. SIGINT or SIGTERM to the parent stops all the workers.
+
+    Parameters
+    ----------
+    wsgi_app : callable
+        WSGI application (e.g. the flask server of a dash app).
+
+    host : str
+        Host address to listen on.
+
+    port : int
+        Port number to listen on.
+
+    n_workers : int
+        Number of worker processes.
+
+    on_worker_start : callable, optional
+        Called without arguments in each worker process after the fork. By default None.
+    """
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(128)
+    sock.set_inheritable(True)
+
+    def start_worker():
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            if on_worker_start is not None:
+                on_worker_start()
+            server = werkzeug.serving.make_server(host, port, wsgi_app, threaded=True, fd=sock.fileno())
+            server.serve_forever()
+            os._exit(0)
+        return pid
+
+    pids = set(start_worker() for _ in range(n_workers))
+    print(f'Serving on http://{host}:{port} with {n_workers} worker processes (pids {sorted(pids)})')
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    while pids:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        pids.discard(pid)
+        if not stopping:
+            print(f'Worker {pid} exited with status {status}, restarting it.', file=sys.stderr)
+            pids.add(start_worker())
+
+    sock.close()
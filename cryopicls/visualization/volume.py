@@ -0,0 +1,119 @@
+import numpy as np
+
+
+def voxelize(x, y, z, ranges, n_voxels, codes=None, n_codes=1):
+    """Count samples per voxel (and per group) on a regular 3D grid, with a single vectorized bincount.
+
+    Parameters
+    ----------
+    x, y, z : ndarray of shape (n_samples, )
+        Coordinates of the samples.
+
+    ranges : list of [min, max]
+        Data range covered by the grid along x, y and z. Samples outside the ranges are ignored.
+
+    n_voxels : int
+        Number of voxels along each axis.
+
+    codes : ndarray of shape (n_samples, ), optional
+        Integer group codes (e.g. cluster) in [0, n_codes). By default None (a single group).
+
+    n_codes : int, optional
+        Number of groups. By default 1.
+
+    Returns
+    -------
+    edges : list of ndarray of shape (n_voxels + 1, )
+        Voxel edges along x, y and z.
+
+    counts : ndarray of shape (n_codes, n_voxels, n_voxels, n_voxels)
+        Number of samples of each group in each voxel, indexed by [code, x, y, z].
+    """
+
+    edges = []
+    voxel = np.zeros(len(x), dtype=np.int64)
+    mask = np.ones(len(x), dtype=bool)
+    for values, value_range in zip([x, y, z], ranges):
+        vmin, vmax = sorted(value_range)
+        if vmax == vmin:
+            vmin, vmax = vmin - 0.5, vmax + 0.5
+        edges.append(np.linspace(vmin, vmax, n_voxels + 1))
+        values = np.asarray(values, dtype=np.float64)
+        idxs = np.floor((values - vmin) * (n_voxels / (vmax - vmin))).astype(np.int64)
+        # The maximum value belongs to the last voxel, as with numpy.histogram
+        idxs[(idxs == n_voxels) & (values <= vmax)] = n_voxels - 1
+        mask &= (0 <= idxs) & (idxs < n_voxels)
+        voxel = voxel * n_voxels + idxs
+    voxel = voxel[mask]
+    if codes is not None:
+        voxel += np.asarray(codes)[mask].astype(np.int64) * n_voxels ** 3
+    counts = np.bincount(voxel, minlength=n_codes * n_voxels ** 3)
+    return edges, counts.reshape(n_codes, n_voxels, n_voxels, n_voxels)
+
+
+def smooth(volume):
+    """Smooth a volume with the binomial filter [1, 2, 1] / 4 along each axis, which suppresses the noise of sparse voxels.
+
+    Parameters
+    ----------
+    volume : ndarray of shape (nx, ny, nz)
+        Volume to smooth.
+
+    Returns
+    -------
+    ndarray of shape (nx, ny, nz)
+        Smoothed volume (float64). The total is preserved except at the borders.
+    """
+
+    volume = np.asarray(volume, dtype=np.float64)
+    for axis in range(volume.ndim):
+        padded = np.pad(volume, [(1, 1) if i == axis else (0, 0) for i in range(volume.ndim)])
+        n = volume.shape[axis]
+        volume = (padded.take(range(0, n), axis=axis) + 2 * padded.take(range(1, n + 1), axis=axis)
+                  + padded.take(range(2, n + 2), axis=axis)) / 4
+    return volume
+
+
+def quantize(volume):
+    """Scale a volume to integers in [0, 255] relative to its maximum, which keeps the browser payload small.
+
+    Parameters
+    ----------
+    volume : ndarray
+        Non-negative volume.
+
+    Returns
+    -------
+    ndarray (uint8)
+        Quantized volume of the same shape.
+    """
+
+    vmax = volume.max() if volume.size > 0 else 0
+    if vmax <= 0:
+        return np.zeros(volume.shape, dtype=np.uint8)
+    return np.round(volume * (255 / vmax)).astype(np.uint8)
+
+
+def crop(volume):
+    """Crop a volume to the bounding box of its non-zero voxels.
+
+    Parameters
+    ----------
+    volume : ndarray of shape (nx, ny, nz)
+        Volume to crop.
+
+    Returns
+    -------
+    offsets : list of int
+        Index of the first voxel of the cropped volume along each axis.
+
+    cropped : ndarray
+        Cropped volume. Empty if all the voxels are zero.
+    """
+
+    nonzero = np.nonzero(volume)
+    if len(nonzero[0]) == 0:
+        return [0] * volume.ndim, volume[tuple(slice(0, 0) for _ in range(volume.ndim))]
+    offsets = [int(x.min()) for x in nonzero]
+    slices = tuple(slice(x.min(), x.max() + 1) for x in nonzero)
+    return offsets, volume[slices]
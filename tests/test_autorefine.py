@@ -0,0 +1,137 @@
+"""Tests of the cryoSPARC auto-refinement against the in-process cryoSPARC simulator"""
+
+import os
+import sys
+sys.path.append('../')
+import json
+import shutil
+import argparse
+
+import pytest
+
+from cryopicls.autorefine import batch
+from cryopicls.autorefine import cryosparc
+from cryopicls.autorefine import simulator
+from cryopicls.autorefine import transfer
+from cryopicls.autorefine import transport
+from cryopicls import cryopicls_autorefine_cryosparc
+
+result_dir = 'tests/cryosparc_autorefine'
+
+
+@pytest.fixture
+def result_groups(tmp_path):
+    out_dir = tmp_path / 'result'
+    shutil.copytree(result_dir, out_dir)
+    return sorted(str(x) for x in out_dir.glob('*_particles.csg'))
+
+
+def get_com(sim):
+    return cryosparc.CryoSPARCCom(
+        None, None, None, 'user@example.com', print_com=False, sleep_time=0.01,
+        transport=transport.SimulatorTransport(sim))
+
+
+def get_args(csg_files, tmp_path, consensus_job_uid, max_jobs_in_flight=0):
+    return argparse.Namespace(
+        cryopicls_result_dir=os.path.dirname(csg_files[0]), cryopicls_result_basename='cryopicls',
+        cache_dir=str(tmp_path / 'cache'), csparc_project_uid='P1', csparc_workspace_uid='', csparc_workspace_title='test',
+        csparc_lane='default', csparc_refine_symmetry='C1', csparc_abinitio=False, csparc_abinitio_symmetry='C1',
+        csparc_consensus_job_uid=consensus_job_uid, max_jobs_in_flight=max_jobs_in_flight, no_resume=False,
+        poll_interval_min=0.01, poll_interval_max=0.05,
+    )
+
+
+def test_batch():
+    sim = simulator.CryoSPARCSimulator(default_duration=0.05)
+    com = get_com(sim)
+    assert com.csparc_user_id == 'user_user@example.com'
+
+    workspace_uid, job_uid_1, job_uid_2, _ = com.run_batch([
+        com.make_workspace_op('P1'),
+        com.make_job_op('homo_reconstruct', 'P1', batch.ref(0)),
+        com.make_job_op('homo_refine_new', 'P1', batch.ref(0), input_group_connects={'volume': f'{batch.ref(1)}.volume'}),
+        com.enqueue_job_op('P1', batch.ref(1)),
+    ])
+    assert sim.jobs[job_uid_2]['workspace_uid'] == workspace_uid
+    assert sim.jobs[job_uid_2]['parents'] == [job_uid_1]
+    assert com.get_job_statuses([('P1', job_uid_1), ('P1', job_uid_2)])[1] == 'building'
+    # 1 GetUser, 1 batch, 1 status query
+    assert len(com.latencies) == 3
+
+    # Shell commands on the master node. Only cryosparcm cli is simulated.
+    assert com.sshcom("cryosparcm cli \"GetUser('user@example.com')['_id']\"") == 'user_user@example.com'
+    with pytest.raises(AssertionError):
+        com.sshcom('ls')
+
+    com.enqueue_job('P1', job_uid_2)
+    assert com.wait_job_complete('P1', job_uid_2) == 'completed'
+
+    # An operation failing stops the batch
+    with pytest.raises(AssertionError):
+        com.run_batch([com.enqueue_job_op('P1', job_uid_2)])
+
+
+def test_autorefine(result_groups, tmp_path):
+    sim = simulator.CryoSPARCSimulator(
+        job_durations={'import_result_group': 0.05, 'homo_reconstruct': 0.1, 'homo_refine_new': 0.2})
+    args = get_args(result_groups, tmp_path, sim.add_job('homo_refine_new'), max_jobs_in_flight=1)
+    com = get_com(sim)
+
+    cryopicls_autorefine_cryosparc.run(args, com, result_groups)
+
+    # One chain of 3 jobs per result group, one job at a time
+    assert sim.calls['make_job'] == 3 * len(result_groups)
+    assert sim.max_running == 1
+    with open(os.path.join(args.cryopicls_result_dir, 'cryopicls_autorefine_journal.json')) as f:
+        journal = json.load(f)
+    assert len(journal['groups']) == len(result_groups)
+    for steps in journal['groups'].values():
+        assert [x['status'] for x in steps.values()] == ['completed'] * 3
+        assert sim.jobs[steps['refine']['job_uid']]['parents'] == [steps['reconstruct']['job_uid']]
+    # Transferred to the cache directory
+    assert len(os.listdir(args.cache_dir)) == 3 * len(result_groups)
+
+
+def test_autorefine_resume(result_groups, tmp_path):
+    # The first refinement fails once
+    failed = []
+
+    def fail_jobs(job):
+        if job['job_type'] == 'homo_refine_new' and len(failed) == 0:
+            failed.append(job['uid'])
+            return True
+        return False
+
+    sim = simulator.CryoSPARCSimulator(default_duration=0.05, fail_jobs=fail_jobs)
+    args = get_args(result_groups, tmp_path, sim.add_job('homo_refine_new'))
+
+    with pytest.raises(SystemExit):
+        cryopicls_autorefine_cryosparc.run(args, get_com(sim), result_groups)
+    assert sim.calls['make_job'] == 3 * len(result_groups)
+
+    # Only the failed refinement is made again
+    cryopicls_autorefine_cryosparc.run(args, get_com(sim), result_groups)
+    assert sim.calls['make_job'] == 3 * len(result_groups) + 1
+    assert sim.calls['create_empty_workspace'] == 1
+    n_completed = sum(x['status'] == 'completed' and x['job_type'] == 'homo_refine_new' for x in sim.jobs.values())
+    assert n_completed == len(result_groups) + 1
+
+
+def test_transfer(result_groups, tmp_path):
+    cache_dir = str(tmp_path / 'cache')
+    ret = transfer.transfer_files(result_groups, cache_dir, mode='copy')
+    assert [x[1] for x in ret] == ['copy'] * len(result_groups)
+
+    # Unchanged files are skipped
+    ret = transfer.transfer_files(result_groups, cache_dir, verify='checksum')
+    assert [x[1] for x in ret] == ['skipped'] * len(result_groups)
+
+    # Changed files are transferred again
+    with open(result_groups[0], 'a') as f:
+        f.write('\n')
+    ret = transfer.transfer_files(result_groups, cache_dir)
+    assert ret[0][1] in ['hardlink', 'reflink', 'copy']
+    assert [x[1] for x in ret[1:]] == ['skipped'] * (len(result_groups) - 1)
+    with open(result_groups[0], 'rb') as f_src, open(ret[0][0], 'rb') as f_dst:
+        assert f_src.read() == f_dst.read()
@@ -71,3 +71,29 @@ def test_gmeans(input):
         # random_state=0
     )
     run(model, input, 'g-means')
+
+
+def test_autogmm_telemetry(input):
+    events = []
+    telemetry = cryopicls.clustering.telemetry.FitTelemetry(
+        handlers=[events.append, cryopicls.clustering.telemetry.ProgressHandler(interval=0)])
+    model = cryopicls.clustering.autogmm.AutoGMMClustering(k_min=2, k_max=4, n_init=2, max_iter=5, random_state=0)
+    model.fit(input, telemetry=telemetry)
+
+    names = [x['event'] for x in events]
+    assert names[0] == 'fit_start' and names[-1] == 'fit_end'
+    assert names.count('k_end') == 3 and names.count('restart_end') == 3 * 2
+    assert 0 < names.count('iteration') <= 3 * 2 * 5
+    # Iterations are only passed to the handlers
+    assert len(telemetry.events) == len(events) - names.count('iteration')
+    for x in events:
+        if x['event'] == 'restart_end':
+            assert len(x['lower_bounds']) == x['n_iter'] and x['lower_bounds'][-1] == x['lower_bound']
+            assert x['converged'] or x['n_iter'] == 5
+
+    summary = telemetry.get_summary()
+    assert [x['k'] for x in summary['k']] == [2, 3, 4]
+    assert summary['n_restarts'] == 6 and all('bic' in x for x in summary['k'])
+    # The hooks are removed, and the model can be pickled
+    assert '_print_verbose_msg_iter_end' not in vars(model.gm_fit_)
+    pickle.dumps(model.gm_fit_)
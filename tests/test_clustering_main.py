@@ -1,7 +1,9 @@
 """Tests that focus on reading and writing data. Only simple k-means clustering is used."""
 
+import os
 import sys
 sys.path.append('../')
+import json
 from cryopicls.cryopicls_clustering import main
 
 z_file = 'tests/cryodrgn_z_p2_w1_j744_vae128_zdim3_seed1.pkl'
@@ -39,3 +41,34 @@ def test_cryosparc_threedvar():
     com = f"cryopicls_clustering.py k-means --cryosparc --threedvar-csg {cryosparc_threedvar} --threedvar-num-components 3 --random-state 1 --output-dir {output_dir_root}/test_cryosparc_threedvar_components3"
     sys.argv = com.split()
     main()
+
+
+def test_cryodrgn_columnar():
+    """Test columnar output, and clustering of the columnar output itself"""
+
+    com = f"cryopicls_clustering.py k-means --cryodrgn --z-file {z_file} --metadata {relion_consensus} --random-state 1 --output-format columnar --output-dir {output_dir_root}/test_cryodrgn_columnar"
+    sys.argv = com.split()
+    main()
+
+    com = f"cryopicls_clustering.py k-means --cryodrgn --z-file {output_dir_root}/test_cryodrgn_columnar/cryopicls_dataframe.cpc --metadata {relion_consensus} --random-state 1 --output-dir {output_dir_root}/test_cryodrgn_columnar_input"
+    sys.argv = com.split()
+    main()
+
+
+def test_cryodrgn_profile():
+    """Test the per-stage metrics, with the sampling profiler over the fit stage"""
+
+    output_dir = f'{output_dir_root}/test_cryodrgn_profile'
+    com = f"cryopicls_clustering.py k-means --cryodrgn --z-file {z_file} --metadata {relion_consensus} --random-state 1 --output-dir {output_dir} --profile-stage fit --profile-interval 0.001"
+    sys.argv = com.split()
+    main()
+
+    with open(f'{output_dir}/cryopicls_metrics.json') as f:
+        metrics = json.load(f)
+    assert metrics['status'] == 'completed'
+    assert list(metrics['stages']) == ['load_metadata', 'load_latent', 'fit', 'save_model', 'nearest_points', 'export_clusters', 'save_dataframe']
+    assert metrics['inputs']['n_dims'] == 3
+    assert metrics['inputs']['files'][z_file] == os.path.getsize(z_file)
+    for stage in metrics['stages'].values():
+        assert stage['n'] == 1 and stage['wall_time_s'] >= 0 and stage['peak_rss_mb'] > 0
+    assert os.path.exists(metrics['stages']['fit']['profile']['stacks_file'])
@@ -0,0 +1,61 @@
+"""Tests the columnar result file format."""
+
+import sys
+sys.path.append('../')
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+
+from cryopicls.data_handling import columnar
+
+z_file = 'tests/z_dummy_5class.pkl'
+labels_file = 'tests/z_dummy_5class_labels.pkl'
+output_dir_root = 'test_results'
+
+
+def create_dataframe():
+    with open(z_file, 'rb') as f:
+        Z = pickle.load(f)
+    with open(labels_file, 'rb') as f:
+        labels = pickle.load(f)
+    df = pd.DataFrame(data=Z, columns=[f'dim_{x}' for x in range(1, Z.shape[1] + 1)])
+    df['cluster'] = labels
+    return df
+
+
+def test_roundtrip():
+    df = create_dataframe()
+    outdir = os.path.join(output_dir_root, 'test_columnar')
+    os.makedirs(outdir, exist_ok=True)
+    outfile = os.path.join(outdir, 'roundtrip.cpc')
+    columnar.save_columnar(outfile, df, attrs={'source': 'test'})
+
+    header = columnar.read_header(outfile)
+    assert header['n_rows'] == df.shape[0]
+    assert header['attrs'] == {'source': 'test'}
+    assert (header['data_offset'] + header['columns'][-1]['offset']) % columnar.ALIGNMENT == 0
+
+    df_loaded = columnar.load_columnar(outfile)
+    assert list(df_loaded.columns) == list(df.columns)
+    assert df_loaded['dim_1'].dtype == np.float32
+    assert df_loaded['cluster'].dtype == np.int16
+    np.testing.assert_allclose(df_loaded['dim_1'], df['dim_1'], rtol=1e-6)
+    np.testing.assert_array_equal(df_loaded['cluster'], df['cluster'])
+
+
+def test_column_selection():
+    df = create_dataframe()
+    outdir = os.path.join(output_dir_root, 'test_columnar')
+    os.makedirs(outdir, exist_ok=True)
+    outfile = os.path.join(outdir, 'selection.cpc')
+    columnar.save_columnar(outfile, df)
+
+    arrays = columnar.load_columns(outfile, columns=['cluster', 'dim_2'])
+    assert list(arrays.keys()) == ['cluster', 'dim_2']
+    assert isinstance(arrays['dim_2'], np.memmap)
+    np.testing.assert_allclose(arrays['dim_2'], df['dim_2'], rtol=1e-6)
+
+    Z = columnar.load_latent_variables(outfile)
+    assert Z.shape == (df.shape[0], df.shape[1] - 1)
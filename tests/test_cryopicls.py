@@ -1,5 +1,35 @@
+import sys
+import json
+import subprocess
+
+import pytest
+
+import cryopicls
 from cryopicls import __version__
 
 
 def test_version():
     assert __version__ == '0.1.0'
+
+
+def get_imported_modules(code):
+    """Top level modules imported by code run in a fresh Python process."""
+    code += '\nimport sys, json\nprint(json.dumps(sorted(set(x.split(".")[0] for x in sys.modules))))'
+    ret = subprocess.run([sys.executable, '-c', code], stdout=subprocess.PIPE, text=True, check=True)
+    return set(json.loads(ret.stdout.splitlines()[-1]))
+
+
+def test_lazy_import():
+    # Subpackages (and their dependencies) are imported on first access
+    modules = get_imported_modules('import cryopicls')
+    assert modules.isdisjoint(['numpy', 'pandas', 'sklearn', 'pyclustering', 'umap', 'dash', 'yaml'])
+
+    modules = get_imported_modules(
+        'import sys\nsys.argv = ["cryopicls_autorefine_cryosparc", "--help"]\n'
+        'import cryopicls.cryopicls_autorefine_cryosparc as m\ntry:\n    m.main()\nexcept SystemExit:\n    pass')
+    assert modules.isdisjoint(['numpy', 'pandas', 'sklearn', 'pyclustering', 'umap', 'dash'])
+
+    assert cryopicls.clustering.kmeans.KMeansClustering is not None
+    assert 'autorefine' in dir(cryopicls) and 'telemetry' in dir(cryopicls.clustering)
+    with pytest.raises(AttributeError):
+        cryopicls.not_a_module
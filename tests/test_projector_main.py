@@ -1,6 +1,7 @@
 import sys
 sys.path.append('../')
 import os
+import json
 from cryopicls.cryopicls_projector import main
 
 z_file = 'tests/cryodrgn_z_p2_w1_j744_vae128_zdim3_seed1.pkl'
@@ -24,3 +25,20 @@ def test_cryodrgn_umap():
     com = f"cryopicls_projector.py umap --cryodrgn --z-file {z_file} --random-state 1 --output-dir {output_dir_root}/test_projector_cryodrgn_umap --n-neighbors 15 --n-components 2 --metric euclidean --min-dist 0.1"
     sys.argv = com.split()
     main()
+
+
+def test_cryodrgn_columnar():
+    com = f"cryopicls_projector.py pca --cryodrgn --z-file {z_file} --random-state 1 --output-format columnar --output-dir {output_dir_root}/test_projector_cryodrgn_columnar"
+    sys.argv = com.split()
+    main()
+    assert os.path.exists(f'{output_dir_root}/test_projector_cryodrgn_columnar/cryopicls_pca.cpc')
+
+
+def test_cryodrgn_metrics_out():
+    com = f"cryopicls_projector.py pca --cryodrgn --z-file {z_file} --random-state 1 --output-dir {output_dir_root}/test_projector_cryodrgn_metrics --metrics-out {output_dir_root}/test_projector_cryodrgn_metrics/metrics.json"
+    sys.argv = com.split()
+    main()
+    with open(f'{output_dir_root}/test_projector_cryodrgn_metrics/metrics.json') as f:
+        metrics = json.load(f)
+    assert list(metrics['stages']) == ['load_latent', 'fit_transform', 'save']
+    assert metrics['info']['n_components'] == 3
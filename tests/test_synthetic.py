@@ -0,0 +1,101 @@
+"""Tests the synthetic particle datasets. The generated files must be readable by the metadata handling classes"""
+
+import sys
+sys.path.append('../')
+import filecmp
+
+import numpy as np
+import pytest
+
+from cryopicls.data_handling import synthetic
+from cryopicls.data_handling import relion
+from cryopicls.data_handling import cryosparc
+from cryopicls.data_handling import cryodrgn
+
+n_particles = 1000
+
+
+@pytest.fixture
+def dataset(tmp_path):
+    files, labels = synthetic.generate(str(tmp_path), n_particles, n_dims=4, n_clusters=3, particles_per_micrograph=100, n_optics_groups=2, seed=1)
+    return files, labels
+
+
+def test_relion(dataset):
+    files, _ = dataset
+
+    md = relion.RelionMetaData.load(files['relion31'])
+    assert md.df_particles.shape[0] == n_particles
+    assert md.df_optics.shape[0] == 2
+    assert '_rlnOriginXAngst' in md.df_particles.columns
+    assert md.df_particles['_rlnImageName'][0].startswith('000001@')
+    defocus = relion.RelionMetaData.read_column(files['relion31'], '_rlnDefocusU')
+    assert defocus.shape == (n_particles,)
+    assert np.all((4000 < defocus) & (defocus < 31000))
+
+    md = relion.RelionMetaData.load(files['relion30'])
+    assert md.df_optics is None
+    assert md.df_particles.shape[0] == n_particles
+    assert '_rlnOriginX' in md.df_particles.columns and '_rlnVoltage' in md.df_particles.columns
+
+
+def test_cryosparc(dataset, tmp_path):
+    files, _ = dataset
+
+    md = cryosparc.CryoSPARCMetaData.load(files['cryosparc'])
+    assert md.cs.shape == md.passthrough.shape == (n_particles,)
+    assert 'alignments3D/pose' in md.cs.dtype.names
+    assert 'location/micrograph_path' in md.passthrough.dtype.names
+    np.testing.assert_array_equal(md.cs['uid'], md.passthrough['uid'])
+    np.testing.assert_array_equal(cryosparc.read_csg_column(files['cryosparc'], 'alignments3D/pose[2]'), md.cs['alignments3D/pose'][:, 2])
+    with pytest.raises(KeyError):
+        cryosparc.read_csg_column(files['cryosparc'], 'no/such_column')
+    # Rotation vectors of at most pi radians
+    assert np.all(np.linalg.norm(md.cs['alignments3D/pose'], axis=1) <= np.pi + 1e-5)
+
+    # Round trip of a subset
+    md.iloc(np.arange(10)).write(str(tmp_path / 'subset'), 'subset')
+    md_subset = cryosparc.CryoSPARCMetaData.load(str(tmp_path / 'subset' / 'subset_particles.csg'))
+    np.testing.assert_array_equal(md_subset.cs, md.cs[:10])
+
+
+def test_latent(dataset):
+    files, labels = dataset
+    assert labels.shape == (n_particles,)
+
+    Z = cryodrgn.load_latent_variables(files['cryodrgn'])
+    assert Z.shape == (n_particles, 4) and Z.dtype == np.float32
+
+    cs_file, passthrough_file = cryosparc.get_metafiles_from_csg(files['threedva'])
+    np.testing.assert_array_equal(cryosparc.load_latent_variables(cs_file), Z)
+    assert 'ctf/df1_A' in cryosparc.get_csg_columns(files['threedva'])
+
+
+def test_reproducible(dataset, tmp_path):
+    files, _ = dataset
+    files_2, _ = synthetic.generate(str(tmp_path / 'same'), n_particles, n_dims=4, n_clusters=3, particles_per_micrograph=100, n_optics_groups=2, seed=1)
+    files_3, _ = synthetic.generate(str(tmp_path / 'other'), n_particles, n_dims=4, n_clusters=3, particles_per_micrograph=100, n_optics_groups=2, seed=2)
+    assert filecmp.cmp(files['cryodrgn'], files_2['cryodrgn'], shallow=False)
+    # The star files differ only in their creation time comment
+    assert relion.RelionMetaData.load(files['relion30']).df_particles.equals(relion.RelionMetaData.load(files_2['relion30']).df_particles)
+    cs_file, _ = cryosparc.get_metafiles_from_csg(files['cryosparc'])
+    cs_file_2, _ = cryosparc.get_metafiles_from_csg(files_2['cryosparc'])
+    cs_file_3, _ = cryosparc.get_metafiles_from_csg(files_3['cryosparc'])
+    assert filecmp.cmp(cs_file, cs_file_2, shallow=False)
+    assert not filecmp.cmp(cs_file, cs_file_3, shallow=False)
+
+
+def test_pose_convention():
+    # Poses of the same particles, from cryoSPARC and converted to RELION Euler angles by pyem
+    pose = np.load('tests/cryosparc_consensus/cryosparc_P2_J744_005_particles.cs')['alignments3D/pose'].astype(np.float64)
+    df = relion.RelionMetaData.load('tests/cryosparc_P2_J744_005_particles_pyem.star').df_particles
+    euler = df[['_rlnAngleRot', '_rlnAngleTilt', '_rlnAnglePsi']].values.astype(np.float64)
+
+    # Quaternions q of the particles, such that _quaternion_to_rotvec(q) gives the cryoSPARC poses (the inverse rotations)
+    angle = np.linalg.norm(pose, axis=1)
+    axis = pose / np.maximum(angle, 1e-12)[:, None]
+    q = np.concatenate([np.cos(angle / 2)[:, None], -axis * np.sin(angle / 2)[:, None]], axis=1)
+
+    diff = np.abs((np.stack(synthetic._quaternion_to_euler_zyz(q), axis=1) - euler + 180) % 360 - 180)
+    assert np.all(diff < 1e-3)
+    np.testing.assert_allclose(synthetic._quaternion_to_rotvec(q), pose, atol=1e-5)
@@ -0,0 +1,267 @@
+"""Tests the data processing behind the visualizer views. Use a toy 2D dataset of 5 gaussian blobs"""
+
+import os
+import sys
+sys.path.append('../')
+import pickle
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from cryopicls.visualization import lod
+from cryopicls.visualization import raster
+from cryopicls.visualization import histogram
+from cryopicls.visualization import figure_cache
+from cryopicls.visualization import registry
+from cryopicls.visualization import selection
+from cryopicls.visualization import crossfilter
+from cryopicls.visualization import volume
+
+z_file = 'tests/z_dummy_5class.pkl'
+
+
+@pytest.fixture
+def input():
+    with open(z_file, 'rb') as f:
+        Z = pickle.load(f)
+    return Z
+
+
+def test_lod_budget(input):
+    index = lod.GridIndex(input)
+    idxs = index.query(max_points=500)
+    assert 0 < len(idxs) <= 500
+    assert len(np.unique(idxs)) == len(idxs)
+
+    idxs = index.query(max_points=input.shape[0])
+    np.testing.assert_array_equal(idxs, np.arange(input.shape[0]))
+
+
+def test_lod_keeps_rare_samples(input):
+    rare = np.array([[10.0, 10.0], [10.1, 10.1]])
+    Z = np.vstack([input, rare])
+    index = lod.GridIndex(Z, n_bins=32)
+    idxs = index.query(max_points=1000)
+    assert {Z.shape[0] - 2, Z.shape[0] - 1} <= set(idxs)
+
+
+def test_lod_zoom(input):
+    index = lod.GridIndex(input)
+    ranges = [[0, 1], [0, 1]]
+    mask = np.all((0 <= input) & (input <= 1), axis=1)
+    assert index.count(ranges) == mask.sum()
+    idxs = index.query(ranges=ranges, max_points=input.shape[0])
+    np.testing.assert_array_equal(idxs, np.nonzero(mask)[0])
+
+
+def test_raster(input):
+    codes = (input[:, 0] > 0).astype(int)
+    x_range, y_range = [-4, 4], [-4, 4]
+    counts = raster.aggregate(input[:, 0], input[:, 1], x_range, y_range,
+                              codes=codes, n_codes=2, width=40, height=30)
+    assert counts.shape == (2, 30, 40)
+    inside = np.all((-4 <= input) & (input < 4), axis=1)
+    assert counts.sum() == inside.sum()
+    assert counts[1].sum() == (inside & (codes == 1)).sum()
+
+    image = raster.shade(counts, ['#ff0000', '#0000ff'])
+    assert image.shape == (30, 40, 4)
+    assert np.all(image[counts.sum(axis=0) == 0, 3] == 0)
+    assert raster.to_png_data_uri(image).startswith('data:image/png;base64,')
+
+
+def test_histogram(input):
+    codes = (input[:, 0] > 0).astype(int)
+    value_range = [input[:, 1].min(), input[:, 1].max()]
+    edges, counts = histogram.binned_counts(input[:, 1], 20, value_range, codes=codes, n_codes=2)
+    for code in range(2):
+        expected, expected_edges = np.histogram(input[codes == code, 1], bins=20, range=value_range)
+        np.testing.assert_allclose(edges, expected_edges)
+        np.testing.assert_array_equal(counts[code], expected)
+
+
+def test_figure_cache():
+    cache = figure_cache.FigureCache(max_bytes=100)
+    assert cache.get_or_create('a', lambda: {'x': [1, 2]}) == {'x': [1, 2]}
+    assert cache.get_or_create('a', lambda: {'x': [3]}) == {'x': [1, 2]}
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    # Least recently used entries are evicted above the size cap
+    cache.put('b', 'b' * 45)
+    cache.get('a')
+    cache.put('c', 'c' * 45)
+    assert 'a' in cache and 'b' not in cache and 'c' in cache
+    assert cache.n_bytes <= 100
+
+    # Values larger than the cap are returned but not cached
+    assert cache.put('d', 'd' * 200) == 'd' * 200
+    assert 'd' not in cache
+
+
+def test_registry():
+    reg = registry.DatasetRegistry()
+    reg.register(registry.Dataset('a', cryodrgn_z_file=z_file))
+    reg.register(registry.Dataset('b', cryodrgn_z_file=z_file, stride=2))
+    # Loaded lazily
+    assert all(x.data is None for x in reg.get_datasets())
+    data = reg.get('b')
+    assert reg.get_dataset('a').data is None
+    n_samples = data.datatable_data[-1]['datatable_num_samples']
+    assert data.n_dims == 2 and data.df.shape[0] == (n_samples + 1) // 2
+
+    # The least recently used dataset is evicted above the memory cap
+    reg.max_bytes = data.nbytes + 1
+    reg.get('a')
+    assert reg.get_dataset('a').data is not None
+    assert reg.get_dataset('b').data is None
+
+
+def test_metadata_column():
+    from cryopicls.data_handling.relion import RelionMetaData
+    star_file = 'tests/cryosparc_P2_J744_005_particles_pyem.star'
+    md = RelionMetaData.load(star_file)
+    data = registry.Dataset(
+        'a', cryodrgn_z_file='tests/cryodrgn_z_p2_w1_j744_vae128_zdim3_seed1.pkl', metadata_file=star_file, stride=3).load()
+    assert '_rlnDefocusU' in data.get_metadata_columns()
+    # Aligned to the samples after the stride
+    defocus = data.get_metadata_column('_rlnDefocusU')
+    np.testing.assert_allclose(defocus, md.df_particles['_rlnDefocusU'].to_numpy(dtype=float)[::3])
+    optics_group = data.get_metadata_column('_rlnOpticsGroup')
+    assert isinstance(optics_group, pd.Categorical) and len(optics_group) == data.df.shape[0]
+
+
+def test_compact_df(input):
+    labels = np.arange(input.shape[0]) % 3 * 2
+    df = registry.to_compact_df(pd.DataFrame({'dim_1': input[:, 0], 'dim_2': input[:, 1], 'cluster': labels}))
+    assert df['dim_1'].dtype == np.float32
+    assert list(df['cluster'].cat.categories) == [0, 2, 4]
+    np.testing.assert_array_equal(df['cluster'].to_numpy(), labels)
+
+    datatable_data = registry.create_datatable_data(df)
+    assert [x['datatable_groups'] for x in datatable_data] == ['cluter_0', 'cluter_2', 'cluter_4', 'Total']
+    assert [x['datatable_num_samples'] for x in datatable_data] == [np.sum(labels == x) for x in [0, 2, 4]] + [len(labels)]
+
+    assert list(registry.get_cluster_labels(df).cat.categories) == ['cluster_0', 'cluster_2', 'cluster_4']
+
+
+def test_selection(input):
+    from matplotlib.path import Path
+    t = np.linspace(0, 2 * np.pi, 50, endpoint=False)
+    polygon_x, polygon_y = 2 * np.cos(t) + 0.5 * np.sin(3 * t), 2 * np.sin(t)
+    mask = selection.resolve_selection(
+        input[:, 0], input[:, 1], {'lassoPoints': {'x': list(polygon_x), 'y': list(polygon_y)}})
+    expected = Path(np.vstack([polygon_x, polygon_y]).T).contains_points(input[:, :2])
+    np.testing.assert_array_equal(mask, expected)
+
+    mask = selection.resolve_selection(input[:, 0], input[:, 1], {'range': {'x': [1, -1], 'y': [-1, 1]}})
+    np.testing.assert_array_equal(mask, np.all(np.abs(input[:, :2]) <= 1, axis=1))
+
+
+def test_crossfilter(input):
+    cf = crossfilter.CrossFilter([input[:, 0], input[:, 1]], n_bins=20)
+    codes = np.stack(cf.codes_)
+    for filters in [{}, {0: cf.to_bins(0, [-1, 0.5])}, {0: cf.to_bins(0, [0.5, -1]), 1: (3, 12)}]:
+        # Samples passing all the filters, and all the filters but each dimension's own
+        passed_all = np.ones(input.shape[0], dtype=bool)
+        passed = [np.ones(input.shape[0], dtype=bool) for _ in range(2)]
+        for dim, (start, stop) in filters.items():
+            in_range = (start <= codes[dim]) & (codes[dim] < stop)
+            passed_all &= in_range
+            passed[1 - dim] &= in_range
+        histograms = cf.histograms(filters)
+        for dim in range(2):
+            np.testing.assert_array_equal(histograms[dim], np.bincount(codes[dim][passed[dim]], minlength=20))
+        np.testing.assert_array_equal(cf.mask(filters), passed_all)
+    # Snapped to the bin edges covering the range
+    start, stop = cf.to_bins(0, [-1, 0.5])
+    assert cf.edges_[0][start] <= -1 and cf.edges_[0][stop] >= 0.5
+
+
+def test_volume():
+    rng = np.random.default_rng(0)
+    coords = rng.normal(size=(10000, 3))
+    codes = (coords[:, 0] > 0).astype(int)
+    ranges = [[-2, 2], [-2, 2], [-2, 2]]
+    edges, counts = volume.voxelize(coords[:, 0], coords[:, 1], coords[:, 2], ranges, 8, codes=codes, n_codes=2)
+    assert counts.shape == (2, 8, 8, 8)
+    expected, _ = np.histogramdd(coords, bins=edges)
+    np.testing.assert_array_equal(counts.sum(axis=0), expected)
+    assert counts[1, :4].sum() == 0 and counts[0, 4:].sum() == 0
+
+    # Smoothing preserves the total of a volume vanishing at the borders
+    point = np.zeros((5, 5, 5))
+    point[2, 2, 2] = 1
+    np.testing.assert_allclose(volume.smooth(point).sum(), 1)
+    assert volume.quantize(volume.smooth(point)).max() == 255
+
+    offsets, cropped = volume.crop(point)
+    assert offsets == [2, 2, 2] and cropped.shape == (1, 1, 1)
+
+
+def test_registry_shared(tmp_path):
+    dataset = registry.Dataset('a', cryodrgn_z_file=z_file, stride=3)
+    data = dataset.load()
+    data.df['cluster'] = pd.Categorical.from_codes(np.arange(data.df.shape[0]) % 2, categories=['cluster_0', 'cluster_1'])
+    data.save(str(tmp_path / 'a.cpc'))
+    data_shared = registry.LoadedDataset.from_file(str(tmp_path / 'a.cpc'))
+    pd.testing.assert_frame_equal(data_shared.df, data.df, check_dtype=False)
+    assert data_shared.datatable_data == data.datatable_data
+
+    # Datasets are shared between processes through memory-mapped files
+    reg = registry.DatasetRegistry(shared_dir=str(tmp_path))
+    reg.register(registry.Dataset('b', cryodrgn_z_file=z_file))
+    values = reg.get('b').df['dim_1'].to_numpy()
+    assert isinstance(values.base, np.memmap) or isinstance(values, np.memmap)
+    assert os.path.exists(registry.get_shared_file(str(tmp_path), 'b', reg.get_dataset('b').version))
+
+
+def test_dataset_reload(input, tmp_path):
+    clustering_file, projection_file = str(tmp_path / 'clustering.pkl'), str(tmp_path / 'projection.pkl')
+    df = pd.DataFrame(input, columns=['dim_1', 'dim_2'])
+    df.assign(cluster=(input[:, 0] > 0).astype(int)).to_pickle(clustering_file)
+    df.to_pickle(projection_file)
+    dataset = registry.Dataset('a', clustering_result_file=clustering_file, projection_result_file=projection_file, stride=2)
+    data = dataset.get_data()
+    index = data.get_lod_index(['dim_1', 'dim_2'])
+    assert not dataset.is_stale() and not dataset.reload()
+
+    # Only the cluster labels change. The coordinates and the structures derived from them are kept.
+    df.assign(cluster=(input[:, 1] > 0).astype(int)).to_pickle(clustering_file)
+    os.utime(clustering_file, ns=(0, 0))
+    assert dataset.is_stale() and dataset.reload()
+    assert dataset.data is not data and dataset.data.version != data.version
+    assert dataset.data.coords_version == data.coords_version
+    assert dataset.data.get_lod_index(['dim_1', 'dim_2']) is index
+    np.testing.assert_array_equal(
+        dataset.data.df['cluster'].cat.codes.to_numpy(), (input[::2, 1] > 0).astype(int))
+
+    # The coordinates change
+    (df * 2).to_pickle(projection_file)
+    os.utime(projection_file, ns=(0, 0))
+    assert dataset.reload()
+    assert dataset.data.coords_version != data.coords_version
+    np.testing.assert_allclose(dataset.data.df['dim_1'].to_numpy(), 2 * input[::2, 0], rtol=1e-6)
+
+
+def test_export_selection(tmp_path, monkeypatch):
+    visualizer = pytest.importorskip('cryopicls.cryopicls_visualizer')
+    export_dir = tmp_path / 'export'
+    export_dir.mkdir()
+    reg = registry.DatasetRegistry()
+    reg.register(registry.Dataset(
+        'a', cryodrgn_z_file='tests/cryodrgn_z_p2_w1_j744_vae128_zdim3_seed1.pkl',
+        metadata_file='tests/cryosparc_P2_J744_005_particles_pyem.star', stride=3))
+    monkeypatch.setattr(visualizer, 'export_dir', str(export_dir))
+    monkeypatch.setattr(visualizer, 'registry', reg)
+    box = {'axes': ['dim_1', 'dim_2'], 'range': {'x': [-100, 100], 'y': [-100, 100]}}
+
+    # Only the rootname files in the export directory are written
+    for outdir in [str(tmp_path), '..', 'sub/../..', str(tmp_path / 'export_2')]:
+        assert 'must be in the export directory' in visualizer.export_selection(1, box, outdir, 'selected', 'a')
+    for rootname in ['../selected', os.path.join('sub', 'selected'), '..']:
+        assert 'Invalid output file rootname' in visualizer.export_selection(1, box, 'sub', rootname, 'a')
+    assert sorted(os.listdir(tmp_path)) == ['export'] and os.listdir(export_dir) == []
+
+    assert 'Exported' in visualizer.export_selection(1, box, 'sub', 'selected', 'a')
+    assert os.path.isfile(export_dir / 'sub' / 'selected.star')